@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+'''
+Benchmark script for the hot paths of the Selenium Framework.
+Execute this script by running "python bench_framework.py" in the directory
+containing the script and framework files. It prints the operations per second
+and the WebDriver round trips per operation of each benchmark, and the number
+of times per second the framework can be imported in a fresh interpreter.
+    --import-only   Only measure the import time, without a browser.
+    --save          Store the results as the baseline for the browser.
+    --check         Compare the results with the baseline and exit with an error
+                    when a benchmark makes more round trips or is slower than the
+                    baseline by more than the tolerance.
+'''
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import selenium_framework as sf
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(SCRIPT_DIR, 'bench_baseline.json')
+CONFIG = {
+    'browser': 'Chrome',
+    'headless': True,
+    'browser_size': (800, 600),
+    'browser_position': (0, 0),
+    'remote_hub': False,    # (server_name_or_ip, port),
+    'test_page': f'file://{SCRIPT_DIR}/test_page.html'
+}
+
+def make_large_form_page(folder, field_count=2000):
+    '''Write a page with a form of the given number of fields and
+    return its url.'''
+    fields = []
+    for index in range(field_count):
+        if index % 4 == 0:
+            field = f'<input type="checkbox" id="field{index}" name="field{index}"/>'
+        elif index % 4 == 1:
+            field = f'<textarea id="field{index}" name="field{index}"></textarea>'
+        elif index % 4 == 2:
+            field = (f'<select id="field{index}" name="field{index}" multiple>'
+                     '<option>1</option><option>2</option><option>3</option></select>')
+        else:
+            field = f'<input type="text" id="field{index}" name="field{index}" value="{index}"/>'
+        fields.append(f'<div>{field}</div>')
+    path = os.path.join(folder, 'large_form.html')
+    with open(path, 'w') as page_file:
+        page_file.write('<html><head><title>Large Form</title></head><body><form>'
+                        f'{"".join(fields)}</form></body></html>')
+    return f'file://{path}'
+
+def make_deep_frames_page(folder, depth=10):
+    '''Write a page with the given depth of nested frames, each with the id
+    "frame", and an input with the id "deep" in the innermost frame, and
+    return its url.'''
+    for level in range(depth, -1, -1):
+        if level == depth:
+            body = '<input type="text" id="deep" value="Deep"/>'
+        else:
+            body = f'<iframe id="frame" src="frame{level + 1}.html"></iframe>'
+        with open(os.path.join(folder, f'frame{level}.html'), 'w') as page_file:
+            page_file.write(f'<html><head><title>Frame {level}</title></head>'
+                            f'<body>{body}</body></html>')
+    return f'file://{os.path.join(folder, "frame0.html")}'
+
+def bench_import(duration):
+    '''Import the framework in fresh interpreters for about the given number
+    of seconds and return the imports per second, from the cumulative import
+    time that "python -X importtime" reports.'''
+    seconds = []
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < duration or not seconds:
+        output = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import selenium_framework'],
+            cwd=SCRIPT_DIR, capture_output=True, text=True, check=True).stderr
+        match = re.search(r'\|\s*(\d+) \| selenium_framework$', output, re.MULTILINE)
+        seconds.append(int(match.group(1)) / 1e6)
+    return {
+        'ops_per_sec': round(len(seconds) / sum(seconds), 2),
+        'round_trips_per_op': 0,
+    }
+
+def round_trips(driver):
+    '''Return the number of WebDriver commands sent by the driver so far.'''
+    return sum(stats['count'] for stats in driver.metrics.commands.values())
+
+def bench(driver, function, duration):
+    '''Run the function repeatedly for about the given number of seconds and
+    return the operations per second and round trips per operation.'''
+    function()  # Warm up
+    start_trips = round_trips(driver)
+    count = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < duration:
+        function()
+        count += 1
+    elapsed = time.perf_counter() - start_time
+    return {
+        'ops_per_sec': round(count / elapsed, 2),
+        'round_trips_per_op': round((round_trips(driver) - start_trips) / count, 2),
+    }
+
+def run_benchmarks(driver, folder, duration):
+    '''Run all the benchmarks and return a dictionary of results.'''
+    results = {}
+
+    driver.goto(CONFIG['test_page'])
+    text_field = driver.find('id=text01')
+    select_field = driver.find('id=select02')
+    radio_group = driver.find('name=radio')
+    simple_benchmarks = {
+        'find_by_id': lambda: driver.find('id=text01'),
+        'find_by_tag': lambda: driver.find('tag=input'),
+        'find_chained': lambda: driver.find('tag=table >> id=select02'),
+        'set_field_text': lambda: driver.set_field(text_field, 'Test123'),
+        'set_field_select': lambda: driver.set_field(select_field, [1, 3]),
+        'is_field_set_text': lambda: driver.is_field_set(text_field),
+        'is_field_set_select': lambda: driver.is_field_set(select_field),
+        'is_radio_button_group_set': lambda: driver.is_radio_button_group_set(radio_group),
+        'is_element_clickable': lambda: driver.is_element_clickable(text_field),
+        'check_alert_none': driver.check_alert,
+    }
+    for name, function in simple_benchmarks.items():
+        results[name] = bench(driver, function, duration)
+
+    driver.goto(make_large_form_page(folder))
+    inputs = driver.find('tag=input')
+    form_values = {f'id=field{index}': str(index) for index in range(3, 2000, 4)}
+    large_benchmarks = {
+        'large_find_by_tag': lambda: driver.find('tag=input'),
+        'large_are_clickable': lambda: driver.are_clickable(inputs),
+        'large_fill_form': lambda: driver.fill_form(form_values),
+        'large_snapshot_form': driver.snapshot_form,
+    }
+    for name, function in large_benchmarks.items():
+        results[name] = bench(driver, function, duration)
+
+    driver.goto(make_deep_frames_page(folder))
+    def switch_to_deep_frame():
+        driver.switch_to()
+        for _ in range(10):
+            driver.switch_to('frame=frame')
+    results['switch_to_deep_frames'] = bench(driver, switch_to_deep_frame, duration)
+    driver.switch_to()
+    return results
+
+def compare(results, baseline, tolerance):
+    '''Given the results and the baseline of one browser,
+    return a list of regression messages.'''
+    regressions = []
+    for name, expected in sorted(baseline.items()):
+        actual = results.get(name)
+        if actual is None:
+            regressions.append(f'{name}: missing from the results')
+            continue
+        if actual['round_trips_per_op'] > expected['round_trips_per_op']:
+            regressions.append(f'{name}: {actual["round_trips_per_op"]} round trips per op '
+                               f'(baseline {expected["round_trips_per_op"]})')
+        if actual['ops_per_sec'] < expected['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f'{name}: {actual["ops_per_sec"]} ops/sec '
+                               f'(baseline {expected["ops_per_sec"]})')
+    return regressions
+
+def main():
+    '''Run the benchmarks and report, save or check the results.'''
+    parser = argparse.ArgumentParser(description='Benchmark the Selenium Framework.')
+    parser.add_argument('--browser', default=CONFIG['browser'],
+                        help='browser to use; "Fake" measures the framework overhead only')
+    parser.add_argument('--duration', type=float, default=1.0,
+                        help='seconds to run each benchmark')
+    parser.add_argument('--tolerance', type=float, default=.25,
+                        help='allowed slowdown in ops/sec, as a fraction of the baseline')
+    parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--check', action='store_true', help='fail on regressions')
+    parser.add_argument('--import-only', action='store_true',
+                        help='only measure the import time, without a browser')
+    args = parser.parse_args()
+
+    results = {'import': bench_import(args.duration)}
+    if not args.import_only:
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser=args.browser, metrics=True))
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                results.update(run_benchmarks(driver, folder, args.duration))
+        finally:
+            driver.close()
+
+    print(f'{"Benchmark":30} {"ops/sec":>12} {"round trips/op":>16}')
+    for name, result in results.items():
+        print(f'{name:30} {result["ops_per_sec"]:12.2f} {result["round_trips_per_op"]:16.2f}')
+
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as baseline_file:
+            baselines = json.load(baseline_file)
+    if args.save:
+        baselines.setdefault(args.browser, {}).update(results)
+        with open(BASELINE_FILE, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        print(f'Saved the baseline for {args.browser} to {BASELINE_FILE}')
+    if args.check:
+        if args.browser not in baselines:
+            print(f'No baseline for {args.browser}; run with --save first.')
+            return 1
+        baseline = baselines[args.browser]
+        if args.import_only:
+            baseline = {name: baseline[name] for name in results if name in baseline}
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
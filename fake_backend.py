@@ -0,0 +1,1317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+# Fake WebDriver Backend
+
+In-process W3C WebDriver server used by the 'Fake' and 'Static' browsers of the
+Selenium Framework. It parses pages into an in-memory DOM and answers the
+commands and in-page scripts the framework uses, without a browser or driver.
+The framework imports this module on first use only.
+'''
+################################################################################
+
+import base64
+import json
+import re
+import struct
+import threading
+import time
+import urllib.parse
+import uuid
+import zlib
+from functools                                  import lru_cache
+from html.parser                                import HTMLParser
+
+from selenium_framework                         import __version__
+from selenium_framework                         import _ELEMENT_KEY
+from selenium_framework                         import _JS_ARE_CLICKABLE
+from selenium_framework                         import _JS_CACHE_CHECK
+from selenium_framework                         import _JS_CACHE_FIND
+from selenium_framework                         import _JS_CLEAR_STORAGE
+from selenium_framework                         import _JS_COLLECT_TIMING
+from selenium_framework                         import _JS_EXTRACT_TABLE
+from selenium_framework                         import _JS_FILL_FORM
+from selenium_framework                         import _JS_FIND_ALL
+from selenium_framework                         import _JS_MARK_DOCUMENT
+from selenium_framework                         import _JS_READY_STATE
+from selenium_framework                         import _JS_SCROLL_INTO_VIEW
+from selenium_framework                         import _JS_SETTLE
+from selenium_framework                         import _JS_SNAPSHOT_FORM
+from selenium_framework                         import _JS_WAIT_FOR
+from selenium_framework                         import _PNG_SIGNATURE
+from selenium_framework                         import _png_chunk
+
+################################################################################
+# Fake WebDriver Backend
+################################################################################
+_VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+              'meta', 'param', 'source', 'track', 'wbr'}
+_AUTO_CLOSE_TAGS = {'option': {'option'}, 'li': {'li'}, 'p': {'p'}, 'tr': {'tr'},
+                    'td': {'td', 'th'}, 'th': {'td', 'th'}}
+_NOT_RENDERED_TAGS = {'head', 'link', 'meta', 'noscript', 'script', 'style',
+                      'template', 'title'}
+_BOOLEAN_ATTRIBUTES = {'autofocus', 'checked', 'disabled', 'hidden', 'multiple',
+                       'readonly', 'required', 'selected'}
+
+class _FakeError(Exception):
+    '''W3C WebDriver error returned by the fake backend.'''
+    def __init__(self, status, error, message):
+        super().__init__(message)
+        self.status = status
+        self.error = error
+        self.message = message
+
+class _FakeNode():
+    '''Element of the in-memory DOM used by the fake backend.
+    Text is stored as plain strings in the list of children.'''
+    def __init__(self, tag, attributes=None, parent=None):
+        self.tag = tag
+        self.attributes = attributes or {}
+        self.children = []
+        self.parent = parent
+        self.document = parent.document if parent is not None else self
+        self.state = {}     # Live values: value, checked, selected
+        self.element_id = None
+        if parent is not None:
+            parent.children.append(self)
+
+    def elements(self):
+        '''Return the descendant elements in document order.'''
+        found = []
+        stack = [child for child in reversed(self.children) if isinstance(child, _FakeNode)]
+        while stack:
+            node = stack.pop()
+            found.append(node)
+            stack.extend(child for child in reversed(node.children)
+                         if isinstance(child, _FakeNode))
+        return found
+
+    def ancestors(self):
+        '''Return the ancestor elements, nearest first, without the document.'''
+        found = []
+        node = self.parent
+        while node is not None and node.tag != '#document':
+            found.append(node)
+            node = node.parent
+        return found
+
+    def text_content(self):
+        '''Return all the text inside the element.'''
+        return ''.join(child if isinstance(child, str) else child.text_content()
+                       for child in self.children)
+
+    def rendered_text(self):
+        '''Return the visible text of the element with whitespace collapsed.'''
+        if not self.is_displayed():
+            return ''
+        parts = []
+        for child in self.children:
+            if isinstance(child, str):
+                parts.append(child)
+            elif child.tag == 'br':
+                parts.append('\n')
+            else:
+                parts.append(f' {child.rendered_text()} ')
+        lines = ''.join(parts).split('\n')
+        return '\n'.join(' '.join(line.split()) for line in lines).strip()
+
+    def style(self):
+        '''Return the inline style of the element as a dictionary.'''
+        declarations = {}
+        for declaration in self.attributes.get('style', '').split(';'):
+            name, _, value = declaration.partition(':')
+            if value:
+                declarations[name.strip().lower()] = value.strip().lower()
+        return declarations
+
+    def is_connected(self):
+        '''Return True if the element is still part of a live document.'''
+        node = self
+        while node.parent is not None:
+            if node not in node.parent.children:
+                return False
+            node = node.parent
+        return node.tag == '#document' and node.alive
+
+    def is_displayed(self):
+        '''Approximate the visibility rules of a browser from the markup.'''
+        if self.tag == 'input' and self.input_type == 'hidden':
+            return False
+        for node in [self] + self.ancestors():
+            style = node.style()
+            if (node.tag in _NOT_RENDERED_TAGS or 'hidden' in node.attributes or
+                    style.get('display') == 'none' or
+                    style.get('visibility') in ['hidden', 'collapse'] or
+                    style.get('opacity') in ['0', '0.0']):
+                return False
+        return True
+
+    def is_enabled(self):
+        '''Return False for disabled form fields.'''
+        return not any('disabled' in node.attributes and
+                       node.tag in ['button', 'fieldset', 'input', 'optgroup',
+                                    'option', 'select', 'textarea']
+                       for node in [self] + self.ancestors())
+
+    @property
+    def input_type(self):
+        '''Return the type of an input element.'''
+        return self.attributes.get('type', 'text').lower()
+
+    @property
+    def checked(self):
+        '''Return the checked state of a checkbox or radio button.'''
+        return self.state.get('checked', 'checked' in self.attributes)
+
+    @property
+    def value(self):
+        '''Return the current value of a form field.'''
+        if 'value' in self.state:
+            return self.state['value']
+        if self.tag == 'textarea':
+            return self.text_content().lstrip('\n')
+        if self.tag == 'select':
+            selected = [option for option in self.options() if option.state.get('selected')]
+            return selected[0].value if selected else ''
+        if self.tag == 'option' and 'value' not in self.attributes:
+            return ' '.join(self.text_content().split())
+        if self.tag == 'input' and self.input_type in ['checkbox', 'radio']:
+            return self.attributes.get('value', 'on')
+        return self.attributes.get('value', '')
+
+    def options(self):
+        '''Return the options of a select element.'''
+        return [node for node in self.elements() if node.tag == 'option']
+
+    def select(self):
+        '''Return the select element that owns an option.'''
+        for node in self.ancestors():
+            if node.tag == 'select':
+                return node
+        return None
+
+    def set_checked(self, checked):
+        '''Check or uncheck a checkbox or radio button; checking a radio
+        button unchecks the rest of its group.'''
+        if checked and self.input_type == 'radio' and self.attributes.get('name'):
+            for node in self.document.elements():
+                if (node.tag == 'input' and node.input_type == 'radio' and
+                        node.attributes.get('name') == self.attributes['name']):
+                    node.state['checked'] = False
+        self.state['checked'] = checked
+
+    def set_selected(self, selected):
+        '''Select or deselect an option; selecting an option of a
+        single-value select deselects the other options.'''
+        select = self.select()
+        if selected and select is not None and 'multiple' not in select.attributes:
+            for option in select.options():
+                option.state['selected'] = False
+        self.state['selected'] = selected
+
+class _FakeDocument(_FakeNode):
+    '''Document of the in-memory DOM, parsed from the HTML of a url.'''
+    def __init__(self, url, html=''):
+        super().__init__('#document')
+        self.url = url
+        self.html = html
+        self.alive = True
+        self.load_seconds = 0
+        self.cache_id = uuid.uuid4().hex
+        self.frames = {}
+        _FakeHTMLParser(self).feed(html)
+        # The structure never changes after parsing (no JavaScript runs)
+        self.order = {id(node): index for index, node in enumerate(self.elements())}
+        self.index = {'id': {}, 'name': {}, 'class': {}}
+        for node in self.elements():
+            for attribute in ['id', 'name']:
+                if attribute in node.attributes:
+                    self.index[attribute].setdefault(node.attributes[attribute], []).append(node)
+            for class_name in node.attributes.get('class', '').split():
+                self.index['class'].setdefault(class_name, []).append(node)
+        for select in [node for node in self.elements() if node.tag == 'select']:
+            options = select.options()
+            chosen = [option for option in options if 'selected' in option.attributes]
+            if 'multiple' not in select.attributes:
+                if not chosen and options and int(select.attributes.get('size') or 1) <= 1:
+                    chosen = options[:1]
+                chosen = chosen[-1:]
+            for option in options:
+                option.state['selected'] = option in chosen
+
+    @property
+    def title(self):
+        '''Return the text of the title element.'''
+        for node in self.elements():
+            if node.tag == 'title':
+                return ' '.join(node.text_content().split())
+        return ''
+
+    def close(self):
+        '''Mark the document and its frames as unloaded.'''
+        self.alive = False
+        for frame in self.frames.values():
+            frame.close()
+
+class _FakeHTMLParser(HTMLParser):
+    '''Build the in-memory DOM of a _FakeDocument.'''
+    def __init__(self, document):
+        super().__init__(convert_charrefs=True)
+        self.stack = [document]
+
+    def handle_starttag(self, tag, attrs):
+        if self.stack[-1].tag in _AUTO_CLOSE_TAGS.get(tag, ()):
+            self.stack.pop()
+        attributes = {}
+        for name, value in attrs:
+            attributes.setdefault(name, value if value is not None else '')
+        node = _FakeNode(tag, attributes, self.stack[-1])
+        if tag not in _VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+def _unescape_css(text):
+    '''Remove the backslash escapes of a CSS identifier or string.'''
+    return re.sub(r'\\(.)', r'\1', text)
+
+_CSS_TOKEN = re.compile(r'''
+      \s*(?P<combinator>[>+~])\s*
+    | (?P<space>\s+)
+    | (?P<tag>\*|[a-zA-Z][\w-]*)
+    | \#(?P<id>(?:[\w-]|\\.)+)
+    | \.(?P<class>(?:[\w-]|\\.)+)
+    | \[\s*(?P<attribute>[\w:-]+)\s*(?:(?P<operator>[~^$*|]?=)\s*
+        (?:"(?P<double>(?:[^"\\]|\\.)*)"|'(?P<single>(?:[^'\\]|\\.)*)'|(?P<bare>[\w-]+))\s*)?\]
+    | :(?P<pseudo>[\w-]+)
+''', re.VERBOSE)
+
+_CSS_OPERATORS = {
+    '=' : lambda actual, wanted: actual == wanted,
+    '~=': lambda actual, wanted: wanted in actual.split(),
+    '^=': lambda actual, wanted: bool(wanted) and actual.startswith(wanted),
+    '$=': lambda actual, wanted: bool(wanted) and actual.endswith(wanted),
+    '*=': lambda actual, wanted: bool(wanted) and wanted in actual,
+    '|=': lambda actual, wanted: actual == wanted or actual.startswith(wanted + '-'),
+}
+
+_CSS_PSEUDO_CLASSES = {
+    'checked'    : lambda node: node.checked if node.tag == 'input' else
+                                bool(node.state.get('selected')),
+    'disabled'   : lambda node: not node.is_enabled(),
+    'enabled'    : lambda node: node.is_enabled(),
+    'first-child': lambda node: node.parent is not None and
+                                _element_children(node.parent)[0] is node,
+    'last-child' : lambda node: node.parent is not None and
+                                _element_children(node.parent)[-1] is node,
+}
+
+def _element_children(node):
+    '''Return the child elements of a node.'''
+    return [child for child in node.children if isinstance(child, _FakeNode)]
+
+@lru_cache(maxsize=256)
+def _parse_css(selector):
+    '''Given a CSS selector (a subset of CSS 3),
+    return a list of selectors, each a list of (combinator, tests) pairs.'''
+    selectors = []
+    for group in re.split(r',(?=(?:[^"\']|"[^"]*"|\'[^\']*\')*$)', selector):
+        parts = []
+        combinator = None
+        tests = []
+        position = 0
+        group = group.strip()
+        while position < len(group):
+            match = _CSS_TOKEN.match(group, position)
+            if not match:
+                raise _FakeError(400, 'invalid selector', f'Unsupported selector: {selector}')
+            position = match.end()
+            if match.group('combinator') or match.group('space'):
+                parts.append((combinator, tests))
+                combinator = match.group('combinator') or ' '
+                tests = []
+            elif match.group('tag'):
+                tag = match.group('tag').lower()
+                if tag != '*':
+                    tests.append(lambda node, tag=tag: node.tag == tag)
+            elif match.group('id'):
+                tests.append(lambda node, value=_unescape_css(match.group('id')):
+                             node.attributes.get('id') == value)
+            elif match.group('class'):
+                tests.append(lambda node, value=_unescape_css(match.group('class')):
+                             value in node.attributes.get('class', '').split())
+            elif match.group('attribute'):
+                name = match.group('attribute').lower()
+                operator = match.group('operator')
+                if operator is None:
+                    tests.append(lambda node, name=name: name in node.attributes)
+                else:
+                    wanted = _unescape_css(next(group for group in match.group(
+                        'double', 'single', 'bare') if group is not None))
+                    tests.append(lambda node, name=name, wanted=wanted,
+                                 compare=_CSS_OPERATORS[operator]:
+                                 name in node.attributes and
+                                 compare(node.attributes[name], wanted))
+            elif match.group('pseudo') in _CSS_PSEUDO_CLASSES:
+                tests.append(_CSS_PSEUDO_CLASSES[match.group('pseudo')])
+            else:
+                raise _FakeError(400, 'invalid selector', f'Unsupported selector: {selector}')
+        if not tests and combinator is None and not parts:
+            raise _FakeError(400, 'invalid selector', f'Invalid selector: {selector}')
+        parts.append((combinator, tests))
+        selectors.append(parts)
+    return selectors
+
+def _css_matches(node, parts, index):
+    '''Match a node against the parts of a selector, right to left.'''
+    combinator, tests = parts[index]
+    if not all(test(node) for test in tests):
+        return False
+    if index == 0:
+        return True
+    if combinator == '>':
+        return node.parent is not None and node.parent.tag != '#document' and \
+               _css_matches(node.parent, parts, index - 1)
+    if combinator in ['+', '~']:
+        siblings = _element_children(node.parent)
+        previous = siblings[:siblings.index(node)]
+        if combinator == '+':
+            previous = previous[-1:]
+        return any(_css_matches(sibling, parts, index - 1) for sibling in previous)
+    return any(_css_matches(ancestor, parts, index - 1) for ancestor in node.ancestors())
+
+_CSS_INDEXED = re.compile(r'^(?:\[(?P<attribute>id|name)="(?P<value>[^"\\]*)"\]'
+                          r'|#(?P<id>[\w-]+)|\.(?P<class>[\w-]+))$')
+
+def _css_select(root, selector):
+    '''Return the elements inside the root that match a CSS selector.
+    The id, name and class selectors that selenium sends for its "By"
+    locators are answered from the document indexes.'''
+    match = _CSS_INDEXED.match(selector)
+    if match:
+        if match.group('attribute'):
+            return _fake_indexed(root, match.group('attribute'), match.group('value'))
+        if match.group('id'):
+            return _fake_indexed(root, 'id', match.group('id'))
+        return _fake_indexed(root, 'class', match.group('class'))
+    selectors = _parse_css(selector)
+    return [node for node in root.elements()
+            if any(_css_matches(node, parts, len(parts) - 1) for parts in selectors)]
+
+_XPATH_TOKEN = re.compile(r'''\s*(?:
+      (?P<string>"[^"]*"|'[^']*')
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<operator>!=|<=|>=|=|<|>|\(|\)|,)
+    | (?P<name>@?[\w*.-]+(?:\(\))?)
+)''', re.VERBOSE)
+
+def _xpath_tokens(expression):
+    '''Split an XPath predicate expression into tokens.'''
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _XPATH_TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise _FakeError(400, 'invalid selector', f'Unsupported XPath: {expression}')
+        tokens.append(match.group().strip())
+        position = match.end()
+    return tokens
+
+def _xpath_value(tokens, node, position, size):
+    '''Evaluate one value (literal, path or function call) of an XPath
+    predicate, consuming its tokens.'''
+    token = tokens.pop(0)
+    if token[0] in '"\'':
+        return token[1:-1]
+    if token[0].isdigit():
+        return float(token)
+    if token in ['.', 'text()', 'node()']:
+        if token == 'text()':
+            return ''.join(child for child in node.children if isinstance(child, str))
+        return node.text_content()
+    if token == 'position()':
+        return float(position)
+    if token == 'last()':
+        return float(size)
+    if token.startswith('@'):
+        return node.attributes.get(token[1:].lower())
+    if tokens and tokens[0] == '(':
+        tokens.pop(0)
+        arguments = []
+        while tokens[0] != ')':
+            arguments.append(_xpath_expression(tokens, node, position, size))
+            if tokens[0] == ',':
+                tokens.pop(0)
+        tokens.pop(0)
+        text_arguments = ['' if argument is None else str(argument) for argument in arguments]
+        if token == 'normalize-space':
+            return ' '.join((text_arguments[0] if arguments
+                             else node.text_content()).split())
+        if token == 'contains':
+            return text_arguments[1] in text_arguments[0]
+        if token == 'starts-with':
+            return text_arguments[0].startswith(text_arguments[1])
+        if token == 'concat':
+            return ''.join(text_arguments)
+        if token == 'not':
+            return not arguments[0]
+        if token == 'string':
+            return text_arguments[0] if arguments else node.text_content()
+        raise _FakeError(400, 'invalid selector', f'Unsupported XPath function: {token}')
+    # A child element name: its text if it exists
+    children = [child for child in _element_children(node) if child.tag == token.lower()]
+    return children[0].text_content() if children else None
+
+def _xpath_comparison(tokens, node, position, size):
+    '''Evaluate a value, optionally compared to a second value.'''
+    left = _xpath_value(tokens, node, position, size)
+    if not tokens or tokens[0] not in ['=', '!=', '<', '>', '<=', '>=']:
+        return left
+    operator = tokens.pop(0)
+    right = _xpath_value(tokens, node, position, size)
+    if left is None or right is None:
+        return False
+    if isinstance(left, float) or isinstance(right, float):
+        try:
+            left, right = float(left), float(right)
+        except ValueError:
+            return False
+    return {'=': left == right, '!=': left != right, '<': left < right,
+            '>': left > right, '<=': left <= right, '>=': left >= right}[operator]
+
+def _xpath_expression(tokens, node, position, size):
+    '''Evaluate comparisons joined by "and" and "or".'''
+    result = _xpath_comparison(tokens, node, position, size)
+    while tokens and tokens[0] in ['and', 'or']:
+        operator = tokens.pop(0)
+        right = _xpath_comparison(tokens, node, position, size)
+        result = (result and right) if operator == 'and' else (result or right)
+    return result
+
+def _xpath_predicate(predicate, node, position, size):
+    '''Return True if the node at the given position passes the predicate.'''
+    result = _xpath_expression(_xpath_tokens(predicate), node, position, size)
+    if isinstance(result, float):
+        return result == position
+    return result not in [None, False, '']
+
+_XPATH_STEP = re.compile(r'''(?P<separator>//|/)?(?P<test>\.\.|\.|\*|[\w-]+(?:\(\))?)
+                             (?P<predicates>(?:\[(?:[^\[\]"']|"[^"]*"|'[^']*')*\])*)''', re.VERBOSE)
+
+def _xpath_select(context, expression):
+    '''Return the elements matching an XPath expression (a subset of XPath 1.0:
+    child, descendant, self and parent steps with predicates).'''
+    expression = expression.strip()
+    nodes = [context.document if expression.startswith('/') else context]
+    position = 0
+    while position < len(expression):
+        match = _XPATH_STEP.match(expression, position)
+        if not match or match.end() == position:
+            raise _FakeError(400, 'invalid selector', f'Unsupported XPath: {expression}')
+        position = match.end()
+        test = match.group('test')
+        if test == 'text()':
+            raise _FakeError(400, 'invalid selector', 'Only elements can be located.')
+        found = []
+        for node in nodes:
+            if test == '.':
+                candidates = [node]
+            elif test == '..':
+                candidates = [node.parent] if node.parent is not None else []
+            else:
+                if match.group('separator') == '//':
+                    candidates = node.elements()
+                else:
+                    candidates = _element_children(node)
+                if test != '*':
+                    candidates = [candidate for candidate in candidates
+                                  if candidate.tag == test.lower()]
+            for predicate in re.findall(r'\[((?:[^\[\]"\']|"[^"]*"|\'[^\']*\')*)\]',
+                                        match.group('predicates')):
+                candidates = [candidate for index, candidate in enumerate(candidates, 1)
+                              if _xpath_predicate(predicate, candidate, index, len(candidates))]
+            found.extend(candidate for candidate in candidates if candidate not in found)
+        nodes = found
+    return sorted((node for node in nodes if node.tag != '#document'),
+                  key=lambda node: context.document.order[id(node)])
+
+def _fake_indexed(root, attribute, value):
+    '''Return the elements inside the root with the given id or name,
+    or with the given class, from the indexes of the document.'''
+    found = root.document.index[attribute].get(value, [])
+    if root.tag == '#document':
+        return list(found)
+    return [node for node in found if root in node.ancestors()]
+
+def _fake_find(root, by, value):
+    '''Return the elements inside the root that match a selenium "By" locator.'''
+    if by == 'css selector':
+        return _css_select(root, value)
+    if by in ['id', 'name', 'class name']:
+        return _fake_indexed(root, by.split()[0], value)
+    if by == 'tag name':
+        return [node for node in root.elements() if node.tag == value.lower()]
+    if by in ['link text', 'partial link text']:
+        return [node for node in root.elements() if node.tag == 'a' and (
+            node.rendered_text() == value if by == 'link text'
+            else value in node.rendered_text())]
+    if by == 'xpath':
+        return _xpath_select(root, value)
+    raise _FakeError(400, 'invalid argument', f'Unsupported locator strategy: {by}')
+
+def _fake_find_all(root, steps):
+    '''Resolve the steps of a chained locator, like sfFindAll.'''
+    found = [root]
+    for by, value in steps:
+        found = list(dict.fromkeys(element for node in found
+                                   for element in _fake_find(node, by, value)))
+    if len(found) > 1:
+        found.sort(key=lambda node: root.document.order[id(node)])
+    return found
+
+def _fake_field_value(node):
+    '''Read a form field like sfFieldValue.'''
+    if node.tag == 'select':
+        return [' '.join(option.text_content().split())
+                for option in node.options() if option.state.get('selected')]
+    if node.tag == 'input' and node.input_type in ['checkbox', 'radio']:
+        return node.checked
+    if node.tag in ['input', 'textarea']:
+        return node.value
+    return None
+
+def _js_string(value):
+    '''Convert a value to a string the way JavaScript's String() does.'''
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _solid_png(width, height, color):
+    '''Return a PNG image of the given size filled with one RGB color.'''
+    rows = (b'\x00' + bytes(color) * width) * height
+    return (_PNG_SIGNATURE +
+            _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            _png_chunk(b'IDAT', zlib.compress(rows)) +
+            _png_chunk(b'IEND', b''))
+
+class _FakeWindow():
+    '''Browser window of a fake session with its current top-level document
+    and the urls of its navigation history.'''
+    def __init__(self, handle):
+        self.handle = handle
+        self.document = _FakeDocument('about:blank')
+        self.history = ['about:blank']
+        self.index = 0
+
+class _FakeSession():
+    '''State and W3C commands of one session of the fake backend.'''
+    def __init__(self, capabilities):
+        self.session_id = uuid.uuid4().hex
+        self.capabilities = capabilities
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.window = self._new_window()
+        self.frames = []
+        self.elements = {}
+        self.unloaded = set()   # cache_id of the documents that were unloaded
+        self.cookies = []
+        self.timeouts = {'implicit': 0, 'pageLoad': 300000, 'script': 30000}
+        self.rect = {'x': 0, 'y': 0, 'width': 800, 'height': 600}
+        self.blocked_urls = []
+        self.scripts = {
+            _JS_FIND_ALL         : lambda root, steps: _fake_find_all(root or self.context, steps),
+            _JS_ARE_CLICKABLE    : self._script_are_clickable,
+            _JS_CACHE_FIND       : self._script_cache_find,
+            _JS_CACHE_CHECK      : self._script_cache_check,
+            _JS_FILL_FORM        : self._script_fill_form,
+            _JS_SNAPSHOT_FORM    : self._script_snapshot_form,
+            _JS_EXTRACT_TABLE    : self._script_extract_table,
+            _JS_WAIT_FOR         : self._script_wait_for,
+            _JS_SETTLE           : lambda *args: True,
+            _JS_READY_STATE      : self._script_ready_state,
+            _JS_COLLECT_TIMING   : self._script_timing,
+            _JS_MARK_DOCUMENT    : lambda *args: None,
+            _JS_CLEAR_STORAGE    : self._script_clear_storage,
+            _JS_SCROLL_INTO_VIEW : lambda *args: None,
+        }
+
+    @property
+    def context(self):
+        '''Return the document of the current window or frame.'''
+        if self.window is None:
+            raise _FakeError(404, 'no such window', 'The current window was closed.')
+        return self.frames[-1] if self.frames else self.window.document
+
+    def _new_window(self):
+        '''Open a new window and return it.'''
+        window = _FakeWindow(f'fake-window-{len(self.windows) + 1}')
+        while window.handle in self.windows:
+            window.handle += '-1'
+        self.windows[window.handle] = window
+        return window
+
+    ############################################################################
+    # Element references
+    ############################################################################
+    def from_json(self, value):
+        '''Replace the element references in command arguments with nodes.'''
+        if isinstance(value, list):
+            return [self.from_json(item) for item in value]
+        if isinstance(value, dict):
+            if _ELEMENT_KEY in value:
+                return self.node(value[_ELEMENT_KEY])
+            return {key: self.from_json(item) for key, item in value.items()}
+        return value
+
+    def node(self, element_id):
+        '''Return the live node of an element reference.'''
+        node = self.elements.get(element_id)
+        if node is None and element_id.partition('.')[0] in self.unloaded:
+            raise _FakeError(404, 'stale element reference', 'The element is no longer attached.')
+        if node is None:
+            raise _FakeError(404, 'no such element', f'Unknown element: {element_id}')
+        if not node.is_connected():
+            raise _FakeError(404, 'stale element reference', 'The element is no longer attached.')
+        return node
+
+    def to_json(self, value):
+        '''Replace the nodes in a result with element references.'''
+        if isinstance(value, _FakeNode):
+            if value.element_id is None:
+                value.element_id = f'{value.document.cache_id}.{uuid.uuid4().hex}'
+            self.elements[value.element_id] = value
+            return {_ELEMENT_KEY: value.element_id}
+        if isinstance(value, (list, tuple)):
+            return [self.to_json(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.to_json(item) for key, item in value.items()}
+        return value
+
+    ############################################################################
+    # Navigation, windows and frames
+    ############################################################################
+    def load(self, url):
+        '''Load a url into a new document, timing the load.'''
+        start_time = time.perf_counter()
+        document = self._load(url)
+        document.load_seconds = time.perf_counter() - start_time
+        return document
+
+    def _load(self, url):
+        if url in ['', 'about:blank']:
+            return _FakeDocument('about:blank')
+        if any(re.fullmatch(re.escape(pattern).replace(r'\*', '.*'), url)
+               for pattern in self.blocked_urls):
+            return _FakeDocument(url)   # Like the error page of a blocked request
+        if url.startswith('data:'):
+            header, _, data = url.partition(',')
+            html = base64.b64decode(data).decode() if header.endswith(';base64') \
+                else urllib.parse.unquote(data)
+            return _FakeDocument(url, html)
+        try:
+            from urllib.request import urlopen
+            with urlopen(url) as response:
+                return _FakeDocument(url, response.read().decode('utf-8', 'replace'))
+        except (OSError, ValueError) as error:
+            raise _FakeError(500, 'unknown error', f'Unable to load {url}: {error}')
+
+    def navigate(self, url):
+        '''Replace the history after the current document with a new url.'''
+        document = self.load(url)
+        self.unload(self.window.document)
+        del self.window.history[self.window.index + 1:]
+        self.window.history.append(url)
+        self.window.index += 1
+        self.window.document = document
+        self.frames = []
+
+    def traverse(self, offset):
+        '''Go back or forward in the history.'''
+        index = self.window.index + offset
+        if 0 <= index < len(self.window.history):
+            document = self.load(self.window.history[index])
+            self.unload(self.window.document)
+            self.window.index = index
+            self.window.document = document
+        self.frames = []
+
+    def unload(self, document):
+        '''Close a top-level document and its frames, and drop the element
+        references into them; using one later is a stale element reference.'''
+        documents = [document]
+        for closed in documents:
+            documents.extend(closed.frames.values())
+            self.unloaded.add(closed.cache_id)
+        document.close()
+        self.elements = {element_id: node for element_id, node in self.elements.items()
+                         if node.document.alive}
+
+    def frame_document(self, frame):
+        '''Return the document of an iframe element, loading it on first use.'''
+        if frame.tag not in ['frame', 'iframe']:
+            raise _FakeError(404, 'no such frame', 'The element is not a frame.')
+        if frame not in frame.document.frames:
+            if 'srcdoc' in frame.attributes:
+                document = _FakeDocument('about:srcdoc', frame.attributes['srcdoc'])
+            else:
+                document = self.load(urllib.parse.urljoin(
+                    frame.document.url, frame.attributes.get('src', 'about:blank')))
+            frame.document.frames[frame] = document
+        return frame.document.frames[frame]
+
+    ############################################################################
+    # Commands
+    ############################################################################
+    def command(self, method, path, params):
+        '''Run the command for a method and path (relative to the session).'''
+        parts = path.strip('/').split('/') if path.strip('/') else []
+        if parts[:1] == ['element'] and len(parts) > 2:
+            node = self.node(parts[1])
+            return self.element_command(method, node, parts[2:], params)
+        route = (method, '/'.join(parts))
+        if route == ('DELETE', ''):
+            return None
+        if route == ('POST', 'url'):
+            return self.navigate(params['url'])
+        if route == ('GET', 'url'):
+            return self.context.url
+        if route == ('GET', 'title'):
+            return self.window.document.title
+        if route == ('GET', 'source'):
+            return self.context.html
+        if route in [('POST', 'back'), ('POST', 'forward'), ('POST', 'refresh')]:
+            return self.traverse({'back': -1, 'forward': 1, 'refresh': 0}[parts[0]])
+        if route == ('GET', 'timeouts'):
+            return self.timeouts
+        if route == ('POST', 'timeouts'):
+            return self.timeouts.update(params)
+        if route == ('GET', 'window'):
+            return self.context and self.window.handle
+        if route == ('GET', 'window/handles'):
+            return list(self.windows)
+        if route == ('POST', 'window'):
+            if params.get('handle') not in self.windows:
+                raise _FakeError(404, 'no such window', f'Unknown window: {params.get("handle")}')
+            self.window = self.windows[params['handle']]
+            self.frames = []
+            return None
+        if route == ('DELETE', 'window'):
+            self.unload(self.window.document)
+            del self.windows[self.window.handle]
+            self.window = None
+            return list(self.windows)
+        if route == ('POST', 'window/new'):
+            return {'handle': self._new_window().handle, 'type': 'window'}
+        if route == ('GET', 'window/rect'):
+            return self.rect
+        if route == ('POST', 'window/rect'):
+            self.rect.update({key: value for key, value in params.items() if value is not None})
+            return self.rect
+        if route == ('POST', 'frame'):
+            frame_id = params.get('id')
+            if frame_id is None:
+                self.frames = []
+                return None
+            if isinstance(frame_id, int):
+                frames = [node for node in self.context.elements()
+                          if node.tag in ['frame', 'iframe']]
+                if frame_id >= len(frames):
+                    raise _FakeError(404, 'no such frame', f'Unknown frame: {frame_id}')
+                frame = frames[frame_id]
+            else:
+                frame = self.from_json(frame_id)
+            self.frames.append(self.frame_document(frame))
+            return None
+        if route == ('POST', 'frame/parent'):
+            self.frames = self.frames[:-1]
+            return None
+        if route in [('POST', 'element'), ('POST', 'elements')]:
+            return self.find(self.context, parts[0], params)
+        if route == ('GET', 'element/active'):
+            return self.to_json(self.context.elements()[0])
+        if route in [('POST', 'execute/sync'), ('POST', 'execute/async')]:
+            return self.execute_script(params['script'], self.from_json(params.get('args', [])))
+        if route == ('GET', 'cookie'):
+            return self.cookies
+        if route == ('POST', 'cookie'):
+            self.cookies = [cookie for cookie in self.cookies
+                            if cookie['name'] != params['cookie']['name']]
+            self.cookies.append(params['cookie'])
+            return None
+        if route == ('DELETE', 'cookie'):
+            self.cookies = []
+            return None
+        if method == 'DELETE' and parts[:1] == ['cookie'] and len(parts) == 2:
+            self.cookies = [cookie for cookie in self.cookies if cookie['name'] != parts[1]]
+            return None
+        if parts[:1] == ['alert']:
+            raise _FakeError(404, 'no such alert', 'The fake backend never opens alerts.')
+        if route == ('POST', 'goog/cdp/execute'):
+            if params['cmd'] == 'Network.setBlockedURLs':
+                self.blocked_urls = params['params']['urls']
+            elif params['cmd'] == 'Network.clearBrowserCookies':
+                self.cookies = []
+            elif params['cmd'] not in ['Network.enable', 'Storage.clearDataForOrigin']:
+                raise _FakeError(500, 'unsupported operation',
+                                 f'Unsupported CDP command: {params["cmd"]}')
+            return {}
+        if route in [('POST', 'actions'), ('DELETE', 'actions')]:
+            return None
+        if route == ('GET', 'screenshot'):
+            return self.screenshot()
+        raise _FakeError(404, 'unknown command', f'Unsupported command: {method} {path}')
+
+    def element_command(self, method, node, parts, params):
+        '''Run a command on an element.'''
+        route = (method, parts[0])
+        if route in [('POST', 'element'), ('POST', 'elements')]:
+            return self.find(node, parts[0], params)
+        if route == ('GET', 'name'):
+            return node.tag
+        if route == ('GET', 'attribute'):
+            name = parts[1].lower()
+            if name in _BOOLEAN_ATTRIBUTES:
+                return 'true' if name in node.attributes else None
+            return node.attributes.get(name)
+        if route == ('GET', 'property'):
+            return self.get_property(node, parts[1])
+        if route == ('GET', 'css'):
+            style = node.style()
+            defaults = {'display': 'block' if node.is_displayed() else 'none',
+                        'visibility': 'visible', 'opacity': '1'}
+            return style.get(parts[1].lower(), defaults.get(parts[1].lower(), ''))
+        if route == ('GET', 'text'):
+            return node.rendered_text()
+        if route == ('GET', 'selected'):
+            return node.checked if node.tag == 'input' else bool(node.state.get('selected'))
+        if route == ('GET', 'enabled'):
+            return node.is_enabled()
+        if route == ('GET', 'displayed'):
+            return node.is_displayed()
+        if route == ('GET', 'rect'):
+            return self.get_rect(node)
+        if route == ('GET', 'screenshot'):
+            return self.screenshot()
+        if method == 'POST' and parts[0] in ['click', 'clear', 'value']:
+            if not node.is_displayed() or not node.is_enabled():
+                raise _FakeError(400, 'element not interactable',
+                                 'The element is not displayed or not enabled.')
+            if parts[0] == 'click':
+                return self.click(node)
+            if node.tag not in ['input', 'textarea']:
+                raise _FakeError(400, 'invalid element state', 'The element is not editable.')
+            if parts[0] == 'clear':
+                node.state['value'] = ''
+            else:
+                # Special keys (selenium Keys) are in the Unicode private use area
+                typed = ''.join(character for character in params.get('text', '')
+                                if not '\ue000' <= character <= '\uf8ff')
+                node.state['value'] = node.value + typed
+            return None
+        raise _FakeError(404, 'unknown command', f'Unsupported element command: {parts}')
+
+    def click(self, node):
+        '''Apply the default action of a click on an element.'''
+        if node.tag == 'input' and node.input_type == 'checkbox':
+            node.set_checked(not node.checked)
+        elif node.tag == 'input' and node.input_type == 'radio':
+            node.set_checked(True)
+        elif node.tag == 'option':
+            select = node.select()
+            if select is not None and 'multiple' in select.attributes:
+                node.set_selected(not node.state.get('selected'))
+            else:
+                node.set_selected(True)
+        return None
+
+    def find(self, root, command, params):
+        '''Find one element or a list of elements from a root node.'''
+        found = _fake_find(root, params['using'], params['value'])
+        if command == 'elements':
+            return self.to_json(found)
+        if not found:
+            raise _FakeError(404, 'no such element',
+                             f'Unable to locate element: {params["using"]}={params["value"]}')
+        return self.to_json(found[0])
+
+    def get_attribute(self, node, name):
+        '''Return an attribute like selenium's getAttribute atom:
+        the live value for properties and "true" or None for booleans.'''
+        name = name.lower()
+        if name == 'checked':
+            return 'true' if node.checked else None
+        if name == 'selected':
+            return 'true' if (node.checked if node.tag == 'input'
+                              else node.state.get('selected')) else None
+        if name in _BOOLEAN_ATTRIBUTES:
+            return 'true' if name in node.attributes else None
+        if name == 'value' and node.tag in ['input', 'option', 'select', 'textarea']:
+            return node.value
+        if name == 'type' and node.tag == 'input':
+            return node.input_type
+        if name == 'class':
+            return node.attributes.get('class', '')
+        return node.attributes.get(name)
+
+    def get_property(self, node, name):
+        '''Return a DOM property of an element.'''
+        if name == 'value':
+            return node.value
+        if name == 'checked':
+            return node.checked
+        if name == 'selected':
+            return bool(node.state.get('selected'))
+        if name == 'tagName':
+            return node.tag.upper()
+        if name in ['textContent', 'innerText']:
+            return node.text_content() if name == 'textContent' else node.rendered_text()
+        if name == 'type' and node.tag == 'input':
+            return node.input_type
+        if name in _BOOLEAN_ATTRIBUTES:
+            return name in node.attributes
+        if name == 'className':
+            return node.attributes.get('class', '')
+        return node.attributes.get(name)
+
+    def get_rect(self, node):
+        '''Return a simple layout: every displayed element is a 100 by 20 pixel
+        box, one below the other in document order.'''
+        if not node.is_displayed():
+            return {'x': 0, 'y': 0, 'width': 0, 'height': 0}
+        return {'x': 0, 'y': 20 * node.document.order[id(node)], 'width': 100, 'height': 20}
+
+    def screenshot(self):
+        '''Return a base64 PNG screenshot: a solid color that depends on
+        the page source, the size of the window.'''
+        seed = zlib.crc32(self.context.html.encode())
+        color = (seed & 255, seed >> 8 & 255, seed >> 16 & 255)
+        png = _solid_png(self.rect['width'], self.rect['height'], color)
+        return base64.b64encode(png).decode('ascii')
+
+    ############################################################################
+    # Scripts
+    ############################################################################
+    def execute_script(self, script, args):
+        '''Run one of the framework's in-page scripts or selenium's atoms.
+        Any other script cannot run without a JavaScript engine.'''
+        if script in self.scripts:
+            return self.to_json(self.scripts[script](*args))
+        if script.startswith('/* getAttribute */'):
+            return self.get_attribute(args[0], args[1])
+        if script.startswith('/* isDisplayed */'):
+            return args[0].is_displayed()
+        if script.strip() == 'return arguments[0][arguments[1]]':
+            return self.to_json(self.get_property(args[0], args[1]))
+        raise _FakeError(500, 'unsupported operation',
+                         'The fake backend can only run the framework\'s own scripts.')
+
+    def is_clickable(self, node, in_viewport=False):
+        '''Same checks as sfIsClickable.'''
+        if not (node.is_displayed() and node.is_enabled()):
+            return False
+        rect = self.get_rect(node)
+        return not in_viewport or rect['y'] < self.rect['height']
+
+    def _script_are_clickable(self, nodes, in_viewport, *args):
+        return [self.is_clickable(node, in_viewport) for node in nodes]
+
+    def _script_cache_find(self, root, steps, *args):
+        document = self.context
+        return [f'{document.cache_id}:0', _fake_find_all(root or document, steps)]
+
+    def _script_cache_check(self, token, nodes, *args):
+        return token == f'{self.context.cache_id}:0' and \
+               all(node.is_connected() for node in nodes)
+
+    def _script_clear_storage(self, *args):
+        parts = urllib.parse.urlsplit(self.context.url)
+        return f'{parts.scheme}://{parts.netloc}' if parts.netloc else 'null'
+
+    def _script_extract_table(self, root, table_steps, header, first, row_count,
+                              layout=None, *args):
+        table = root or self.context
+        if table_steps:
+            tables = _fake_find_all(table, table_steps)
+            table = tables[0] if tables else None
+        if table is None or table.tag != 'table':
+            return None
+        children = _element_children(table)
+        head = next((child for child in children if child.tag == 'thead'), None)
+        def section_rows(tags):
+            return [row for child in children if child.tag in tags
+                    for row in ([child] if child.tag == 'tr' else _element_children(child))
+                    if row.tag == 'tr']
+        # Like table.rows: thead rows first and tfoot rows last
+        rows = section_rows(['thead']) + section_rows(['tr', 'tbody']) + section_rows(['tfoot'])
+        def cells(row):
+            return [cell for cell in _element_children(row) if cell.tag in ['td', 'th']]
+        def span(cell):
+            try:
+                return max(int(cell.attributes.get('colspan', 1)), 1)
+            except ValueError:
+                return 1
+        def cell_texts(row):
+            return [cell.rendered_text() for cell in cells(row) for _ in range(span(cell))]
+        header_row = None
+        if layout is None:
+            head_rows = [row for row in rows if head is not None and row.parent is head]
+            if header and head_rows:
+                header_row = head_rows[0]
+            elif header and rows and all(cell.tag == 'th' for cell in cells(rows[0])):
+                header_row = rows[0]
+            skip = 0 if header_row is None else len(head_rows) if header_row.parent is head else 1
+            width = max([sum(span(cell) for cell in cells(row)) for row in rows], default=0)
+            layout = [skip, width, len(rows) - skip]
+        skip, width, body_rows = layout
+        last = body_rows if row_count is None else min(body_rows, first + row_count)
+        chunk = rows[skip + first:skip + last]
+        columns = [[None] * len(chunk) for _ in range(width)]
+        for index, row in enumerate(chunk):
+            for column, text in enumerate(cell_texts(row)):
+                columns[column][index] = text
+        return {'headers': cell_texts(header_row) if header_row else None,
+                'columns': columns, 'layout': layout}
+
+    def _script_fill_form(self, root, fields, append, *args):
+        results = []
+        for steps, wanted in fields:
+            elements = _fake_find_all(root or self.context, steps)
+            if not elements:
+                results.append(None)
+                continue
+            radios = [node for node in elements
+                      if node.tag == 'input' and node.input_type == 'radio']
+            if len(radios) == len(elements) and not isinstance(wanted, bool):
+                for radio in radios:
+                    if radio.value == _js_string(wanted):
+                        radio.set_checked(True)
+                results.append([radio.value for radio in radios if radio.checked])
+                continue
+            node = elements[0]
+            if node.tag == 'select':
+                items = [_js_string(item) for item in wanted] \
+                    if isinstance(wanted, list) else [_js_string(wanted)]
+                for option in node.options():
+                    if ' '.join(option.text_content().split()) in items:
+                        option.set_selected(True)
+                    elif not append and isinstance(wanted, list):
+                        option.set_selected(False)
+            elif node.tag == 'input' and node.input_type in ['checkbox', 'radio']:
+                node.set_checked(bool(wanted))
+            elif node.tag in ['input', 'textarea']:
+                text = _js_string(wanted)
+                node.state['value'] = node.value + text if append else text
+            else:
+                results.append(None)
+                continue
+            results.append(_fake_field_value(node))
+        return results
+
+    def _script_ready_state(self, state, timeout, timing=False, *args):
+        # Pages load synchronously, so they are always complete.
+        return self._script_timing() if timing else True
+
+    def _script_timing(self, *args):
+        document = self.context
+        load_ms = round(document.load_seconds * 1000, 3)
+        milestones = ['fetchStart', 'requestStart', 'responseStart', 'responseEnd',
+                      'domInteractive', 'domContentLoadedEventEnd', 'domComplete',
+                      'loadEventEnd']
+        navigation = {'name': document.url, 'entryType': 'navigation', 'startTime': 0,
+                      'duration': load_ms, 'transferSize': len(document.html)}
+        navigation.update({name: load_ms if name.startswith(('response', 'dom', 'load'))
+                           else 0 for name in milestones})
+        return {'url': document.url, 'navigation': navigation, 'resources': []}
+
+    def _script_snapshot_form(self, root, container_steps, *args):
+        root = root or self.context
+        if container_steps:
+            containers = _fake_find_all(self.context, container_steps)
+            if not containers:
+                return None
+            root = containers[0]
+        snapshot = {}
+        fields = [node for node in root.elements()
+                  if node.tag in ['input', 'select', 'textarea']]
+        for index, node in enumerate(fields):
+            name = node.attributes.get('id') or node.attributes.get('name')
+            key = name or f'{node.tag}[{index}]'
+            count = 1
+            while key in snapshot:
+                key = f'{name}[{count}]'
+                count += 1
+            snapshot[key] = {
+                'tag': node.tag,
+                'type': (node.input_type if node.tag == 'input' else
+                         'select-multiple' if 'multiple' in node.attributes else
+                         'select-one' if node.tag == 'select' else node.tag),
+                'name': node.attributes.get('name') or None,
+                'id': node.attributes.get('id') or None,
+                'value': _fake_field_value(node),
+            }
+        return snapshot
+
+    def _script_wait_for(self, root, steps, clickable, *args):
+        # Fake pages never change by themselves, so there is nothing to wait for.
+        elements = _fake_find_all(root or self.context, steps)
+        if clickable:
+            elements = [node for node in elements if self.is_clickable(node)]
+        return elements
+
+@lru_cache(maxsize=None)
+def _fake_request_handler_class():
+    '''Return the HTTP request handler class of FakeWebDriverServer.
+    It is created on first use, as http.server is imported lazily.'''
+    from http.server import BaseHTTPRequestHandler
+
+    class _FakeRequestHandler(BaseHTTPRequestHandler):
+        '''HTTP front end of a FakeWebDriverServer.'''
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # Headers and body are written separately
+
+        def setup(self):
+            super().setup()
+            self.server.fake.count_connection()
+
+        def do_DELETE(self):
+            self._respond('DELETE')
+
+        def do_GET(self):
+            self._respond('GET')
+
+        def do_POST(self):
+            self._respond('POST')
+
+        def log_message(self, *args):
+            pass    # Keep test output clean
+
+        def _respond(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            status, payload = self.server.fake.handle(method, self.path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return _FakeRequestHandler
+
+class FakeWebDriverServer():
+    '''
+    In-process stand-in for a WebDriver server (a browser driver or a grid
+    hub). It serves the W3C commands that the framework uses from an
+    in-memory DOM parsed from the page HTML, so framework logic can be tested
+    in milliseconds without a browser. It has no JavaScript engine: page
+    scripts never run, and only the framework's own in-page scripts and
+    selenium's attribute and visibility atoms are emulated.
+    Use it through Driver.open(config={'browser': 'Fake'}).
+    '''
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.sessions = {}
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def url(self):
+        '''Return the base url of the server.'''
+        return f'http://{self.host}:{self.port}'
+
+    def count_connection(self):
+        '''Count a new client connection.'''
+        with self._lock:
+            self.connections += 1
+
+    def handle(self, method, path, body):
+        '''Given an HTTP method, path and body,
+        run the WebDriver command and return the status and payload.'''
+        path = urllib.parse.urlsplit(path).path
+        if path.startswith('/wd/hub'):
+            path = path[len('/wd/hub'):]
+        parts = path.strip('/').split('/')
+        with self._lock:
+            self.requests += 1
+        try:
+            params = json.loads(body) if body else {}
+            if (method, parts) == ('GET', ['status']):
+                return 200, {'value': {'ready': True, 'message': 'Fake backend ready'}}
+            if (method, parts) == ('POST', ['session']):
+                session = _FakeSession(params.get('capabilities', {}))
+                with self._lock:
+                    self.sessions[session.session_id] = session
+                capabilities = {'browserName': 'fake', 'browserVersion': __version__,
+                                'platformName': 'any', 'acceptInsecureCerts': False,
+                                'pageLoadStrategy': 'normal',
+                                'timeouts': session.timeouts}
+                return 200, {'value': {'sessionId': session.session_id,
+                                       'capabilities': capabilities}}
+            if parts[0] != 'session' or len(parts) < 2:
+                raise _FakeError(404, 'unknown command', f'Unsupported command: {path}')
+            with self._lock:
+                session = self.sessions.get(parts[1])
+            if session is None:
+                raise _FakeError(404, 'invalid session id', f'Unknown session: {parts[1]}')
+            # Sessions run their commands (and page loads) without blocking each other
+            with session.lock:
+                value = session.command(method, '/'.join(parts[2:]), params)
+                ended = (method == 'DELETE' and len(parts) == 2) or not session.windows
+            if ended:
+                with self._lock:    # Closing the last window ends the session
+                    self.sessions.pop(parts[1], None)
+            return 200, {'value': value}
+        except _FakeError as error:
+            return error.status, {'value': {'error': error.error,
+                                            'message': error.message,
+                                            'stacktrace': ''}}
+        except Exception as error:
+            return 500, {'value': {'error': 'unknown error',
+                                   'message': f'{type(error).__name__}: {error}',
+                                   'stacktrace': ''}}
+
+    def start(self):
+        '''Start serving on a background thread and return the server.'''
+        from http.server import ThreadingHTTPServer
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _fake_request_handler_class())
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        '''Stop serving.'''
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+_FAKE_SERVER = {'server': None, 'lock': threading.Lock()}
+
+def fake_server():
+    '''Return the FakeWebDriverServer of this process, starting it on first use.'''
+    with _FAKE_SERVER['lock']:
+        if _FAKE_SERVER['server'] is None:
+            _FAKE_SERVER['server'] = FakeWebDriverServer().start()
+        return _FAKE_SERVER['server']
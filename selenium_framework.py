@@ -34,29 +34,564 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.'''
 ################################################################################
 
+import base64
+import bisect
+import csv
+import hashlib
+import importlib
+import io
+import itertools
+import json
+import os
+import queue
 import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
 import time
+import urllib.parse
+import zlib
+from collections                                import deque
+from concurrent.futures                         import ThreadPoolExecutor
+from contextlib                                 import contextmanager
 from datetime                                   import datetime
+from functools                                  import lru_cache
+from functools                                  import partial
+from functools                                  import wraps
 
-from selenium                                   import webdriver as WD
-from selenium.webdriver.common.action_chains    import ActionChains as AC
-from selenium.webdriver.common.by               import By
-from selenium.webdriver.common.keys             import Keys
-from selenium.webdriver.support                 import expected_conditions as EC
-from selenium.webdriver.support.ui              import Select
-from selenium.webdriver.support.ui              import WebDriverWait
-from selenium.webdriver.remote.webelement       import WebElement
 from selenium.common.exceptions                 import NoAlertPresentException
+from selenium.common.exceptions                 import StaleElementReferenceException
 from selenium.common.exceptions                 import TimeoutException
+from selenium.common.exceptions                 import UnexpectedAlertPresentException
 from selenium.common.exceptions                 import WebDriverException
+
+class _LazyImport():
+    '''
+    Stand-in for an imported module or class that imports it on first use.
+    Importing selenium.webdriver takes most of the import time of the
+    framework, so processes that only use the browser-independent utilities
+    or fan out workers never pay for it.
+    isinstance checks work without importing: an instance can only exist
+    once its module has been imported.
+    '''
+    def __init__(self, module_name, attribute=None):
+        self._module_name = module_name
+        self._attribute = attribute
+        self._target = None
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __instancecheck__(self, instance):
+        module = sys.modules.get(self._module_name)
+        return module is not None and isinstance(instance, self._load())
+
+    def _load(self):
+        if self._target is None:
+            target = importlib.import_module(self._module_name)
+            self._target = getattr(target, self._attribute) if self._attribute else target
+        return self._target
+
+AC                  = _LazyImport('selenium.webdriver.common.action_chains', 'ActionChains')
+Keys                = _LazyImport('selenium.webdriver.common.keys', 'Keys')
+Select              = _LazyImport('selenium.webdriver.support.ui', 'Select')
+WD                  = _LazyImport('selenium.webdriver')
+WebDriverWait       = _LazyImport('selenium.webdriver.support.ui', 'WebDriverWait')
+WebElement          = _LazyImport('selenium.webdriver.remote.webelement', 'WebElement')
+asyncio             = _LazyImport('asyncio')
+numpy               = _LazyImport('numpy')          # Optional
+pandas              = _LazyImport('pandas')         # Optional
+Image               = _LazyImport('PIL.Image')      # Optional
+Finalize            = _LazyImport('multiprocessing.util', 'Finalize')
+ProcessPoolExecutor = _LazyImport('concurrent.futures', 'ProcessPoolExecutor')
+unittest            = _LazyImport('unittest')
+FakeWebDriverServer = _LazyImport('fake_backend', 'FakeWebDriverServer')
+fake_server         = _LazyImport('fake_backend', 'fake_server')
 # from selenium.webdriver.remote.webdriver        import WebDriver
 # from selenium.common                            import exceptions as EX
 # from selenium.common.exceptions                 import NoSuchElementException
 
+################################################################################
+# In-page Scripts
+################################################################################
+# Locate elements from a root node with a selenium "By" strategy.
+_JS_FIND = '''
+function sfFind(root, by, value) {
+    var quote = function(text) { return '"' + CSS.escape(text) + '"'; };
+    var links = function(match) {
+        return Array.prototype.filter.call(root.querySelectorAll('a'), function(link) {
+            return match(link.textContent.trim());
+        });
+    };
+    switch (by) {
+        case 'id':
+            return Array.from(root.querySelectorAll('[id=' + quote(value) + ']'));
+        case 'name':
+            return Array.from(root.querySelectorAll('[name=' + quote(value) + ']'));
+        case 'class name':
+            return Array.from(root.querySelectorAll('.' + CSS.escape(value)));
+        case 'css selector':
+            return Array.from(root.querySelectorAll(value));
+        case 'tag name':
+            return Array.from(root.getElementsByTagName(value));
+        case 'link text':
+            return links(function(text) { return text === value; });
+        case 'partial link text':
+            return links(function(text) { return text.indexOf(value) > -1; });
+        case 'xpath':
+            var doc = root.ownerDocument || root;
+            var snapshot = doc.evaluate(
+                value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            var nodes = [];
+            for (var i = 0; i < snapshot.snapshotLength; i++) {
+                nodes.push(snapshot.snapshotItem(i));
+            }
+            return nodes;
+    }
+    throw new Error('Unsupported locator type: ' + by);
+}
+
+function sfFindAll(root, steps) {
+    var found = [root];
+    steps.forEach(function(step) {
+        var seen = new Set();
+        found.forEach(function(node) {
+            sfFind(node, step[0], step[1]).forEach(function(element) {
+                seen.add(element);
+            });
+        });
+        found = Array.from(seen);
+        if (found.length > 1) {
+            found.sort(function(a, b) {
+                return a.compareDocumentPosition(b) & Node.DOCUMENT_POSITION_FOLLOWING ? -1 : 1;
+            });
+        }
+    });
+    return found;
+}
+'''
+
+# arguments: root element or null, [[by, value], ...]
+_JS_FIND_ALL = _JS_FIND + '''
+return sfFindAll(arguments[0] || document, arguments[1]);
+'''
+
+# Read a form field the same way Driver.is_field_set does.
+_JS_FIELD_VALUE = '''
+function sfFieldValue(field) {
+    var tag = field.tagName.toLowerCase();
+    if (tag === 'select') {
+        return Array.prototype.filter.call(field.options, function(option) {
+            return option.selected;
+        }).map(function(option) { return option.text; });
+    }
+    if (tag === 'input' && (field.type === 'checkbox' || field.type === 'radio')) {
+        return field.checked;
+    }
+    if (tag === 'input' || tag === 'textarea') {
+        return field.value;
+    }
+    return null;
+}
+'''
+
+# Find elements and return them with the page's cache token. The token
+# changes when the page navigates or the DOM changes (style changes aside).
+# arguments: root element or null, [[by, value], ...]
+_JS_CACHE_FIND = _JS_FIND + '''
+if (!window.__sfCacheId) {
+    window.__sfCacheId = Math.random().toString(36).slice(2);
+    window.__sfGeneration = 0;
+    new MutationObserver(function(mutations) {
+        if (mutations.some(function(mutation) { return mutation.attributeName !== 'style'; })) {
+            window.__sfGeneration++;
+        }
+    }).observe(document, {subtree: true, childList: true, attributes: true});
+}
+return [window.__sfCacheId + ':' + window.__sfGeneration,
+        sfFindAll(arguments[0] || document, arguments[1])];
+'''
+
+# arguments: cache token, [element, ...]
+_JS_CACHE_CHECK = '''
+return window.__sfCacheId + ':' + window.__sfGeneration === arguments[0] &&
+       arguments[1].every(function(element) { return element.isConnected; });
+'''
+
+# Same checks as Driver.is_element_clickable, optionally limited to the viewport.
+_JS_IS_CLICKABLE = '''
+function sfIsClickable(element, inViewport) {
+    var style = window.getComputedStyle(element);
+    var rect = element.getBoundingClientRect();
+    if (!element.getClientRects().length ||
+            style.visibility !== 'visible' ||
+            Number(style.opacity) === 0 ||
+            element.matches(':disabled') ||
+            rect.width <= 0 || rect.height <= 0) {
+        return false;
+    }
+    return !inViewport || (rect.bottom > 0 && rect.right > 0 &&
+                           rect.top < window.innerHeight && rect.left < window.innerWidth);
+}
+'''
+
+# arguments: [element, ...], in_viewport
+_JS_ARE_CLICKABLE = _JS_IS_CLICKABLE + '''
+var inViewport = arguments[1];
+return arguments[0].map(function(element) {
+    return sfIsClickable(element, inViewport);
+});
+'''
+
+# Resolve once the page is quiet: no DOM mutations, scrolling or finite
+# animations for a quiet period, checked on animation frames.
+# arguments: element to scroll into view or null, quiet_ms, timeout_ms, callback
+_JS_SETTLE = '''
+var element = arguments[0], quiet = arguments[1], timeout = arguments[2];
+var done = arguments[arguments.length - 1];
+if (element) {
+    element.scrollIntoView(true);
+}
+var last = performance.now(), scrollX = window.scrollX, scrollY = window.scrollY;
+var observer = new MutationObserver(function() { last = performance.now(); });
+observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+var finished = false;
+var finish = function() {
+    if (!finished) {
+        finished = true;
+        observer.disconnect();
+        done(true);
+    }
+};
+var animating = function() {
+    return document.getAnimations && document.getAnimations().some(function(animation) {
+        return animation.playState === 'running' &&
+               animation.effect.getComputedTiming().endTime !== Infinity;
+    });
+};
+var check = function() {
+    var now = performance.now();
+    if (window.scrollX !== scrollX || window.scrollY !== scrollY || animating()) {
+        scrollX = window.scrollX;
+        scrollY = window.scrollY;
+        last = now;
+    }
+    if (now - last >= quiet) {
+        finish();
+    } else if (!finished) {
+        window.requestAnimationFrame(check);
+    }
+};
+window.requestAnimationFrame(function() { window.requestAnimationFrame(check); });
+window.setTimeout(finish, timeout);
+'''
+
+# Resolve with the matching elements as soon as they exist (and are clickable,
+# if requested), or with an empty list at the timeout. DOM mutations trigger
+# the checks; clickable waits also poll for changes that do not mutate the DOM.
+# arguments: root element or null, [[by, value], ...], clickable, timeout_ms, callback
+_JS_WAIT_FOR = _JS_FIND + _JS_IS_CLICKABLE + '''
+var root = arguments[0] || document, steps = arguments[1];
+var clickable = arguments[2], timeout = arguments[3];
+var done = arguments[arguments.length - 1];
+var finished = false, observer = null, timer = null, poll = null;
+var finish = function(elements) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    if (observer) {
+        observer.disconnect();
+    }
+    window.clearTimeout(timer);
+    window.clearInterval(poll);
+    done(elements);
+};
+var check = function() {
+    var elements = sfFindAll(root, steps);
+    if (clickable) {
+        elements = elements.filter(function(element) { return sfIsClickable(element, false); });
+    }
+    if (elements.length) {
+        finish(elements);
+    }
+};
+check();
+if (!finished) {
+    observer = new MutationObserver(check);
+    observer.observe(document, {subtree: true, childList: true, attributes: true});
+    timer = window.setTimeout(function() { finish([]); }, timeout);
+    if (clickable) {
+        poll = window.setInterval(check, 100);
+    }
+}
+'''
+
+# Mark the current document, so readiness waits can tell it from the next one
+# when the page load strategy "none" returns before the navigation commits.
+_JS_MARK_DOCUMENT = 'window.__sfOldDocument = true;'
+
+# Return the url, Navigation Timing entry and Resource Timing entries of the page.
+_JS_TIMING = '''
+function sfTiming() {
+    var toJSON = function(entry) { return entry.toJSON(); };
+    var navigation = performance.getEntriesByType('navigation').map(toJSON);
+    return {url: document.URL,
+            navigation: navigation.length ? navigation[0] : null,
+            resources: performance.getEntriesByType('resource').map(toJSON)};
+}
+'''
+
+_JS_COLLECT_TIMING = _JS_TIMING + 'return sfTiming();'
+
+# Resolve with true (or the timing entries, if requested) once
+# document.readyState reaches the given state, or with false at the timeout.
+# A marked document never resolves: its unload fails the script, which is
+# then run again in the new document.
+# arguments: 'loading', 'interactive' or 'complete', timeout_ms, timing, callback
+_JS_READY_STATE = _JS_TIMING + '''
+var state = arguments[0], timeout = arguments[1], timing = arguments[2];
+var done = arguments[arguments.length - 1];
+var states = ['loading', 'interactive', 'complete'];
+var ready = function() {
+    return !window.__sfOldDocument &&
+           states.indexOf(document.readyState) >= states.indexOf(state);
+};
+var finish = function() { done(timing ? sfTiming() : true); };
+if (ready()) {
+    finish();
+} else {
+    var timer = window.setTimeout(function() { done(false); }, timeout);
+    document.addEventListener('readystatechange', function() {
+        if (ready()) {
+            window.clearTimeout(timer);
+            finish();
+        }
+    });
+}
+'''
+
+# Returns the origin of the page, for clearing the rest of its data over CDP.
+_JS_CLEAR_STORAGE = '''
+try {
+    window.localStorage.clear();
+    window.sessionStorage.clear();
+} catch (error) {}  // Storage is not available on every page (e.g. about:blank)
+return window.location.origin;
+'''
+
+_JS_SCROLL_INTO_VIEW = 'arguments[0].scrollIntoView(true);'
+
+# arguments: root element or null, [[[by, value], ...], field_value], ...], append
+_JS_FILL_FORM = _JS_FIND + _JS_FIELD_VALUE + '''
+var root = arguments[0] || document, fields = arguments[1], append = arguments[2];
+var fire = function(field) {
+    field.dispatchEvent(new Event('input', {bubbles: true}));
+    field.dispatchEvent(new Event('change', {bubbles: true}));
+};
+var setText = function(field, text) {
+    // Use the native setter so frameworks tracking the value see the change.
+    var setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(field), 'value').set;
+    setter.call(field, append ? field.value + text : text);
+};
+var setSelect = function(field, wanted) {
+    var items = Array.isArray(wanted) ? wanted.map(String) : [String(wanted)];
+    Array.prototype.forEach.call(field.options, function(option) {
+        if (items.indexOf(option.text.trim()) > -1) {
+            option.selected = true;
+        } else if (!append && Array.isArray(wanted)) {
+            option.selected = false;
+        }
+    });
+};
+return fields.map(function(field) {
+    var elements = sfFindAll(root, field[0]), wanted = field[1];
+    if (!elements.length) {
+        return null;
+    }
+    var radios = elements.filter(function(element) { return element.type === 'radio'; });
+    if (radios.length === elements.length && typeof wanted !== 'boolean') {
+        radios.forEach(function(radio) {
+            if (radio.value === String(wanted) && !radio.checked) {
+                radio.checked = true;
+                fire(radio);
+            }
+        });
+        return radios.filter(function(radio) {
+            return radio.checked;
+        }).map(function(radio) { return radio.value; });
+    }
+    var element = elements[0], tag = element.tagName.toLowerCase();
+    if (tag === 'select') {
+        setSelect(element, wanted);
+    } else if (tag === 'input' && (element.type === 'checkbox' || element.type === 'radio')) {
+        element.checked = Boolean(wanted);
+    } else if (tag === 'input' || tag === 'textarea') {
+        setText(element, String(wanted));
+    } else {
+        return null;
+    }
+    fire(element);
+    return sfFieldValue(element);
+});
+'''
+
+# arguments: root element or null, [[by, value], ...] of the root or null
+_JS_SNAPSHOT_FORM = _JS_FIND + _JS_FIELD_VALUE + '''
+var root = arguments[0] || document;
+if (arguments[1]) {
+    root = sfFindAll(document, arguments[1])[0];
+    if (!root) {
+        return null;
+    }
+}
+var snapshot = {};
+Array.prototype.forEach.call(root.querySelectorAll('input, select, textarea'), function(field, index) {
+    var key = field.id || field.name || field.tagName.toLowerCase() + '[' + index + ']';
+    for (var count = 1; key in snapshot; count++) {
+        key = (field.id || field.name) + '[' + count + ']';
+    }
+    snapshot[key] = {
+        tag: field.tagName.toLowerCase(),
+        type: field.type || null,
+        name: field.name || null,
+        id: field.id || null,
+        value: sfFieldValue(field)
+    };
+});
+return snapshot;
+'''
+
+# The first call returns the layout of the table, [header rows to skip, width,
+# body rows], and later chunks pass it back, so they only walk their own rows.
+# arguments: root element or null, [[by, value], ...] of the table or null,
+#            header, first row, row count or null, layout or null
+_JS_EXTRACT_TABLE = _JS_FIND + '''
+var root = arguments[0] || document, header = arguments[2], layout = arguments[5];
+var table = arguments[1] ? sfFindAll(root, arguments[1])[0] : root;
+if (!table || !table.rows) {
+    return null;
+}
+var cellTexts = function(row) {
+    var texts = [];
+    Array.prototype.forEach.call(row.cells, function(cell) {
+        var text = cell.innerText.trim();
+        for (var span = cell.colSpan || 1; span > 0; span--) {
+            texts.push(text);
+        }
+    });
+    return texts;
+};
+// table.rows lists the thead rows first, so the body rows follow the skipped ones
+var rows = table.rows, headerRow = null;
+if (!layout) {
+    if (header && table.tHead && table.tHead.rows.length) {
+        headerRow = table.tHead.rows[0];
+    } else if (header && rows.length && Array.prototype.every.call(rows[0].cells, function(cell) {
+        return cell.tagName === 'TH';
+    })) {
+        headerRow = rows[0];
+    }
+    var skip = !headerRow ? 0 : headerRow.parentNode === table.tHead ? table.tHead.rows.length : 1;
+    var width = 0;
+    Array.prototype.forEach.call(rows, function(row) {
+        width = Math.max(width, Array.prototype.reduce.call(row.cells, function(total, cell) {
+            return total + (cell.colSpan || 1);
+        }, 0));
+    });
+    layout = [skip, width, rows.length - skip];
+}
+var first = arguments[3] || 0;
+var last = arguments[4] == null ? layout[2] : Math.min(layout[2], first + arguments[4]);
+var columns = [];
+for (var column = 0; column < layout[1]; column++) {
+    columns.push(new Array(Math.max(last - first, 0)).fill(null));
+}
+for (var index = first; index < last; index++) {
+    cellTexts(rows[layout[0] + index]).forEach(function(text, column) {
+        columns[column][index - first] = text;
+    });
+}
+return {headers: headerRow ? cellTexts(headerRow) : null, columns: columns, layout: layout};
+'''
+
 class FrameworkException(WebDriverException):
     '''Framework exception for deliberately thrown exceptions.'''
     # pass
 
+_LOCATOR_TYPES = {     # The W3C locator strategies of selenium's By
+    'id'    : 'id',
+    'name'  : 'name',
+    'css'   : 'css selector',
+    'class' : 'class name',
+    'link'  : 'link text',
+    'plink' : 'partial link text',
+    'tag'   : 'tag name',
+    'xpath' : 'xpath',
+    'window': 'window',
+    'frame' : 'frame',
+}
+# Chained steps are split only where ">>" starts a new "type=" step, so values
+# like 'xpath=//a[text()=">>"]' can contain it.
+_LOCATOR_CHAIN = re.compile(r'>>(?=\s*(?:' + '|'.join(_LOCATOR_TYPES) + r')\s*=)')
+
+def _is_unload_error(error):
+    '''Given a WebDriverException, return True if it was caused by the
+    document unloading while a command ran in it.'''
+    return isinstance(error, StaleElementReferenceException) or \
+        'unload' in (error.msg or '').lower()
+
+class Locator():
+    '''
+    A locator string in the form "type=value", parsed and validated once.
+    Steps can be chained with ">>" to search inside the results of the
+    previous step, e.g. "css=form >> name=q >> xpath=..". A ">>" that is
+    not followed by a locator type is part of the value.
+    Locators are interned, so the same string always returns the same object.
+    '''
+    __slots__ = ('text', 'steps')
+
+    def __new__(cls, locator_string):
+        if isinstance(locator_string, Locator):
+            return locator_string
+        return _compile_locator(locator_string.strip())
+
+    def __repr__(self):
+        return f'Locator({self.text!r})'
+
+    @property
+    def by(self):
+        '''Return the locator type of the last step.'''
+        return self.steps[-1][0]
+
+    @property
+    def value(self):
+        '''Return the locator value of the last step.'''
+        return self.steps[-1][1]
+
+@lru_cache(maxsize=1024)
+def _compile_locator(locator_string):
+    '''Given a locator string, parse and validate it and
+    return a new Locator.'''
+    steps = []
+    for step in _LOCATOR_CHAIN.split(locator_string):
+        separator = step.find('=')
+        locator_type = step[:separator].strip()
+        if separator < 0 or locator_type not in _LOCATOR_TYPES:
+            raise FrameworkException(f'Invalid locator: {locator_string}')
+        steps.append((_LOCATOR_TYPES[locator_type], step[separator + 1:].strip()))
+    if len(steps) > 1 and any(step[0] in ['window', 'frame'] for step in steps):
+        raise FrameworkException(f'Windows and frames cannot be chained: {locator_string}')
+    locator = object.__new__(Locator)
+    locator.text = locator_string
+    locator.steps = tuple(steps)
+    return locator
+
 class Driver():
     '''
     Main framework object. Everything runs from an instance of this object.
@@ -66,10 +601,92 @@ class Driver():
         self.close = None
         self.web_element = WebElement
         self.keys = Keys
+        self.settle_delay = None    # Fixed wait after interactions instead of settling
+        self.settle_quiet = .05
+        self.settle_timeout = 2
+        self._script_timeout = 30   # W3C default
+        self._cdp = None            # Whether the browser takes CDP commands, once known
+        self.element_cache = False  # False, 'navigation' or True (checks the DOM per hit)
+        self._element_cache = {}
+        self._navigation = 0        # Counts goto, switch_to and reset, for Page caches
+        self._frame = ()
+        self.page_load_strategy = 'normal'     # 'normal', 'eager' or 'none'
+        self.timing = False         # Collect page timing in goto by default
+        self.timing_log = []
+        self.capture_dir = 'screenshots'
+        self.capture_scale = None   # Downscale factor of captures (needs Pillow)
+        self.capture_compression = None     # zlib level to recompress captures with
+        self.capture_workers = 2
+        self.capture_queue = 8      # Captures waiting to be written before capture blocks
+        self._captures = None
+        self.metrics = None
+        self._metrics_local = threading.local()
+        self._calls = itertools.count(1)
+        self._trace = None
+        self._quitting = False
 
     ############################################################################
     # Browser-dependent Methods
     ############################################################################
+    def are_clickable(self, webelements, in_viewport=False):
+        '''Given a list of web elements,
+        determine in a single browser call which of them are eligable to
+        click on (displayed, enabled and with a size) and
+        return a list of booleans in the same order.
+        If in_viewport is True, elements outside of the viewport are
+        not considered clickable.'''
+        if isinstance(webelements, WebElement):
+            webelements = [webelements]
+        if not webelements:
+            return []
+        return self.browser.execute_script(_JS_ARE_CLICKABLE, webelements, in_viewport)
+
+    def capture(self, name):
+        '''Given a name, take a screenshot of the browser window,
+        queue it to be written in the background as
+        capture_dir/<name>_<timestamp>.png and return that path.
+        The screenshot is decoded, downscaled by capture_scale (with
+        Pillow), recompressed at the capture_compression zlib level and
+        saved by a pool of capture_workers threads, so the test only waits
+        for the browser. When capture_queue screenshots are waiting,
+        capture blocks until one is written. close flushes the queue.'''
+        if self.capture_scale not in [None, 1]:
+            try:
+                Image.Image     # Import Pillow now to fail before queueing
+            except ImportError:
+                self.throw('Downscaling captures needs the Pillow package.')
+        if self._captures is None:
+            os.makedirs(self.capture_dir, exist_ok=True)
+            self._captures = {
+                'executor': ThreadPoolExecutor(self.capture_workers,
+                                               thread_name_prefix='capture'),
+                'slots': threading.BoundedSemaphore(self.capture_queue),
+                'futures': [],
+                'paths': set(),
+            }
+            self.close = self._flush_captures_on(self.close)
+        captures = self._captures
+        base_name = self.make_valid_name(f'{name} {self.get_timestamp()}').replace(':', '')
+        path = os.path.join(self.capture_dir, f'{base_name}.png')
+        count = 1
+        while path in captures['paths']:
+            path = os.path.join(self.capture_dir, f'{base_name}[{count}].png')
+            count += 1
+        captures['slots'].acquire()
+        try:
+            data = self.browser.get_screenshot_as_base64()
+            future = captures['executor'].submit(
+                _write_capture, data, path, self.capture_scale, self.capture_compression)
+        except BaseException:
+            captures['slots'].release()
+            raise
+        future.add_done_callback(lambda future: captures['slots'].release())
+        captures['paths'].add(path)
+        # Keep the futures that are running or failed, for flush_captures.
+        captures['futures'] = [future for future in captures['futures']
+                               if not future.done() or future.exception()] + [future]
+        return path
+
     def check_alert(self, accept_alert=True):
         '''Given that this method is called when a browser alert is present,
         retrieve the message in the alert,
@@ -100,11 +717,25 @@ class Driver():
                 .send_keys(Keys.ARROW_DOWN)\
                 .send_keys(Keys.ENTER)\
                 .perform()
-            self.wait(.5)
+            self._settle()
             return True
         except WebDriverException:
             return False
 
+    def block_urls(self, url_patterns):
+        '''Given a list of url patterns, where "*" matches any characters,
+        make the browser fail the requests to matching urls, e.g.
+        ['*.png', '*://*.doubleclick.net/*']. An empty list stops blocking.
+        Uses the Chrome DevTools Protocol, so it needs a Chromium browser,
+        local or on a remote hub.'''
+        self._execute_cdp('Network.enable', {})
+        self._execute_cdp('Network.setBlockedURLs', {'urls': list(url_patterns)})
+
+    def clear_element_cache(self):
+        '''Forget every element stored in the element cache.'''
+        self._element_cache.clear()
+        self._navigation += 1
+
     def double_click(self, webelement, container=None):
         '''Given a web element,
         perform a double-click on the element and
@@ -113,39 +744,119 @@ class Driver():
             container = self.browser
         try:
             AC(container).double_click(webelement).perform()
-            self.wait(.5)
+            self._settle()
             return True
         except WebDriverException:
             return False
 
-    def find(self, locator_string, container=None, wait=3):
-        '''Given a locator in the form of "type=value",
+    def extract_table(self, table, container=None, header=True, output='columns'):
+        '''Given a locator of a table (or the table element) and
+        an optional container element,
+        read the text of every cell in a single browser call and
+        return a dictionary of {column name: list of cell texts}.
+        Column names come from the first thead row or from a first row of
+        th cells; without one, or with header False, columns are numbered
+        from 0. A cell spanning columns repeats its text in each of them
+        and missing cells are None. Cells spanning rows are not repeated:
+        the rows below them are read from the first column on, so their
+        cells shift left.
+        With output "numpy" the columns are NumPy arrays (of floats when
+        every cell is a number) and with "pandas" they form a DataFrame;
+        these need the numpy or pandas package.
+        See iter_table for tables too large for one call.'''
+        return next(self._table_chunks(table, container, header, output, None))
+
+    def fill_form(self, field_values, container=None, append=False):
+        '''Given a dictionary of {locator: value} pairs and
+        an optional container element,
+        fill all the form fields in a single browser call and
+        return a dictionary of {locator: resulting field value}.
+        Text fields take a string, checkboxes take a boolean,
+        radio button groups take the value of the button to select and
+        select fields take the visible text of an option or a list of them.
+        Input and change events are fired for every field that is set.
+        The result for a field that cannot be found is None.'''
+        if not isinstance(container, WebElement):
+            container = None
+        locator_strings = list(field_values)
+        fields = [[Locator(locator_string).steps, field_values[locator_string]]
+                  for locator_string in locator_strings]
+        try:
+            results = self.browser.execute_script(_JS_FILL_FORM, container, fields, append)
+        except WebDriverException:
+            self.throw('Unable to fill the form.')
+        return dict(zip(locator_strings, results))
+
+    def find(self, locator_string, container=None, wait=3, clickable_only=False):
+        '''Given a locator in the form of "type=value" (or a Locator),
         an optional container within which to start a nested search,
         and an optional wait time,
         locate the elements and return a list of results.
         If a result is not found, a second attempt will be made after
         the wait time.
+        If clickable_only is True, elements that are not eligable to click
+        on are removed from the results (see are_clickable).
         If the search returns a single result, that result is returned
         from the method as a WebElement.'''
         if not container:
             container = self.browser
-        loc_type, loc_value = self._convert_locator(locator_string)
+        locator = Locator(locator_string)
         try:
-            element_list = container.find_elements(by=loc_type, value=loc_value)
+            element_list = self._find_cached(locator, container)
             if (not element_list and isinstance(wait, int) and wait > 0):
-                WebDriverWait(self.browser, wait).until(
-                    EC.presence_of_element_located((loc_type, loc_value))
-                )
-                element_list = container.find_elements(by=loc_type, value=loc_value)
+                element_list = self._wait_for_elements(locator, container, wait)
+            if clickable_only and element_list:
+                element_list = [element for element, clickable
+                                in zip(element_list, self.are_clickable(element_list))
+                                if clickable]
             if len(element_list) == 1:
                 element_list = element_list[0]
         except TimeoutException:
             element_list = []
         return element_list
 
-    def goto(self, url):
-        '''Navigate to the given url.'''
+    def flush_captures(self):
+        '''Wait until every queued capture is written, and raise a
+        FrameworkException if any of them could not be written.'''
+        if self._captures is None:
+            return
+        queued, self._captures['futures'] = self._captures['futures'], []
+        errors = [error for error in (future.exception() for future in queued) if error]
+        if errors:
+            self.throw(f'Unable to write {len(errors)} capture(s): {errors[0]}')
+
+    def goto(self, url, wait_for=None, timeout=30, timing=None):
+        '''Navigate to the given url.
+        If wait_for is given, return as soon as the page is ready by it, or
+        raise a TimeoutException after timeout seconds: "interactive" (the
+        document is parsed), "complete" (everything is loaded), a locator
+        that must match an element, or a function of the driver that must
+        return a true value. With the page_load_strategy "none", navigation
+        then skips waiting for resources that the condition does not need.
+        With timing (by default the driver's timing attribute), the
+        Navigation Timing and Resource Timing entries of the page are
+        collected, in the same call as an "interactive" or "complete" wait,
+        and returned as a record that is also added to timing_log.'''
+        if timing is None:
+            timing = self.timing
+        if wait_for is not None and not callable(wait_for) and \
+                wait_for not in ['interactive', 'complete']:
+            wait_for = Locator(wait_for)
+        self._element_cache.clear()
+        self._navigation += 1
+        self._frame = ()
+        if wait_for is not None and self.page_load_strategy == 'none':
+            self.browser.execute_script(_JS_MARK_DOCUMENT)
+        start_time = time.perf_counter()
         self.browser.get(url)
+        entries = None
+        if wait_for is not None:
+            entries = self._wait_until_ready(wait_for, timeout, timing)
+        if timing:
+            if entries is None:
+                entries = self.browser.execute_script(_JS_COLLECT_TIMING)
+            return self._record_timing(url, start_time, entries)
+        return None
 
     def is_element_clickable(self, webelement):
         '''Given a web element, determine if it is eligable to click on it.'''
@@ -188,19 +899,46 @@ class Driver():
                        if button.is_selected()]
         return field_value
 
+    def iter_table(self, table, chunk_size=1000, container=None, header=True,
+                   output='columns'):
+        '''Given the arguments of extract_table and a number of rows,
+        read the table one chunk of rows per browser call and
+        yield each chunk in the output format of extract_table,
+        so very large tables never need to fit in one response.'''
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            self.throw(f'Invalid chunk size: {chunk_size}')
+        yield from self._table_chunks(table, container, header, output, chunk_size)
+
     def open(self, config=None):
         '''
         Open a new instance of the selected browser and
         set the close method.
-        TODO: Add custom profile support.
-        TODO: Add remote/grid support.
+        With config['remote_hub'] set to a (server_name_or_ip, port) pair or
+        a url, the session runs on that Selenium Grid hub; all sessions to a
+        hub share config['remote_pool_size'] (default 8) keep-alive connections.
+        With config['shared_service'] set (Chrome only), the session runs on
+        one long-lived chromedriver per process instead of a new one.
+        With config['profile_template'] set to a directory, the session
+        starts from a copy of that pre-warmed user data directory; the
+        template is created by a first session when it does not exist.
+        config['user_data_dir'] uses a directory as it is.
         '''
         if not config:
             browser = input('Which browser would you like to use: ').capitalize()
             headless = True
         else:
             browser = config['browser']
-            headless = config['headless']
+            headless = config.get('headless', True)
+            self.settle_delay = config.get('settle_delay', self.settle_delay)
+            self.element_cache = config.get('element_cache', self.element_cache)
+            self.page_load_strategy = config.get('page_load_strategy', self.page_load_strategy)
+            self.timing = config.get('timing', bool(config.get('timing_file')))
+            for name in ['capture_dir', 'capture_scale', 'capture_compression',
+                         'capture_workers', 'capture_queue']:
+                setattr(self, name, config.get(name, getattr(self, name)))
+            if config.get('metrics') or config.get('metrics_file'):
+                metrics = config.get('metrics')
+                self.instrument(metrics if isinstance(metrics, Metrics) else None)
 
         if browser == 'Chrome':
             options = WD.chrome.options.Options()
@@ -210,24 +948,60 @@ class Driver():
         elif browser == 'Firefox':
             options = WD.firefox.options.Options()
             options.headless = headless
+        elif browser in ['Fake', 'Static']:
+            # In-process W3C backend without a browser; see fake_backend.py
+            options = WD.chrome.options.Options()
 
-        # Remote
-        # if config.get('remote_hub', False):
-        #     url, port = config['remote_hub']
-        #     if browser_name == 'Ie':
-        #         browser_name = 'INTERNETEXPLORER'
-        #     else:
-        #         browser_name = browser_name.upper()
-        #     self.browser = WD.Remote(
-        #         command_executor=f'http://{url}:{port}/wd/hub',
-        #         desired_capabilities=getattr(WD.DesiredCapabilities, browser_name),
-        #         browser_profile=browser_options['profile'])
+        options.page_load_strategy = self.page_load_strategy
+        profile = None
+        if config and config.get('profile_template'):
+            profile = _copy_profile_template(config)
+        user_data_dir = profile or (config and config.get('user_data_dir'))
+        if user_data_dir and browser == 'Firefox':
+            options.add_argument('-profile')
+            options.add_argument(user_data_dir)
+        elif user_data_dir:
+            options.add_argument(f'--user-data-dir={user_data_dir}')
 
         try:
-            self.browser = getattr(WD, browser)(options=options)
-            self.close = self.browser.close
+            # The in-process backends come first, so switching a grid suite
+            # to them only takes the "browser" key
+            if browser == 'Fake':
+                self.browser = WD.Remote(command_executor=fake_server().url, options=options)
+            elif browser == 'Static':
+                self.browser = WD.Remote(command_executor=_static_connection_class()(),
+                                         options=options)
+            elif config and config.get('remote_hub'):
+                self.browser = WD.Remote(
+                    command_executor=_remote_connection(config['remote_hub'],
+                                                       config.get('remote_pool_size', 8)),
+                    options=options)
+            elif config and config.get('shared_service') and browser == 'Chrome':
+                self.browser = WD.Remote(
+                    command_executor=_remote_connection(_shared_service_url(browser, options)),
+                    options=options)
+            else:
+                self.browser = getattr(WD, browser)(options=options)
+            self.close = self._end_session
+            self._script_timeout = 30
+            self._cdp = None
+            self._element_cache.clear()
+            self._navigation += 1
+            self._frame = ()
         except IndexError:
             self.throw('Unknown browser selected.')
+        if self.metrics is not None:
+            self._instrument_browser()
+            if config and config.get('metrics_file'):
+                self.close = self._export_metrics_on(self.close, config['metrics_file'])
+        if profile:
+            self.close = self._remove_profile_on(self.close, profile)
+        if config and config.get('timing_file'):
+            self.close = self._export_timing_on(self.close, config['timing_file'])
+        if config and config.get('trace_file'):
+            self.trace(config['trace_file'])
+        if config and config.get('block_urls'):
+            self.block_urls(config['block_urls'])
 
     # def open_bak(self, browser_name='gc', selenium_hub='local', selenium_port='4444'):
     #     elif selenium_hub != 'local':
@@ -241,13 +1015,55 @@ class Driver():
     #         raise 'Invalid browser selection.'
     #    # Setup the driver close method
 
+    def quit(self):
+        '''Quit the browser and end the session.
+        Like close, this writes the queued captures, closes the command trace
+        and exports the metrics_file and timing_file of the session.'''
+        self._quitting = True
+        try:
+            self.close()
+        finally:
+            self._quitting = False
+
+    def reset(self):
+        '''Return the browser to a clean state without restarting it:
+        close all but the first window,
+        clear cookies, local storage and session storage, and
+        navigate to about:blank.
+        On Chromium browsers the cookies of every origin are cleared, and so
+        is all the stored data (IndexedDB, caches, ...) of the current page's
+        origin, through the Chrome DevTools Protocol. Other browsers only
+        clear the cookies and storage of the current page's origin.'''
+        handles = self.browser.window_handles
+        for handle in handles[1:]:
+            self.browser.switch_to.window(handle)
+            self.browser.close()
+        self.browser.switch_to.window(handles[0])
+        self.browser.switch_to.default_content()
+        self._element_cache.clear()
+        self._navigation += 1
+        self._frame = ()
+        if self._cdp is not False:
+            try:
+                self._execute_cdp('Network.clearBrowserCookies', {})
+                self._cdp = True
+            except WebDriverException:
+                self._cdp = False
+        if not self._cdp:
+            self.browser.delete_all_cookies()
+        origin = self.browser.execute_script(_JS_CLEAR_STORAGE)
+        if self._cdp and origin and origin != 'null':
+            self._execute_cdp('Storage.clearDataForOrigin',
+                              {'origin': origin, 'storageTypes': 'all'})
+        self.browser.get('about:blank')
+
     def right_click(self, webelement, container=None):
         '''Given a web element, right-click on it.'''
         if container is None:
             container = self.browser
         try:
             AC(container).context_click(webelement).perform()
-            self.wait(.5)
+            self._settle()
             return True
         except WebDriverException:
             return False
@@ -255,8 +1071,11 @@ class Driver():
     def scroll_into_view(self, webelement):
         '''Given a web element on the current page,
         scroll the page until the element is visible.'''
-        self.browser.execute_script("arguments[0].scrollIntoView(true);", webelement)
-        self.wait(.5)
+        if self.settle_delay is None:
+            self._settle(webelement)
+        else:
+            self.browser.execute_script(_JS_SCROLL_INTO_VIEW, webelement)
+            self.wait(self.settle_delay)
 
     def set_field(self, webelement, field_value, append=False):
         '''Given a form field, set the value of the field.'''
@@ -286,8 +1105,32 @@ class Driver():
         self.browser.set_window_size(window_size[0], window_size[1])
         self.browser.set_window_position(window_position[0], window_position[1])
 
+    def snapshot_form(self, container=None):
+        '''Given an optional container element or locator string,
+        read every input, select and textarea field inside it in a
+        single browser call and
+        return a dictionary keyed by field id (or name) with the
+        tag, type, name, id and value of each field.
+        Values follow the same rules as is_field_set.'''
+        container_locator = None
+        if isinstance(container, (str, Locator)):
+            container_locator = Locator(container)
+        if not isinstance(container, WebElement):
+            container = None
+        try:
+            snapshot = self.browser.execute_script(
+                _JS_SNAPSHOT_FORM, container, container_locator and container_locator.steps)
+        except WebDriverException:
+            self.throw('Unable to take a snapshot of the form.')
+        if snapshot is None:
+            self.throw(f'Unable to find the form container: {container_locator.text}')
+        return snapshot
+
     def switch_to(self, locator_string=None, container=None):
         '''Change the browser context to a different window or frame.'''
+        if self.element_cache == 'navigation':
+            self._element_cache.clear()
+        self._navigation += 1
         try:
             if container is None:
                 container = self.browser
@@ -297,10 +1140,13 @@ class Driver():
                 locator_type = None
             if locator_type in [None, '', 'top', 'default']:
                 self.browser.switch_to.default_content()
+                self._frame = ()
             elif locator_type == 'window':
                 container.switch_to.window(locator_value)
+                self._frame = ()
             elif locator_type == 'frame':
                 container.switch_to.frame(locator_value)
+                self._frame += (locator_value,)
             else:
                 self.throw(f'Invalid switch-to target: {locator_string}')
         except WebDriverException:
@@ -308,34 +1154,435 @@ class Driver():
 
     def wait_until_element_clickable(self, locator_string=None, timeout=30):
         '''Wait until the condition exists when the element is clickable or timeout.'''
-        locator_object = self._convert_locator(locator_string)
-        webelement = WebDriverWait(self.browser, timeout).until(
-            EC.element_to_be_clickable(locator_object))
-        return webelement
+        element_list = self._wait_for(Locator(locator_string), timeout=timeout, clickable=True)
+        if not element_list:
+            raise TimeoutException(
+                f'Timed out waiting for the element to be clickable: {locator_string}')
+        return element_list[0]
+
+
+    def _execute_cdp(self, command, params):
+        '''Run a Chrome DevTools Protocol command through the WebDriver
+        endpoint of Chromium drivers, which also works on remote sessions.'''
+        executor = self.browser.command_executor
+        if executor.get_command('sfExecuteCdpCommand') is None:
+            executor.add_command('sfExecuteCdpCommand', 'POST',
+                                 '/session/$sessionId/goog/cdp/execute')
+        return self.browser.execute('sfExecuteCdpCommand',
+                                    {'cmd': command, 'params': params})['value']
+
+    def _record_timing(self, url, start_time, entries):
+        '''Given the url passed to goto, the perf_counter time it started and
+        the timing entries of the page, add a timing record to timing_log
+        and return it. The summary splits the navigation (in milliseconds)
+        into network, server and browser time; overhead_ms is the rest of
+        the time goto took, spent in the framework and WebDriver.'''
+        goto_ms = (time.perf_counter() - start_time) * 1000
+        navigation = entries['navigation'] or {}
+        def span(start, end):
+            if navigation.get(end, 0) <= 0:
+                return None     # Not reached (yet)
+            return round(navigation[end] - navigation.get(start, 0), 1)
+        milestones = [value for name, value in navigation.items()
+                      if name.endswith(('Start', 'End')) and isinstance(value, (int, float))]
+        summary = {
+            'goto_ms': round(goto_ms, 1),
+            'dns_ms': span('domainLookupStart', 'domainLookupEnd'),
+            'connect_ms': span('connectStart', 'connectEnd'),
+            'server_ms': span('requestStart', 'responseStart'),
+            'download_ms': span('responseStart', 'responseEnd'),
+            'dom_interactive_ms': span('startTime', 'domInteractive'),
+            'dom_content_loaded_ms': span('startTime', 'domContentLoadedEventEnd'),
+            'load_ms': span('startTime', 'loadEventEnd'),
+            'overhead_ms': round(goto_ms - max(milestones, default=0), 1),
+            'resource_count': len(entries['resources']),
+            'transfer_bytes': sum(entry.get('transferSize', 0)
+                                  for entry in [navigation] + entries['resources']),
+        }
+        record = {
+            'timestamp': self.get_timestamp(),
+            'url': url,
+            'page_url': entries['url'],
+            'summary': summary,
+            'navigation': entries['navigation'],
+            'resources': entries['resources'],
+        }
+        self.timing_log.append(record)
+        return record
+
+    def _find_cached(self, locator, container=None):
+        '''Given a Locator and an optional container,
+        return the list of matching elements, from the element cache
+        if it is enabled and the cached elements are still valid.
+        With element_cache set to 'navigation', cached elements are trusted
+        until the next goto, switch_to or reset, so hits cost no round trip.
+        With True, every hit still costs one round trip, as many as an
+        uncached lookup: a small script checks that the page has not changed
+        and that none of the cached elements were removed. It only saves
+        running the search again.'''
+        if not self.element_cache:
+            return self._find_now(locator, container)
+        container_id = container.id if isinstance(container, WebElement) else None
+        key = (locator.text, container_id, self._frame)
+        return self._find_in_cache(self._element_cache, key, self.element_cache,
+                                   locator, container)
+
+    def _find_in_cache(self, cache, key, mode, locator, container=None):
+        '''Given a dictionary of cached elements, the key of the Locator in it,
+        the cache mode ('navigation' or True, see _find_cached), the Locator
+        and an optional container, return the list of matching elements,
+        from the cache while they are valid, else from a new lookup that is
+        then cached. Entries without a cache token are only trusted in the
+        'navigation' mode.'''
+        if key in cache:
+            token, element_list = cache[key]
+            if mode == 'navigation':
+                return list(element_list)
+            try:
+                if token is not None and \
+                        self.browser.execute_script(_JS_CACHE_CHECK, token, element_list):
+                    return list(element_list)
+            except WebDriverException:
+                pass  # A stale element cannot even be sent to the browser
+            del cache[key]
+        token, element_list = self._find_with_token(locator, container)
+        if element_list:
+            cache[key] = (token, element_list)
+        return list(element_list)
+
+    def _find_with_token(self, locator, container=None):
+        '''Given a Locator and an optional container, return the cache token
+        of the page (see _JS_CACHE_CHECK) and the list of matching elements
+        in a single script call.'''
+        if not isinstance(container, WebElement):
+            container = None
+        return self.browser.execute_script(_JS_CACHE_FIND, container, locator.steps)
+
+    def _find_now(self, locator, container=None):
+        '''Given a Locator and an optional container,
+        return the list of matching elements without waiting.
+        Chained locators are resolved in a single script call.'''
+        if len(locator.steps) == 1:
+            if container is None:
+                container = self.browser
+            return container.find_elements(by=locator.by, value=locator.value)
+        if not isinstance(container, WebElement):
+            container = None
+        return self.browser.execute_script(_JS_FIND_ALL, container, locator.steps)
+
+    def _set_script_timeout(self, seconds):
+        '''Make sure the browser allows async scripts to run for at least
+        the given number of seconds.'''
+        if seconds > self._script_timeout:
+            self.browser.set_script_timeout(seconds)
+            self._script_timeout = seconds
 
+    def _settle(self, webelement=None):
+        '''Wait until the page settles after an interaction:
+        no DOM mutations, scrolling or animations for settle_quiet seconds,
+        up to settle_timeout seconds.
+        If a web element is given, it is scrolled into view first.
+        If settle_delay is set, wait that fixed number of seconds instead.'''
+        if self.settle_delay is not None:
+            self.wait(self.settle_delay)
+            return
+        if webelement is None:
+            try:
+                self.browser.switch_to.alert
+                return  # The page is blocked by an alert, so there is nothing to wait for
+            except NoAlertPresentException:
+                pass
+        try:
+            self.browser.execute_async_script(
+                _JS_SETTLE,
+                webelement,
+                int(self.settle_quiet * 1000),
+                int(self.settle_timeout * 1000))
+        except TimeoutException:
+            pass
+        except UnexpectedAlertPresentException:
+            pass    # The interaction opened an alert after the check above
+        except WebDriverException as error:
+            # The interaction navigated, so the new page is loading
+            if not _is_unload_error(error):
+                raise
+
+    def _table_chunks(self, table, container, header, output, chunk_size):
+        '''Yield the columns of the table chunk_size rows at a time, or all
+        of them in one chunk if chunk_size is None (see extract_table).'''
+        if output not in ['columns', 'numpy', 'pandas']:
+            self.throw(f'Invalid table output: {output}')
+        table_locator = None
+        if isinstance(table, WebElement):
+            root = table
+        else:
+            table_locator = Locator(table).steps
+            root = container if isinstance(container, WebElement) else None
+        first = 0
+        layout = headers = None
+        while True:
+            try:
+                result = self.browser.execute_script(
+                    _JS_EXTRACT_TABLE, root, table_locator, header, first, chunk_size, layout)
+            except WebDriverException:
+                self.throw('Unable to extract the table.')
+            if result is None:
+                self.throw(f'Unable to find the table: {table}')
+            if layout is None:
+                layout, headers = result['layout'], result['headers']
+            row_count = len(result['columns'][0]) if result['columns'] else 0
+            if row_count or chunk_size is None:
+                yield self._table_columns(headers, result['columns'], output)
+            first += row_count
+            if chunk_size is None or not row_count or first >= layout[2]:
+                return
+
+    def _table_columns(self, headers, values_list, output):
+        '''Given the headers and the lists of cell texts of the columns read
+        by _JS_EXTRACT_TABLE, return the columns in the output format of
+        extract_table.'''
+        headers = headers or []
+        columns = {}
+        for index, values in enumerate(values_list):
+            name = headers[index] if index < len(headers) else index
+            key = name
+            count = 1
+            while key in columns:
+                key = f'{name}[{count}]'
+                count += 1
+            columns[key] = values
+        if output == 'columns':
+            return columns
+        try:
+            arrays = {}
+            for key, values in columns.items():
+                try:
+                    arrays[key] = numpy.asarray(values, dtype=float)
+                except (TypeError, ValueError):
+                    arrays[key] = numpy.asarray(values, dtype=object)
+            return arrays if output == 'numpy' else pandas.DataFrame(arrays)
+        except ImportError:
+            self.throw(f'The "{output}" table output needs the {output} package.')
+
+    def _wait_for(self, locator, container=None, timeout=3, clickable=False):
+        '''Given a Locator,
+        wait inside the page until matching elements exist (and are clickable,
+        if requested) or the timeout expires, and
+        return the list of matching elements.'''
+        if not isinstance(container, WebElement):
+            container = None
+        self._set_script_timeout(timeout + 5)
+        return self.browser.execute_async_script(
+            _JS_WAIT_FOR, container, locator.steps, clickable, int(timeout * 1000))
+
+    def _wait_for_elements(self, locator, container, wait):
+        '''Given a Locator, a container and a wait time in seconds,
+        wait until matching elements exist and return them.
+        Raise a TimeoutException if they do not appear in time.'''
+        try:
+            return self._wait_for(locator, container, wait)
+        except TimeoutException:
+            raise
+        except WebDriverException:
+            # The in-page wait is lost if the document unloads; poll instead.
+            return WebDriverWait(self.browser, wait).until(
+                lambda browser: self._find_now(locator, container))
+
+    def _wait_until_ready(self, wait_for, timeout, timing=False):
+        '''Wait until the page that goto navigated to is ready by the
+        wait_for condition (see goto), up to timeout seconds.
+        If timing is True and the condition is a document state, return
+        the timing entries of the page, else None.'''
+        deadline = time.perf_counter() + timeout
+        state = wait_for if wait_for in ['interactive', 'complete'] else 'loading'
+        delay = 0.05
+        while True:
+            remaining = max(deadline - time.perf_counter(), 0)
+            try:
+                ready = True
+                if state != 'loading' or self.page_load_strategy == 'none':
+                    self._set_script_timeout(remaining + 5)
+                    ready = self.browser.execute_async_script(
+                        _JS_READY_STATE, state, int(remaining * 1000),
+                        timing and state != 'loading')
+                if ready and callable(wait_for):
+                    ready = WebDriverWait(
+                        self.browser, remaining,
+                        ignored_exceptions=[StaleElementReferenceException]).until(
+                            lambda browser: wait_for(self))
+                elif ready and state == 'loading':
+                    ready = self._wait_for(wait_for, timeout=remaining)
+                break
+            except TimeoutException:
+                raise
+            except WebDriverException as error:
+                # The document unloaded during the wait; wait in the new one
+                if not _is_unload_error(error) or time.perf_counter() >= deadline:
+                    raise
+                time.sleep(min(delay, max(deadline - time.perf_counter(), 0)))
+                delay = min(delay * 2, 1)
+        if not ready:
+            raise TimeoutException(f'Timed out waiting for the page to be ready: {wait_for}')
+        return ready if isinstance(ready, dict) else None
 
     ############################################################################
     # Browser-independent Utilities
     ############################################################################
+    def _end_session(self):
+        '''The innermost close method: close the browser window, or quit
+        the browser when called from quit.'''
+        if self._quitting:
+            self.browser.quit()
+        else:
+            self.browser.close()
+
+    def _export_metrics_on(self, close_method, path):
+        '''Given a close method, return a close method that also exports
+        the metrics to the given path when the session ends.'''
+        def close():
+            try:
+                close_method()
+            finally:
+                self.metrics.export(path)
+        return close
+
+    def _export_timing_on(self, close_method, path):
+        '''Given a close method, return a close method that also exports
+        the timing log to the given path when the session ends.'''
+        def close():
+            try:
+                close_method()
+            finally:
+                self.export_timing(path)
+        return close
+
+    def _flush_captures_on(self, close_method):
+        '''Given a close method, return a close method that also waits for
+        the queued captures and stops the capture threads.'''
+        def close():
+            try:
+                close_method()
+            finally:
+                captures = self._captures
+                try:
+                    self.flush_captures()
+                finally:
+                    self._captures = None
+                    captures['executor'].shutdown()
+        return close
+
+    def _close_trace_on(self, close_method):
+        '''Given a close method, return a close method that also closes
+        the command trace after the session ends.'''
+        def close():
+            try:
+                close_method()
+            finally:
+                self._trace.close()
+                self._trace = None
+        return close
+
+    def _remove_profile_on(self, close_method, profile):
+        '''Given a close method, return a close method that also removes
+        the session's copy of the profile template.'''
+        def close():
+            try:
+                close_method()
+            finally:
+                shutil.rmtree(profile, ignore_errors=True)
+        return close
+
+    def _instrument_browser(self):
+        '''Record every WebDriver command sent by the browser as a round trip
+        of the Driver methods that are running.'''
+        browser_execute = self.browser.execute
+        local = self._metrics_local
+
+        def execute(driver_command, params=None):
+            start_time = time.perf_counter()
+            response = error = None
+            try:
+                response = browser_execute(driver_command, params)
+                return response
+            except Exception as exception:
+                error = exception
+                raise
+            finally:
+                elapsed = time.perf_counter() - start_time
+                stack = getattr(local, 'stack', ())
+                for counter in stack:
+                    counter[0] += 1
+                self.metrics.record('commands', driver_command, elapsed, 1)
+                if self._trace is not None:
+                    self._trace.command(stack[0] if stack else None, driver_command, params,
+                                        start_time, elapsed, response, error)
+        self.browser.execute = execute
+
+    def _instrument_method(self, name, method):
+        '''Given a bound Driver method, return a wrapper that records its
+        latency and the round trips it makes.'''
+        local = self._metrics_local
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            if not hasattr(local, 'stack'):
+                local.stack = []
+            counter = [0, name, next(self._calls)]     # Round trips, method, call id
+            local.stack.append(counter)
+            start_time = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                local.stack.pop()
+                self.metrics.record('methods', name, elapsed, counter[0])
+        return wrapper
+
+    def instrument(self, metrics=None):
+        '''Record the count, latency and round trips of every Driver method and
+        every WebDriver command in a Metrics object and return it.
+        The "metrics" config key does this when the browser is opened, and
+        "metrics_file" also exports the metrics (.json or Prometheus text)
+        when the browser is closed.
+        A Metrics object given in the "metrics" config key is shared.'''
+        if self.metrics is None:
+            for name, attribute in vars(Driver).items():
+                if callable(attribute) and not name.startswith('_') and name != 'instrument':
+                    setattr(self, name, self._instrument_method(name, getattr(self, name)))
+            if self.browser is not None:
+                self._instrument_browser()
+        self.metrics = metrics or self.metrics or Metrics()
+        return self.metrics
+
+    def trace(self, path):
+        '''Given a path, record every WebDriver command of the session to a
+        JSON lines trace file: the Driver method call that sent it, its
+        parameters and its latency. The "trace_file" config key does this
+        when the browser is opened; this method needs an open browser.
+        The trace is closed with the browser.
+        See summarize_trace, replay_trace and compare_traces.'''
+        if self.browser is None:
+            self.throw('Open the browser before tracing it, or set "trace_file" in its config')
+        if self._trace is not None:
+            self.throw(f'The session is already traced to {self._trace.path}')
+        self.instrument(self.metrics)
+        self._trace = _TraceWriter(path)
+        self.close = self._close_trace_on(self.close)
+
     def _convert_locator(self, locator_string):
         '''Given a locator string in the format type=value
         return a tuple in the format (valid_type, value)'''
-        locator_map = {
-            'id'    : By.ID,
-            'name'  : By.NAME,
-            'css'   : By.CSS_SELECTOR,
-            'class' : By.CLASS_NAME,
-            'link'  : By.LINK_TEXT,
-            'plink' : By.PARTIAL_LINK_TEXT,
-            'tag'   : By.TAG_NAME,
-            'xpath' : By.XPATH,
-            'window': 'window',
-            'frame' : 'frame',
-        }
-        locator_string_separator = locator_string.find('=')
-        locator_type = locator_string[:locator_string_separator].strip()
-        locator_value = locator_string[locator_string_separator + 1:].strip()
-        return (locator_map[locator_type], locator_value)
+        locator = Locator(locator_string)
+        if len(locator.steps) > 1:
+            self.throw(f'A chained locator is not allowed here: {locator.text}')
+        return locator.steps[0]
+
+    def export_timing(self, path):
+        '''Write the timing log to the given path as JSON Lines,
+        one goto record per line.'''
+        with open(path, 'w') as timing_file:
+            for record in self.timing_log:
+                timing_file.write(json.dumps(record) + '\n')
 
     def get_date(self):
         '''Return the current date.'''
@@ -373,6 +1620,1299 @@ class Driver():
         raise FrameworkException(message)
 
 
+class Metrics():
+    '''
+    Call counts, round trips and latency histograms of Driver methods and
+    WebDriver commands, exported as JSON or Prometheus text.
+    Recording a call is a couple of dictionary updates, so it can stay on.
+    '''
+    BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.methods = {}
+        self.commands = {}
+        self._lock = threading.Lock()
+
+    def export(self, path):
+        '''Write the metrics to the given path,
+        as JSON for a .json file and as Prometheus text otherwise.'''
+        with open(path, 'w') as metrics_file:
+            if path.endswith('.json'):
+                metrics_file.write(self.to_json())
+            else:
+                metrics_file.write(self.to_prometheus())
+
+    def record(self, kind, name, seconds, round_trips=0):
+        '''Record one call of a method ("methods") or command ("commands").'''
+        with self._lock:
+            table = getattr(self, kind)
+            if name not in table:
+                table[name] = {'count': 0, 'seconds': 0.0, 'round_trips': 0,
+                               'buckets': [0] * (len(self.BUCKETS) + 1)}
+            stats = table[name]
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['round_trips'] += round_trips
+            stats['buckets'][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def to_dict(self):
+        '''Return a copy of the metrics as a dictionary.'''
+        with self._lock:
+            return json.loads(json.dumps({'methods': self.methods, 'commands': self.commands}))
+
+    def to_json(self):
+        '''Return the metrics as a JSON string.'''
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix='selenium_framework'):
+        '''Return the metrics in the Prometheus text exposition format.'''
+        metrics = self.to_dict()
+        lines = []
+        for kind, label in [('methods', 'method'), ('commands', 'command')]:
+            metric = f'{prefix}_{label}'
+            lines.append(f'# TYPE {metric}_seconds histogram')
+            for name, stats in sorted(metrics[kind].items()):
+                cumulative = 0
+                bounds = [str(bound) for bound in self.BUCKETS] + ['+Inf']
+                for bound, count in zip(bounds, stats['buckets']):
+                    cumulative += count
+                    lines.append(f'{metric}_seconds_bucket{{{label}="{name}",le="{bound}"}} '
+                                 f'{cumulative}')
+                lines.append(f'{metric}_seconds_sum{{{label}="{name}"}} {stats["seconds"]}')
+                lines.append(f'{metric}_seconds_count{{{label}="{name}"}} {stats["count"]}')
+            lines.append(f'# TYPE {metric}_round_trips_total counter')
+            for name, stats in sorted(metrics[kind].items()):
+                lines.append(f'{metric}_round_trips_total{{{label}="{name}"}} '
+                             f'{stats["round_trips"]}')
+        return '\n'.join(lines) + '\n'
+
+
+class DriverPool():
+    '''
+    Pool of open Driver instances that are reused between tests.
+    Opening a browser is the most expensive step of most tests, so the pool
+    keeps the sessions alive and only resets them when they are returned.
+
+        pool = DriverPool(CONFIG, size=4)
+        with pool.driver() as driver:
+            driver.goto(CONFIG['test_page'])
+        pool.close()
+    '''
+    def __init__(self, config, size=1, timeout=None):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def acquire(self):
+        '''Return an idle driver, opening a new one if the pool is not full.
+        Block until a driver is returned when all of them are in use.'''
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self._open()
+            if driver is None:
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    driver = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise FrameworkException('Timed out waiting for a pooled driver.')
+            if driver is not None:      # None wakes a waiter when a slot is freed
+                return driver
+
+    def close(self):
+        '''Quit every browser opened by the pool.'''
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        self._idle = queue.Queue()
+        for driver in drivers:
+            try:
+                if driver.close is not None:   # Not still opening
+                    driver.quit()
+            except Exception:
+                pass
+
+    @contextmanager
+    def driver(self, reset=True):
+        '''Context manager that checks a driver out of the pool and
+        returns it, reset unless reset is False, when the block exits.'''
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver, reset)
+
+    def release(self, driver, reset=True):
+        '''Reset the driver (unless reset is False) and return it to the pool.
+        A driver that cannot be reset is discarded.'''
+        try:
+            if reset:
+                driver.reset()
+        except Exception:               # Including connection errors of dead browsers
+            self._discard(driver)
+            return
+        self._idle.put(driver)
+
+    def _discard(self, driver):
+        '''Quit a broken driver and free its slot in the pool.'''
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        self._idle.put(None)
+        try:
+            driver.quit()
+        except Exception:               # The browser process may be gone
+            pass
+
+    def _open(self):
+        '''Open a new driver in a free slot of the pool, or return None
+        when the pool is full.'''
+        # Reserve a slot under the lock, but open the browser outside it,
+        # so other threads can take returned drivers in the meantime
+        with self._lock:
+            if len(self._drivers) >= self.size:
+                return None
+            driver = Driver()
+            self._drivers.append(driver)
+        try:
+            driver.open(self.config)
+        except BaseException:
+            with self._lock:
+                if driver in self._drivers:
+                    self._drivers.remove(driver)
+            self._idle.put(None)
+            raise
+        return driver
+
+class Element():
+    '''
+    Descriptor of an element of a Page, declared with a locator in the
+    form of "type=value" and the wait time of Driver.find.
+    The locator is compiled once, when the page class is created; reading
+    the attribute returns what Driver.find returns for it.
+    '''
+    __slots__ = ('locator', 'wait', 'name')
+
+    def __init__(self, locator_string, wait=3):
+        self.locator = Locator(locator_string)
+        self.wait = wait
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, page, owner=None):
+        if page is None:
+            return self
+        return page._resolve(self)
+
+class Page():
+    '''
+    Base class of page objects whose elements are Element descriptors.
+    Elements are looked up on first access only, so a page with hundreds
+    of them costs nothing until they are used, and then cached by the page
+    as set by its cache attribute, like Driver.element_cache:
+    "navigation" trusts them until the next goto, switch_to or reset of
+    the driver (no round trip), True also checks in one small script call
+    that the DOM has not changed, and False looks them up every time.
+    Subclasses can declare __slots__ = () to keep instances small.
+
+        class LoginPage(Page):
+            url = 'https://example.com/login'
+            username = Element('id=username')
+            submit = Element('css=form >> tag=button')
+
+        page = LoginPage(driver).goto()
+        driver.set_field(page.username, 'user')
+    '''
+    __slots__ = ('driver', '_elements', '_navigation')
+    url = None
+    cache = 'navigation'
+
+    def __init__(self, driver):
+        self.driver = driver
+        self._elements = {}
+        self._navigation = None
+
+    def clear_element_cache(self):
+        '''Forget the cached elements of the page.'''
+        self._elements.clear()
+
+    def goto(self, **kwargs):
+        '''Navigate to the url of the page with the keyword arguments of
+        Driver.goto and return the page.'''
+        if self.url is None:
+            self.driver.throw(f'{type(self).__name__} has no url.')
+        self.driver.goto(self.url, **kwargs)
+        return self
+
+    def _resolve(self, element):
+        '''Given an Element of the page, return its WebElement or list of
+        them, from the cache of the page while it is valid.'''
+        driver = self.driver
+        if not self.cache:
+            return driver.find(element.locator, wait=element.wait)
+        if self._navigation != driver._navigation:
+            self._elements.clear()
+            self._navigation = driver._navigation
+        element_list = driver._find_in_cache(self._elements, element.name, self.cache,
+                                             element.locator)
+        if not element_list and isinstance(element.wait, int) and element.wait > 0:
+            try:
+                element_list = driver._wait_for_elements(element.locator, driver.browser,
+                                                         element.wait)
+            except TimeoutException:
+                return []
+            if element_list:
+                self._elements[element.name] = (None, element_list)
+        return element_list[0] if len(element_list) == 1 else element_list
+
+
+################################################################################
+# Remote Hub Connections
+################################################################################
+_HUB_POOLS = {'pools': {}, 'lock': threading.Lock()}
+
+def _hub_url(remote_hub):
+    '''Given a remote hub as a (server_name_or_ip, port) pair or a url,
+    return the url of the hub.'''
+    if isinstance(remote_hub, str):
+        return remote_hub.rstrip('/')
+    server, port = remote_hub
+    return f'http://{server}:{port}/wd/hub'
+
+@lru_cache(maxsize=None)
+def _pooled_connection_class():
+    '''Return the class of selenium command executors that share one pool of
+    keep-alive HTTP connections per hub among all the sessions of the process.
+    It is created on first use, as its selenium base class is imported lazily.'''
+    from selenium.webdriver.remote.client_config import ClientConfig
+    from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+    class _PooledConnection(RemoteConnection):
+        def __init__(self, url, pool_size):
+            super().__init__(client_config=ClientConfig(
+                url, keep_alive=True,
+                init_args_for_pool_manager={'init_args_for_pool_manager': {
+                    'maxsize': pool_size, 'block': True}}))
+            with _HUB_POOLS['lock']:
+                if url not in _HUB_POOLS['pools']:
+                    _HUB_POOLS['pools'][url] = self._conn
+                else:
+                    self._conn.clear()
+                    self._conn = _HUB_POOLS['pools'][url]
+
+        def close(self):
+            pass    # The connections stay open for the other sessions to the hub
+
+    return _PooledConnection
+
+def _remote_connection(remote_hub, pool_size=8):
+    '''Given a remote hub and the maximum number of connections to it,
+    return a command executor for a new session on the hub.
+    Sessions to the same hub reuse each other's idle connections, so most
+    commands skip the TCP (and TLS) handshake; when pool_size commands are
+    in flight, the next one waits for a free connection.'''
+    return _pooled_connection_class()(_hub_url(remote_hub), pool_size)
+
+################################################################################
+# Shared Driver Services
+################################################################################
+_SERVICES = {'services': {}, 'profiles': None, 'lock': threading.RLock()}
+
+def _shared_service_url(browser, options):
+    '''Given a browser name and its options, return the url of the
+    long-lived driver service of this process for the browser, starting it on
+    first use. The service outlives its sessions and stops at process exit.'''
+    from selenium.webdriver.common.driver_finder import DriverFinder
+    with _SERVICES['lock']:
+        pid, service, browser_path = _SERVICES['services'].get(browser, (None, None, None))
+        if pid != os.getpid():     # Not started, or inherited from a parent process
+            service = getattr(WD, browser.lower()).service.Service()
+            finder = DriverFinder(service, options)
+            browser_path = finder.get_browser_path()
+            service.path = service.env_path() or finder.get_driver_path()
+            service.start()
+            Finalize(service, service.stop, exitpriority=5)
+            _SERVICES['services'][browser] = (os.getpid(), service, browser_path)
+    if browser_path:
+        options.binary_location = browser_path
+        options.browser_version = None
+    return service.service_url
+
+def _copy_profile_template(config):
+    '''Given a config with a profile_template directory,
+    return a fresh copy of the template for a new session.
+    When the template does not exist yet, a session is opened on it first,
+    so the browser's first-run setup happens once instead of per session.'''
+    template = config['profile_template']
+    with _SERVICES['lock']:
+        if not os.path.isdir(template):
+            driver = Driver()
+            driver.open(config=dict(config, profile_template=None, user_data_dir=template))
+            driver.quit()
+            os.makedirs(template, exist_ok=True)
+        if _SERVICES['profiles'] is None:
+            _SERVICES['profiles'] = tempfile.mkdtemp(prefix='selenium_framework_profiles_')
+            Finalize(None, shutil.rmtree, args=(_SERVICES['profiles'], True), exitpriority=5)
+    profile = tempfile.mkdtemp(dir=_SERVICES['profiles'])
+    # Lock files of the browser that made the template must not be copied
+    shutil.copytree(template, profile, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns('Singleton*', 'lock', '.parentlock'))
+    return profile
+
+################################################################################
+# Screenshot Captures
+################################################################################
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def _png_chunk(kind, data):
+    '''Return a PNG chunk of the given kind and data.'''
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def _recompress_png(png, level):
+    '''Given a PNG image and a zlib compression level,
+    return the image with its pixel data recompressed at that level.'''
+    chunks = []
+    pixel_data = []
+    position = len(_PNG_SIGNATURE)
+    while position < len(png):
+        length, kind = struct.unpack('>I4s', png[position:position + 8])
+        data = png[position + 8:position + 8 + length]
+        position += length + 12
+        if kind == b'IDAT':
+            if not pixel_data:
+                chunks.append(None)     # Where the recompressed data goes
+            pixel_data.append(data)
+        else:
+            chunks.append(_png_chunk(kind, data))
+    data = _png_chunk(b'IDAT', zlib.compress(zlib.decompress(b''.join(pixel_data)), level))
+    return _PNG_SIGNATURE + b''.join(data if chunk is None else chunk for chunk in chunks)
+
+def _write_capture(data, path, scale=None, compression=None):
+    '''Given a base64 PNG screenshot and a path, decode it, downscale it by
+    the scale factor (with Pillow), recompress it at the zlib compression
+    level and write it to the path. Runs on the capture threads of a Driver.'''
+    png = base64.b64decode(data)
+    if scale not in [None, 1]:
+        image = Image.open(io.BytesIO(png))
+        image = image.resize((max(1, round(image.width * scale)),
+                              max(1, round(image.height * scale))))
+        output = io.BytesIO()
+        image.save(output, 'PNG', compress_level=6 if compression is None else compression)
+        png = output.getvalue()
+    elif compression is not None:
+        png = _recompress_png(png, compression)
+    with open(path, 'wb') as capture_file:
+        capture_file.write(png)
+
+################################################################################
+# Visual Diff
+################################################################################
+_PNG_CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}    # Channels of the 8-bit color types
+
+@lru_cache(maxsize=None)
+def _has_pillow():
+    '''Return True if Pillow is installed.'''
+    try:
+        Image.Image
+        return True
+    except ImportError:
+        return False
+
+def _decode_png(png):
+    '''Given a PNG image, return its pixels as a NumPy array of
+    (height, width, channels) bytes. Pillow decodes it when it is installed;
+    otherwise non-interlaced 8-bit grayscale and RGB(A) images are decoded
+    with zlib and NumPy (see _unfilter_png).'''
+    if _has_pillow():
+        with Image.open(io.BytesIO(png)) as image:
+            if image.mode not in ['L', 'LA', 'RGB', 'RGBA']:
+                image = image.convert('RGBA')
+            pixels = numpy.asarray(image)
+        return pixels.reshape(pixels.shape[:2] + (-1,))
+    if png[:len(_PNG_SIGNATURE)] != _PNG_SIGNATURE:
+        raise FrameworkException('Unable to decode the image: not a PNG image.')
+    header = None
+    data = []
+    position = len(_PNG_SIGNATURE)
+    while position < len(png):
+        length, kind = struct.unpack('>I4s', png[position:position + 8])
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', png[position + 8:position + 21])
+        elif kind == b'IDAT':
+            data.append(png[position + 8:position + 8 + length])
+        elif kind == b'IEND':
+            break
+        position += length + 12
+    width, height, depth, color_type, _, _, interlace = header
+    if depth != 8 or color_type not in _PNG_CHANNELS or interlace:
+        raise FrameworkException('Unable to decode the image without Pillow: only '
+                                 '8-bit grayscale and RGB(A) PNG images are supported.')
+    channels = _PNG_CHANNELS[color_type]
+    stride = width * channels
+    raw = numpy.frombuffer(zlib.decompress(b''.join(data)), numpy.uint8)
+    raw = raw.reshape(height, stride + 1)
+    return _unfilter_png(raw[:, 0], raw[:, 1:].reshape(height, width, channels))
+
+def _unfilter_png(filters, data):
+    '''Given the filter type of every row of a PNG image and its filtered
+    (height, width, channels) bytes, return the pixels.
+    Images with only the None, Sub and Up filters are unfiltered a row at a
+    time. Average and Paeth depend on the pixel to the left, so images that
+    use them are unfiltered an anti-diagonal at a time instead: every pixel
+    of a diagonal only depends on the diagonals before it.'''
+    height, width, channels = data.shape
+    if (filters <= 2).all():
+        pixels = numpy.zeros_like(data)
+        previous = numpy.zeros_like(data[0])
+        for index in range(height):
+            kind, row = filters[index], data[index]
+            if kind == 0:       # None
+                pixels[index] = row
+            elif kind == 1:     # Sub: a running sum of each channel, modulo 256
+                pixels[index] = row.cumsum(axis=0, dtype=numpy.uint8)
+            else:               # Up
+                pixels[index] = row + previous
+            previous = pixels[index]
+        return pixels
+    # Padded with a zero row and column for the neighbours outside the image.
+    # In the flat arrays of pixels, a diagonal is a slice with a step of width
+    # (width - 1 in the unpadded data; a diagonal of a one pixel wide image is
+    # one pixel), so no pixels are copied to index it.
+    pixels = numpy.zeros((height + 1, width + 1, channels), numpy.int16)
+    flat = pixels.reshape(-1, channels)
+    data = data.reshape(-1, channels)
+    kinds = [(filters == kind)[:, None] for kind in range(5)]
+    where, absolute = numpy.where, numpy.abs     # Looked up once for the loop
+    data_step = max(width - 1, 1)
+    for diagonal in range(height + width - 1):
+        first_row = max(0, diagonal - width + 1)
+        count = min(height, diagonal + 1) - first_row
+        start = first_row * width + width + diagonal + 2
+        left = flat[start - 1:start - 1 + count * width:width]
+        above = flat[start - width - 1:start - 1 + (count - 1) * width:width]
+        upper_left = flat[start - width - 2:start - 2 + (count - 1) * width:width]
+        estimate = left + above - upper_left
+        left_distance = absolute(estimate - left)
+        above_distance = absolute(estimate - above)
+        upper_left_distance = absolute(estimate - upper_left)
+        rows = slice(first_row, first_row + count)
+        predictor = where(kinds[4][rows],
+                          where((left_distance <= above_distance) &
+                                (left_distance <= upper_left_distance), left,
+                                where(above_distance <= upper_left_distance, above, upper_left)),
+                          where(kinds[3][rows], (left + above) >> 1,
+                                where(kinds[2][rows], above, where(kinds[1][rows], left, 0))))
+        data_start = first_row * (width - 1) + diagonal
+        flat[start:start + count * width:width] = \
+            (data[data_start:data_start + count * data_step:data_step] + predictor) & 255
+    return pixels[1:, 1:].astype(numpy.uint8)
+
+def _encode_png(pixels):
+    '''Given a NumPy array of (height, width, channels) bytes,
+    return it as a PNG image.'''
+    height, width, channels = pixels.shape
+    color_type = {value: key for key, value in _PNG_CHANNELS.items()}[channels]
+    rows = numpy.zeros((height, width * channels + 1), numpy.uint8)    # Filter type None
+    rows[:, 1:] = pixels.reshape(height, -1)
+    return (_PNG_SIGNATURE +
+            _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)) +
+            _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) +
+            _png_chunk(b'IEND', b''))
+
+def _rgb(pixels):
+    '''Given a NumPy array of (height, width, channels) bytes,
+    return its RGB channels, without alpha.'''
+    if pixels.shape[2] < 3:
+        return numpy.repeat(pixels[:, :, :1], 3, axis=2)
+    return pixels[:, :, :3]
+
+def _perceptual_hash(pixels):
+    '''Given a NumPy array of (height, width, channels) bytes, return the
+    64-bit difference hash of the image: its brightness averaged over an
+    8x9 grid, one bit per pair of neighbouring cells that gets brighter.
+    Images that look alike have hashes that differ in few bits.'''
+    gray = _rgb(pixels).astype(numpy.float32) @ numpy.array([.299, .587, .114], numpy.float32)
+    if gray.shape[0] < 8 or gray.shape[1] < 9:
+        gray = gray.repeat(8, axis=0).repeat(9, axis=1)
+    row_edges = numpy.linspace(0, gray.shape[0], 9).astype(int)[:-1]
+    column_edges = numpy.linspace(0, gray.shape[1], 10).astype(int)[:-1]
+    cells = numpy.add.reduceat(numpy.add.reduceat(gray, row_edges, axis=0), column_edges, axis=1)
+    cells /= numpy.outer(numpy.diff(numpy.append(row_edges, gray.shape[0])),
+                         numpy.diff(numpy.append(column_edges, gray.shape[1])))
+    return int.from_bytes(numpy.packbits(cells[:, 1:] > cells[:, :-1]).tobytes(), 'big')
+
+class VisualDiff():
+    '''
+    Visual regression checks of screenshots against baseline images.
+    Pixels are compared with NumPy, over the whole image and per cell of a
+    grid, with a tolerance per channel (a number, or an array of one per
+    pixel) and ignored regions. The index of the baselines keeps digests
+    of their PNG data and pixels and a perceptual hash, so checking an
+    unchanged screenshot is a dictionary lookup, without decoding or
+    comparing pixels. Baselines are PNG files in baseline_dir, and the index
+    is saved next to them by save; baselines missing from it are indexed
+    when the VisualDiff is created. The pixels of the last cache_size
+    baselines that were compared are kept decoded.
+
+        with VisualDiff('baselines') as visual:
+            result = visual.check('login', driver.browser.get_screenshot_as_png())
+            assert result['match'], result['cells']
+    '''
+    def __init__(self, baseline_dir, tolerance=0, max_changed_ratio=0, cell_size=32,
+                 cache_size=16):
+        try:
+            numpy.ndarray
+        except ImportError:
+            raise FrameworkException('VisualDiff needs the numpy package.')
+        self.baseline_dir = baseline_dir
+        self.tolerance = tolerance
+        self.max_changed_ratio = max_changed_ratio
+        self.cell_size = cell_size
+        self.cache_size = cache_size
+        self.index = {}
+        self._hashes = {}       # {perceptual hash: set of baseline names}
+        self._digests = {}      # {PNG or pixel digest: baseline name}
+        self._baselines = {}    # {baseline name: pixels}, least recently used first
+        self._changed = False
+        self._lock = threading.RLock()
+        os.makedirs(baseline_dir, exist_ok=True)
+        index_path = os.path.join(baseline_dir, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path) as index_file:
+                for name, entry in json.load(index_file).items():
+                    self._add_entry(name, entry)
+        for file_name in sorted(os.listdir(baseline_dir)):
+            name, extension = os.path.splitext(file_name)
+            if extension == '.png' and name not in self.index:
+                with open(os.path.join(baseline_dir, file_name), 'rb') as png_file:
+                    png = png_file.read()
+                self._add_entry(name, self._entry(png, _decode_png(png)))
+                self._changed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+    def add(self, name, image):
+        '''Given a name and an image (PNG data, a PNG path or an array of
+        pixels), store the image as the baseline of that name and
+        return its index entry.'''
+        png, pixels = self._load(image)
+        if png is None:
+            png = _encode_png(pixels)
+        with open(os.path.join(self.baseline_dir, f'{name}.png'), 'wb') as png_file:
+            png_file.write(png)
+        entry = self._entry(png, pixels)
+        with self._lock:
+            self._remove_entry(name)
+            self._add_entry(name, entry)
+            self._changed = True
+            self._cache_baseline(name, pixels)
+        return entry
+
+    def check(self, name, image, ignore=None, tolerance=None, regions=None, diff_path=None):
+        '''Given a name and an image (PNG data, a PNG path or an array of
+        pixels), compare the image with the baseline of that name and
+        return the result of diff, with the "name" and whether the image
+        was "new" (it becomes the baseline) or "identical" to the baseline.
+        With diff_path, an image of the baseline with the changed pixels
+        in red is written there when the images do not match.'''
+        entry = self.index.get(name)
+        if entry is None:
+            self.add(name, image)
+            return self._identical(name, new=True)
+        png = image if isinstance(image, bytes) else None
+        if png is not None and hashlib.sha1(png).hexdigest() == entry['png']:
+            return self._identical(name)
+        _, pixels = self._load(image)
+        if hashlib.sha1(pixels.tobytes()).hexdigest() == entry['pixels'] and \
+           list(pixels.shape[1::-1]) == entry['size']:
+            return self._identical(name)
+        baseline = self._baseline(name)
+        result = dict(self.diff(pixels, baseline, ignore, tolerance, regions),
+                      name=name, new=False, identical=False)
+        if diff_path and not result['match'] and result['changed_pixels'] is not None:
+            marked = _rgb(baseline).copy()
+            marked[result.pop('mask')] = (255, 0, 0)
+            with open(diff_path, 'wb') as png_file:
+                png_file.write(_encode_png(marked))
+        result.pop('mask', None)
+        return result
+
+    def diff(self, image, baseline, ignore=None, tolerance=None, regions=None):
+        '''Given two images (PNG data, PNG paths or arrays of pixels),
+        a list of (x, y, width, height) regions to ignore,
+        an optional tolerance (the largest difference of a color channel
+        that counts as unchanged; by default the tolerance attribute) and
+        an optional dictionary of {name: (x, y, width, height)} regions,
+        compare the RGB pixels and return a dictionary of
+        "match" (the ratio of changed pixels is at most max_changed_ratio),
+        "changed_pixels", "changed_ratio", "max_delta", the "bounding_box"
+        of the changes, the changed "cells" of a cell_size grid as
+        (x, y, width, height), the changed ratio of each of the "regions"
+        and the boolean "mask" of changed pixels.
+        Images of different sizes never match.'''
+        pixels = _rgb(self._load(image)[1])
+        baseline = _rgb(self._load(baseline)[1])
+        height, width = baseline.shape[:2]
+        result = {'match': False, 'changed_pixels': None, 'changed_ratio': 1.0,
+                  'max_delta': None, 'bounding_box': (0, 0, width, height),
+                  'cells': [], 'regions': {}, 'mask': None}
+        if pixels.shape != baseline.shape:
+            return result
+        delta = numpy.abs(pixels.astype(numpy.int16) - baseline).max(axis=2)
+        for x, y, region_width, region_height in ignore or []:
+            delta[y:y + region_height, x:x + region_width] = 0
+        changed = delta > (self.tolerance if tolerance is None else numpy.asarray(tolerance))
+        changed_pixels = int(numpy.count_nonzero(changed))
+        result.update({
+            'changed_pixels': changed_pixels,
+            'changed_ratio': changed_pixels / changed.size if changed.size else 0.0,
+            'max_delta': int(delta.max()) if delta.size else 0,
+            'bounding_box': None,
+            'mask': changed,
+        })
+        result['match'] = result['changed_ratio'] <= self.max_changed_ratio
+        if changed_pixels:
+            rows = numpy.flatnonzero(changed.any(axis=1))
+            columns = numpy.flatnonzero(changed.any(axis=0))
+            result['bounding_box'] = (int(columns[0]), int(rows[0]),
+                                      int(columns[-1] - columns[0] + 1),
+                                      int(rows[-1] - rows[0] + 1))
+            size = self.cell_size
+            grid = numpy.zeros((-(-height // size) * size, -(-width // size) * size), bool)
+            grid[:height, :width] = changed
+            counts = grid.reshape(grid.shape[0] // size, size, grid.shape[1] // size, size)
+            counts = counts.any(axis=(1, 3))
+            result['cells'] = [(int(column * size), int(row * size),
+                                int(min(size, width - column * size)),
+                                int(min(size, height - row * size)))
+                               for row, column in numpy.argwhere(counts)]
+        for name, (x, y, region_width, region_height) in (regions or {}).items():
+            region = changed[y:y + region_height, x:x + region_width]
+            result['regions'][name] = \
+                float(numpy.count_nonzero(region)) / region.size if region.size else 0.0
+        return result
+
+    def find(self, image, max_distance=0):
+        '''Given an image (PNG data, a PNG path or an array of pixels),
+        return the sorted names of the baselines identical to it or whose
+        perceptual hash differs from its hash in at most max_distance bits.
+        Exact and identical matches are dictionary lookups.'''
+        png, pixels = self._load(image)
+        digests = [hashlib.sha1(pixels.tobytes()).hexdigest()]
+        if png is not None:
+            digests.append(hashlib.sha1(png).hexdigest())
+        with self._lock:
+            names = {self._digests.get(digest) for digest in digests}
+            image_hash = _perceptual_hash(pixels)
+            if max_distance == 0:
+                names.update(self._hashes.get(image_hash, ()))
+            else:
+                names.update(name for name, entry in self.index.items()
+                             if bin(int(entry['hash'], 16) ^ image_hash).count('1')
+                             <= max_distance)
+        names.discard(None)
+        return sorted(names)
+
+    def save(self):
+        '''Save the index of the baselines, if it changed.'''
+        with self._lock:
+            if not self._changed:
+                return
+            with open(os.path.join(self.baseline_dir, 'index.json'), 'w') as index_file:
+                json.dump(self.index, index_file, indent=1, sort_keys=True)
+            self._changed = False
+
+    def _add_entry(self, name, entry):
+        self.index[name] = entry
+        self._hashes.setdefault(int(entry['hash'], 16), set()).add(name)
+        self._digests[entry['png']] = name
+        self._digests[entry['pixels']] = name
+
+    def _remove_entry(self, name):
+        entry = self.index.pop(name, None)
+        if entry is not None:
+            self._hashes.get(int(entry['hash'], 16), set()).discard(name)
+            for digest in [entry['png'], entry['pixels']]:
+                if self._digests.get(digest) == name:
+                    del self._digests[digest]
+
+    def _baseline(self, name):
+        '''Return the pixels of the baseline of the given name,
+        decoding it only if it is not cached.'''
+        with self._lock:
+            pixels = self._baselines.get(name)
+        if pixels is None:
+            pixels = self._load(os.path.join(self.baseline_dir, f'{name}.png'))[1]
+        with self._lock:
+            self._cache_baseline(name, pixels)
+        return pixels
+
+    def _cache_baseline(self, name, pixels):
+        '''Cache the pixels of a baseline as the most recently used one,
+        dropping the least recently used ones beyond cache_size.'''
+        self._baselines.pop(name, None)
+        self._baselines[name] = pixels
+        while len(self._baselines) > max(self.cache_size, 0):
+            del self._baselines[next(iter(self._baselines))]
+
+    def _entry(self, png, pixels):
+        '''Return the index entry of an image.'''
+        return {
+            'png': hashlib.sha1(png).hexdigest(),
+            'pixels': hashlib.sha1(pixels.tobytes()).hexdigest(),
+            'hash': f'{_perceptual_hash(pixels):016x}',
+            'size': [pixels.shape[1], pixels.shape[0]],
+        }
+
+    def _identical(self, name, new=False):
+        '''Return the check result of an image identical to its baseline.'''
+        return {'name': name, 'new': new, 'identical': True, 'match': True,
+                'changed_pixels': 0, 'changed_ratio': 0.0, 'max_delta': 0,
+                'bounding_box': None, 'cells': [], 'regions': {}}
+
+    def _load(self, image):
+        '''Given PNG data, a PNG path or an array of pixels,
+        return the PNG data (None for arrays) and the pixels.'''
+        if isinstance(image, str):
+            with open(image, 'rb') as png_file:
+                image = png_file.read()
+        if isinstance(image, (bytes, bytearray)):
+            return bytes(image), _decode_png(bytes(image))
+        pixels = numpy.asarray(image, numpy.uint8)
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        return None, pixels
+
+################################################################################
+# Asyncio Driver
+################################################################################
+class AsyncDriver():
+    '''
+    Asyncio version of Driver for driving many sessions from one process.
+    Every browser-dependent Driver method is available as a coroutine.
+    The calls of one session run in order on its own worker thread, so other
+    sessions keep running while one waits on the browser.
+
+        async def check_page(url):
+            async with AsyncDriver() as driver:
+                await driver.open(CONFIG)
+                await driver.goto(url)
+                return await driver.is_field_set(await driver.find('id=text01'))
+
+        async def main():
+            return await asyncio.gather(*[check_page(url) for url in urls])
+
+        asyncio.run(main())
+    '''
+    def __init__(self, driver=None):
+        self.driver = driver or Driver()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._closed = False
+
+    def __getattr__(self, name):
+        '''Use the Driver attributes and browser-independent utilities as they are.
+        Other methods, such as those of Driver subclasses (StaticDriver.load),
+        return coroutines that run them on the session thread.'''
+        attribute = getattr(self.driver, name)
+        if name in _DRIVER_UTILITIES or not callable(attribute) or \
+                getattr(attribute, '__self__', None) is not self.driver:
+            return attribute
+        return partial(self._run, attribute)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        '''Close the browser, if it is open, and stop the session thread.'''
+        await self._end_session('close')
+
+    async def iter_table(self, *args, **kwargs):
+        '''Asynchronous generator version of Driver.iter_table: read each
+        chunk of rows on the session thread and yield it.'''
+        chunks = self.driver.iter_table(*args, **kwargs)
+        while True:
+            chunk = await self._run(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def quit(self):
+        '''Quit the browser, if it is open, and stop the session thread.'''
+        await self._end_session('quit')
+
+    async def wait(self, seconds=0):
+        '''Pause the current task for the given number of seconds.'''
+        await asyncio.sleep(seconds)
+
+    async def _end_session(self, name):
+        '''Run the named Driver method, close or quit, if the browser is open,
+        and stop the session thread. Later calls do nothing.'''
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self.driver.close is not None:
+                await self._run(getattr(self.driver, name))
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def _run(self, method, *args, **kwargs):
+        '''Run a blocking Driver call on the session thread.'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(method, *args, **kwargs))
+
+# Driver methods that never use the browser, which AsyncDriver calls directly
+_DRIVER_UTILITIES = ['export_timing', 'get_date', 'get_time', 'get_timestamp', 'instrument',
+                     'make_valid_name', 'pause', 'throw', 'trace']
+
+def _async_method(name):
+    '''Return a coroutine method that runs the named Driver method
+    on the session thread of an AsyncDriver.'''
+    async def method(self, *args, **kwargs):
+        return await self._run(getattr(self.driver, name), *args, **kwargs)
+    method.__name__ = name
+    method.__qualname__ = f'AsyncDriver.{name}'
+    method.__doc__ = getattr(Driver, name).__doc__
+    return method
+
+for _name in ['are_clickable', 'block_urls', 'capture', 'check_alert', 'clear_element_cache',
+              'control_click', 'double_click', 'extract_table', 'fill_form', 'find',
+              'flush_captures', 'goto', 'is_element_clickable', 'is_field_set',
+              'is_radio_button_group_set', 'open', 'reset', 'right_click', 'scroll_into_view',
+              'set_field', 'set_window', 'snapshot_form', 'switch_to',
+              'wait_until_element_clickable']:
+    setattr(AsyncDriver, _name, _async_method(_name))
+
+
+################################################################################
+# Command Traces
+################################################################################
+_ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+
+def _trace_value(value):
+    '''Return a JSON value for a command parameter that is not one.'''
+    if isinstance(value, WebElement):
+        return {_ELEMENT_KEY: value.id}
+    return str(value)
+
+def _trace_elements(value):
+    '''Given a command result, return the ids of the elements in it, in order.'''
+    if isinstance(value, WebElement):
+        return [value.id]
+    if isinstance(value, dict):
+        if _ELEMENT_KEY in value:
+            return [value[_ELEMENT_KEY]]
+        value = list(value.values())
+    if isinstance(value, list):
+        return [element_id for item in value for element_id in _trace_elements(item)]
+    return []
+
+def _map_elements(value, element_ids):
+    '''Given command parameters and a dictionary of {traced element id:
+    replayed element id}, return the parameters with the ids replaced.'''
+    if isinstance(value, dict):
+        if _ELEMENT_KEY in value:
+            return {_ELEMENT_KEY: element_ids.get(value[_ELEMENT_KEY], value[_ELEMENT_KEY])}
+        mapped = {key: _map_elements(item, element_ids) for key, item in value.items()}
+        if isinstance(mapped.get('id'), str):     # Element commands
+            mapped['id'] = element_ids.get(mapped['id'], mapped['id'])
+        return mapped
+    if isinstance(value, list):
+        return [_map_elements(item, element_ids) for item in value]
+    return value
+
+class _TraceWriter():
+    '''Writer of a command trace: a JSON line per WebDriver command with
+    the Driver method call that sent it, its parameters and its latency.
+    Each script is written once, on a line of its own, and commands refer
+    to it by id, so traces of in-page helpers stay small.'''
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w')
+        self._scripts = set()
+        self._start_time = time.perf_counter()
+        self._lock = threading.Lock()
+        self._write({'type': 'trace', 'version': __version__, 'started': str(datetime.now())})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def command(self, call, command, params, start_time, seconds, response, error):
+        '''Write one command, given the [round trips, method name, call id]
+        of the Driver method call that sent it (or None), its parameters,
+        its perf_counter start time, latency and response or exception.'''
+        params = dict(params or {})
+        record = {
+            'type': 'command',
+            't': round(start_time - self._start_time, 6),
+            'call': call[2] if call else None,
+            'method': call[1] if call else None,
+            'command': command,
+            'params': params,
+            'ms': round(seconds * 1000, 3),
+        }
+        if response:
+            element_ids = _trace_elements(response.get('value'))
+            if element_ids:
+                record['elements'] = element_ids
+        if error is not None:
+            record['error'] = type(error).__name__
+        with self._lock:
+            script = params.get('script')
+            if isinstance(script, str):
+                script_id = hashlib.sha1(script.encode()).hexdigest()[:12]
+                if script_id not in self._scripts:
+                    self._scripts.add(script_id)
+                    self._write({'type': 'script', 'id': script_id, 'source': script})
+                params['script'] = f'@{script_id}'
+            self._write(record)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':'), default=_trace_value) + '\n')
+
+def _read_trace(path):
+    '''Given the path of a command trace, yield its command records
+    with the scripts they refer to filled in.'''
+    scripts = {}
+    with open(path) as trace_file:
+        for line in trace_file:
+            record = json.loads(line)
+            if record['type'] == 'script':
+                scripts[record['id']] = record['source']
+            elif record['type'] == 'command':
+                script = record['params'].get('script')
+                if isinstance(script, str) and script.startswith('@'):
+                    record['params']['script'] = scripts.get(script[1:], script)
+                yield record
+
+def _summarize(records):
+    '''Given command records, return their summary (see summarize_trace).'''
+    summary = {'methods': {}, 'commands': {}, 'errors': 0}
+    calls = {}
+    for record in records:
+        method = record['method'] or '(browser)'
+        stats = summary['methods'].setdefault(method, {'calls': 0, 'round_trips': 0, 'ms': 0.0})
+        if record['call'] is None or calls.get(record['call']) != method:
+            stats['calls'] += 1
+            calls[record['call']] = method
+        stats['round_trips'] += 1
+        stats['ms'] += record['ms']
+        stats = summary['commands'].setdefault(record['command'], {'count': 0, 'ms': 0.0})
+        stats['count'] += 1
+        stats['ms'] += record['ms']
+        summary['errors'] += 'error' in record
+    for stats in list(summary['methods'].values()) + list(summary['commands'].values()):
+        stats['ms'] = round(stats['ms'], 3)
+    return summary
+
+def summarize_trace(path):
+    '''Given the path of a command trace, return a dictionary of the
+    "methods" with their calls, round trips and total latency in ms,
+    the "commands" with their count and total latency and the number of
+    commands that failed ("errors"). Commands sent directly through
+    Driver.browser count under the method "(browser)".'''
+    return _summarize(_read_trace(path))
+
+def replay_trace(path, config=None):
+    '''Given the path of a command trace and a Driver config (by default
+    the Fake backend), open a session, send the traced commands to it again
+    in order, as fast as it answers them, and
+    return the summary of the replay (see summarize_trace).
+    Elements in the commands are mapped to the elements that the replayed
+    commands returned; commands that fail are counted and skipped.'''
+    driver = Driver()
+    driver.open(config=dict(config or {'browser': 'Fake'}, metrics=False, trace_file=None))
+    records = []
+    element_ids = {}
+    try:
+        for record in _read_trace(path):
+            params = _map_elements(record['params'], element_ids)
+            error = None
+            start_time = time.perf_counter()
+            try:
+                response = driver.browser.execute(record['command'], params)
+            except WebDriverException as exception:
+                response = None
+                error = type(exception).__name__
+            replayed = dict(record, ms=round((time.perf_counter() - start_time) * 1000, 3))
+            replayed.pop('error', None)
+            if error is not None:
+                replayed['error'] = error
+            records.append(replayed)
+            if response:
+                element_ids.update(zip(record.get('elements', []),
+                                       _trace_elements(response.get('value'))))
+    finally:
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+    return _summarize(records)
+
+def compare_traces(baseline, current):
+    '''Given two command traces (paths or summaries), for example of the
+    same journey with two framework versions, or a trace and its replay,
+    return a dictionary of the "methods" with their [baseline, current]
+    round trips per call and ms per call, and a text "report" of them.'''
+    summaries = [summarize_trace(trace) if isinstance(trace, str) else trace
+                 for trace in [baseline, current]]
+    methods = {}
+    lines = [f'{"Method":30} {"round trips/call":>22} {"ms/call":>22}']
+    for name in sorted(set(summaries[0]['methods']) | set(summaries[1]['methods'])):
+        stats = [summary['methods'].get(name) for summary in summaries]
+        methods[name] = {
+            'round_trips': [round(item['round_trips'] / item['calls'], 2) if item else None
+                            for item in stats],
+            'ms': [round(item['ms'] / item['calls'], 3) if item else None for item in stats],
+        }
+        columns = [' -> '.join('-' if value is None else str(value) for value in values)
+                   for values in methods[name].values()]
+        lines.append(f'{name:30} {columns[0]:>22} {columns[1]:>22}')
+    return {'methods': methods, 'report': '\n'.join(lines) + '\n'}
+
+################################################################################
+# Parallel Test Runner
+################################################################################
+_WORKER = {'config': None, 'driver': None}
+
+def worker_driver():
+    '''Return the driver owned by the current worker process of run_parallel,
+    opening the browser on first use.'''
+    if _WORKER['driver'] is None:
+        if _WORKER['config'] is None:
+            raise FrameworkException('No browser config was given to run_parallel.')
+        driver = Driver()
+        driver.open(_WORKER['config'])
+        _WORKER['driver'] = driver
+    return _WORKER['driver']
+
+def _close_worker_driver():
+    '''Quit the browser owned by the current worker process, if any.'''
+    driver, _WORKER['driver'] = _WORKER['driver'], None
+    if driver is not None:
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+def _init_worker(config):
+    '''Initialize a run_parallel worker process.'''
+    _WORKER['config'] = config
+    _WORKER['driver'] = None
+    # Worker processes skip atexit, but multiprocessing runs its finalizers.
+    Finalize(None, _close_worker_driver, exitpriority=10)
+
+def _run_shard(test_names):
+    '''Run one shard of tests in a worker process and
+    return a picklable summary of the results.'''
+    stream = io.StringIO()
+    suite = unittest.defaultTestLoader.loadTestsFromNames(test_names)
+    result = unittest.TextTestRunner(stream=stream, verbosity=2).run(suite)
+    if _WORKER['driver'] is not None:
+        try:
+            _WORKER['driver'].reset()
+        except WebDriverException:
+            _close_worker_driver()
+    return {
+        'tests_run': result.testsRun,
+        'failures': [(test.id(), trace) for test, trace in result.failures],
+        'errors': [(test.id(), trace) for test, trace in result.errors],
+        'skipped': [(test.id(), reason) for test, reason in result.skipped],
+        'report': stream.getvalue(),
+    }
+
+def _shard_tests(suite, shard_by):
+    '''Given a test suite, return a list of shards (lists of test names)
+    grouped by test class or by individual test case, and the list of
+    tests that unittest could not load (names with typos, modules that
+    fail to import), which must not be sharded by their class name.'''
+    shards = {}
+    failed = []
+    stack = [suite]
+    while stack:
+        test = stack.pop(0)
+        if isinstance(test, unittest.TestSuite):
+            stack[:0] = list(test)
+        elif isinstance(test, unittest.loader._FailedTest):
+            failed.append(test)
+        elif shard_by == 'case':
+            shards[test.id()] = [test.id()]
+        elif shard_by == 'class':
+            class_name = test.id().rsplit('.', 1)[0]
+            shards.setdefault(class_name, [class_name])
+        else:
+            raise FrameworkException(f'Invalid shard type: {shard_by}')
+    return list(shards.values()), failed
+
+def run_parallel(test_names, workers=None, shard_by='class', config=None):
+    '''Given a list of unittest names (modules, classes or test cases),
+    split the tests into shards by "class" or "case",
+    run the shards in a pool of worker processes and
+    return the merged results as a dictionary.
+    When a browser config is given, each worker owns one driver that the
+    tests can get from worker_driver(); it is reset between shards.
+    Names that cannot be loaded are errors, and a run without any tests
+    is not successful.'''
+    if isinstance(test_names, str):
+        test_names = [test_names]
+    loader = unittest.TestLoader()
+    suite = loader.loadTestsFromNames(test_names)
+    shards, failed = _shard_tests(suite, shard_by)
+    merged = {
+        'tests_run': 0,
+        'failures': [],
+        'errors': [],
+        'skipped': [],
+        'report': '',
+    }
+    start_time = time.perf_counter()
+    # The loader records one error per test it could not load, in order.
+    messages = list(loader.errors)
+    for test in failed:
+        merged['tests_run'] += 1
+        merged['errors'].append((test.id(), messages.pop(0) if messages else test.id()))
+        merged['report'] += f'{test.id()} ... ERROR\n'
+    merged['errors'] += [('unittest.loader', message) for message in messages]
+    if shards:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(config,)) as executor:
+            for shard_result in executor.map(_run_shard, shards):
+                merged['tests_run'] += shard_result['tests_run']
+                merged['failures'] += shard_result['failures']
+                merged['errors'] += shard_result['errors']
+                merged['skipped'] += shard_result['skipped']
+                merged['report'] += shard_result['report']
+    merged['duration'] = time.perf_counter() - start_time
+    merged['successful'] = bool(merged['tests_run']) and \
+        not (merged['failures'] or merged['errors'])
+    return merged
+
+
+################################################################################
+# Data-driven Runner
+################################################################################
+def read_rows(path):
+    '''Given the path of a CSV file (with a header row) or a JSON lines
+    file (.jsonl), yield its rows as dictionaries, one line at a time.'''
+    with open(path, newline='') as rows_file:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in rows_file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(rows_file)
+
+def run_data(check, rows, config=None, sessions=4, pool=None, window=None, reset=True):
+    '''Given a function check(driver, row), the rows of data (a CSV or
+    JSON lines path, see read_rows, or any iterable) and a Driver config
+    (or a DriverPool to use),
+    run the check for every row on the given number of concurrent
+    sessions and yield a dictionary per row, in the order of the rows, of
+    its "index", the "row", the "result" of the check, the "error" it
+    raised (or None) and the "seconds" it took.
+    Rows are read as they are needed: at most window rows (by default two
+    per session) are read ahead of the oldest unfinished one, so memory
+    stays flat however many rows there are, and reading pauses while the
+    results are not consumed. Drivers are reset between rows unless reset
+    is False. A pool created for the run is closed when it ends.'''
+    if isinstance(rows, str):
+        rows = read_rows(rows)
+    window = window or 2 * sessions
+    own_pool = pool is None
+    if own_pool:
+        pool = DriverPool(config, size=sessions)
+
+    def run(index, row):
+        start_time = time.perf_counter()
+        result = error = None
+        try:
+            with pool.driver(reset) as driver:
+                result = check(driver, row)
+        except Exception as exception:
+            error = exception
+        return {'index': index, 'row': row, 'result': result, 'error': error,
+                'seconds': time.perf_counter() - start_time}
+
+    executor = ThreadPoolExecutor(max_workers=sessions, thread_name_prefix='run_data')
+    pending = deque()
+    try:
+        for index, row in enumerate(rows):
+            pending.append(executor.submit(run, index, row))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if own_pool:
+            pool.close()
+
+################################################################################
+# Static Driver
+################################################################################
+@lru_cache(maxsize=None)
+def _static_connection_class():
+    '''Return the class of selenium command executors that answer commands
+    in-process from a FakeWebDriverServer of their own, without HTTP or threads.
+    It is created on first use, as its selenium base class is imported lazily.'''
+    from selenium.webdriver.remote.client_config import ClientConfig
+    from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+    class _StaticConnection(RemoteConnection):
+
+        def __init__(self):
+            super().__init__(client_config=ClientConfig('http://static', keep_alive=False))
+            self._server = FakeWebDriverServer()
+
+        def _request(self, method, url, body=None):
+            status, payload = self._server.handle(method, urllib.parse.urlsplit(url).path, body)
+            if status >= 400:
+                return {'status': status, 'value': json.dumps(payload)}
+            return payload
+
+    return _StaticConnection
+
+class StaticDriver(Driver):
+    '''
+    Driver for server-rendered pages that need no JavaScript.
+    Pages are fetched (or loaded from a string) and parsed once into an
+    in-memory DOM with id, name and class indexes, and every command is
+    answered in-process, so find, is_field_set and the other field methods
+    return the same WebElements and values as with a browser at a fraction
+    of the cost. Page scripts never run; see FakeWebDriverServer.
+    A suite can switch to it with the config key "browser": "Static".
+    '''
+    def load(self, html):
+        '''Given a string of HTML, load it as the current page.'''
+        data = base64.b64encode(html.encode()).decode('ascii')
+        self.goto(f'data:text/html;base64,{data}')
+
+    def open(self, config=None):
+        '''Open an in-process session; any "browser" in the config is ignored.'''
+        super().open(config=dict(config or {}, browser='Static'))
+
+
 if __name__ == '__main__':
     print('The Selenium Framework module is not intended to run \
            as a script.')
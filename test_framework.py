@@ -5,8 +5,18 @@ Execute this script by running "pytest -s" in the directory containing
 the script and framework files.
 '''
 
+import asyncio
+import concurrent.futures
+import inspect
+import json
 import os
 import re
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import zlib
 import selenium_framework as sf
 
 CONFIG = {
@@ -18,6 +28,13 @@ CONFIG = {
     'test_page': f'file://{os.path.dirname(os.path.abspath(__file__))}/test_page.html'
 }
 
+LAZY_IMPORT_CHECK = '''
+import sys, selenium_framework as sf
+driver = sf.Driver()
+driver.get_timestamp()
+driver.make_valid_name('a b')
+print(isinstance(None, sf.WebElement), 'selenium.webdriver' in sys.modules)'''
+
 def intro_plan(title):
     '''Print a PLAN introduction.'''
     print(f'\n\n{"-" * 80}\n{title}\n{"-" * 80}', end='')
@@ -63,6 +80,57 @@ def test_plan01_case002_make_valid_name():
     result_string = driver.make_valid_name(test_string)
     assert result_string == 'Now_is_the_time'
 
+def test_plan01_case003_locators():
+    '''Test the Locator object.'''
+    intro_test('Test case 003 - Locator functions')
+    locator = sf.Locator(' css=form >> name=q >> xpath=.. ')
+    assert locator.steps == (('css selector', 'form'), ('name', 'q'), ('xpath', '..'))
+    assert sf.Locator('css=form >> name=q >> xpath=..') is locator
+    assert sf.Locator(locator) is locator
+    assert (locator.by, locator.value) == ('xpath', '..')
+    assert sf.Locator('xpath=//a[text()=">>"]').steps == (('xpath', '//a[text()=">>"]'),)
+    assert sf.Locator('css=ul>>xpath=a[.=">>"]').steps == \
+           (('css selector', 'ul'), ('xpath', 'a[.=">>"]'))
+
+    driver = setup_test()
+    assert driver._convert_locator('id=text01') == ('id', 'text01')
+    for invalid_locator in ['text01', 'bogus=text01', 'id=text01 >> window=main']:
+        try:
+            sf.Locator(invalid_locator)
+            assert False, f'Expected an invalid locator: {invalid_locator}'
+        except sf.FrameworkException:
+            pass
+
+def test_plan01_case004_metrics():
+    '''Test the Metrics object and method instrumentation.'''
+    intro_test('Test case 004 - Metrics functions')
+    driver = setup_test()
+    metrics = driver.instrument()
+    assert driver.instrument() is metrics
+    driver.make_valid_name('Now-is the (time)')
+    driver.make_valid_name('Now-is the (time)')
+    driver.wait(.01)
+    assert metrics.methods['make_valid_name']['count'] == 2
+    assert metrics.methods['wait']['seconds'] >= .01
+    assert sum(metrics.methods['wait']['buckets']) == 1
+
+    metrics.record('commands', 'findElements', .003, 1)
+    assert json.loads(metrics.to_json())['commands']['findElements']['round_trips'] == 1
+    prometheus_text = metrics.to_prometheus()
+    assert 'selenium_framework_method_seconds_count{method="make_valid_name"} 2' in prometheus_text
+    assert 'selenium_framework_command_seconds_bucket{command="findElements",le="0.005"} 1' \
+           in prometheus_text
+
+def test_plan01_case005_lazy_imports():
+    '''Test that browser-independent utilities do not import selenium's webdriver.'''
+    intro_test('Test case 005 - Lazy import functions')
+    output = subprocess.run([sys.executable, '-c', LAZY_IMPORT_CHECK], check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True).stdout
+    assert output.split() == ['False', 'False']
+    assert not isinstance(None, sf.WebElement)
+    assert sf.Keys.ENTER == '\ue007'
+
 # Test Plan 2 - Basic Browser Functions
 def test_plan02_case001_open_and_close_test_page():
     '''Test opening and closing a browser with the test page.'''
@@ -253,6 +321,150 @@ def test_plan02_case008_radio_buttons():
 
     driver.close()
 
+def test_plan02_case009_fill_form():
+    '''Test the .fill_form method.'''
+    intro_test('Test case 009 - Fill form functions')
+    driver = setup_test(CONFIG['browser'], CONFIG['test_page'])
+    form_values = {
+        'id=text01': 'Test123',
+        'id=textarea01': 'Test456',
+        'id=chbox01': True,
+        'name=radio': 'Value 2',
+        'id=select02': [1, 3],
+        'id=alskdjflkajsldkfjlaksdf': 'Missing',
+    }
+    results = driver.fill_form(form_values)
+    assert results == {
+        'id=text01': 'Test123',
+        'id=textarea01': 'Test456',
+        'id=chbox01': True,
+        'name=radio': ['Value 2'],
+        'id=select02': ['1', '3'],
+        'id=alskdjflkajsldkfjlaksdf': None,
+    }
+    assert driver.is_field_set(driver.find('id=text01')) == 'Test123'
+    assert driver.is_field_set(driver.find('id=select02')) == ['1', '3']
+
+    # Append to fields
+    results = driver.fill_form({'id=text01': '789', 'id=select02': [5]}, append=True)
+    assert results == {'id=text01': 'Test123789', 'id=select02': ['1', '3', '5']}
+
+    driver.close()
+
+def test_plan02_case010_snapshot_form():
+    '''Test the .snapshot_form method.'''
+    intro_test('Test case 010 - Snapshot form functions')
+    driver = setup_test(CONFIG['browser'], CONFIG['test_page'])
+    driver.set_field(driver.find('id=chbox01'), True)
+    driver.find('name=radio')[1].click()
+
+    snapshot = driver.snapshot_form()
+    assert snapshot['text01']['value'] == 'Double-click me'
+    assert snapshot['textarea01']['value'] == 'Right-click me'
+    assert snapshot['chbox01'] == {
+        'id': 'chbox01', 'name': None, 'tag': 'input', 'type': 'checkbox', 'value': True}
+    assert snapshot['radio01']['value'] and not snapshot['radio02']['value']
+    assert snapshot['select01']['value'] == ['1']
+    assert snapshot['select02']['value'] == []
+
+    # Snapshot of a container
+    snapshot = driver.snapshot_form('tag=table')
+    assert 'text01' in snapshot
+
+    driver.close()
+
+def test_plan02_case011_are_clickable():
+    '''Test the .are_clickable method and clickable-only find.'''
+    intro_test('Test case 011 - Are clickable functions')
+    driver = setup_test(CONFIG['browser'], CONFIG['test_page'])
+
+    elements = [driver.find('id=text01'), driver.find('id=hidden1'), driver.find('id=radio00')]
+    assert driver.are_clickable(elements) == [True, False, False]
+    assert driver.are_clickable([]) == []
+
+    element_list = driver.find('tag=input', clickable_only=True)
+    element_ids = [element.get_attribute('id') for element in element_list]
+    assert 'text01' in element_ids and 'chbox01' in element_ids
+    assert 'hidden1' not in element_ids and 'radio00' not in element_ids
+
+    # Out of view element
+    element = driver.find('id=out_of_view')
+    assert driver.are_clickable([element]) == [True]
+    assert driver.are_clickable([element], in_viewport=True) == [False]
+
+    driver.close()
+
+def test_plan02_case012_wait_for_elements():
+    '''Test waiting for elements that appear or become clickable later.'''
+    intro_test('Test case 012 - Wait for element functions')
+    driver = setup_test(CONFIG['browser'], CONFIG['test_page'])
+    driver.browser.execute_script('''
+        setTimeout(function() {
+            var element = document.createElement('input');
+            element.id = 'late01';
+            document.body.appendChild(element);
+        }, 1000);''')
+    start_time = time.perf_counter()
+    element = driver.find('id=late01', wait=3)
+    assert isinstance(element, driver.web_element)
+    assert time.perf_counter() - start_time < 2.5
+
+    hidden_element = driver.wait_until_element_clickable('id=hidden2', timeout=5)
+    assert driver.is_element_clickable(hidden_element)
+
+    try:
+        driver.wait_until_element_clickable('id=hidden1', timeout=1)
+        assert False, 'Expected a timeout'
+    except sf.TimeoutException:
+        pass
+
+    driver.close()
+
+def test_plan02_case013_chained_locators():
+    '''Test the .find method with chained locators.'''
+    intro_test('Test case 013 - Chained locator functions')
+    driver = setup_test(CONFIG['browser'], CONFIG['test_page'])
+
+    element = driver.find('tag=table >> id=select02 >> xpath=..')
+    assert element.tag_name == 'td'
+
+    element_list = driver.find('tag=tr >> tag=input')
+    assert isinstance(element_list, list)
+    assert [element.get_attribute('id') for element in element_list] == \
+           [element.get_attribute('id') for element in driver.find('tag=input')]
+
+    element_list = driver.find('id=select02 >> id=text01', wait=0)
+    assert element_list == []
+
+    driver.close()
+
+def test_plan02_case014_element_cache():
+    '''Test the element cache of the .find method.'''
+    intro_test('Test case 014 - Element cache functions')
+    driver = setup_test(CONFIG['browser'], CONFIG['test_page'])
+    driver.element_cache = True
+
+    element = driver.find('id=text01')
+    assert driver.find('id=text01') == element
+    assert driver.find('id=hidden2') != element
+
+    # Replacing the element invalidates the cache
+    driver.browser.execute_script('''
+        var element = document.getElementById('text01');
+        element.parentNode.replaceChild(element.cloneNode(), element);''')
+    new_element = driver.find('id=text01')
+    assert new_element != element
+    assert driver.is_field_set(new_element) == 'Double-click me'
+
+    # Navigation invalidates the cache
+    driver.element_cache = 'navigation'
+    element = driver.find('id=text01')
+    assert driver.find('id=text01') == element
+    driver.goto(CONFIG['test_page'])
+    assert driver.find('id=text01') != element
+
+    driver.close()
+
 # Test Plan 3 - Advanced Browser Functions
 def test_plan03_case001_double_click_and_alert():
     '''Test the .double_click method.'''
@@ -279,6 +491,858 @@ def test_plan03_case002_right_click_and_alert():
 
     driver.close()
 
+def test_plan03_case003_scroll_into_view():
+    '''Test the .scroll_into_view method.'''
+    intro_test('Test case 003 - Scroll into view functions')
+    driver = setup_test(CONFIG['browser'], CONFIG['test_page'])
+    field_element = driver.find('id=out_of_view')
+    assert driver.are_clickable([field_element], in_viewport=True) == [False]
+    driver.scroll_into_view(field_element)
+    assert driver.are_clickable([field_element], in_viewport=True) == [True]
+
+    # Fixed delay fallback
+    driver.settle_delay = .1
+    driver.scroll_into_view(driver.find('id=title'))
+    assert driver.are_clickable([field_element], in_viewport=True) == [False]
+
+    driver.close()
+
+# Test Plan 4 - Driver Pool
+def test_plan04_case001_driver_pool_reuse():
+    '''Test that the driver pool reuses and resets its sessions.'''
+    intro_plan('Starting test plan 004 - Driver pool functions')
+    intro_test('Test case 001 - Driver pool reuse functions')
+    with sf.DriverPool(CONFIG, size=1) as pool:
+        with pool.driver() as driver:
+            driver.goto(CONFIG['test_page'])
+            driver.browser.execute_script('window.open("about:blank");')
+            first_browser = driver.browser
+        with pool.driver() as driver:
+            assert driver.browser is first_browser
+            assert driver.browser.current_url == 'about:blank'
+            assert len(driver.browser.window_handles) == 1
+
+def test_plan04_case002_driver_pool_reset():
+    '''Test that resets clear cookies over CDP and failed opens free their slot.'''
+    intro_test('Test case 002 - Driver pool reset functions')
+    with sf.DriverPool(dict(CONFIG, browser='Fake', metrics=True), size=1) as pool:
+        with pool.driver() as driver:
+            driver.goto(CONFIG['test_page'])
+            driver.browser.add_cookie({'name': 'session', 'value': '1'})
+        assert driver._cdp is True
+        assert driver.browser.get_cookies() == []
+        assert driver.metrics.commands['sfExecuteCdpCommand']['count'] == 1
+    pool = sf.DriverPool(dict(CONFIG, browser='Unknown'), size=1)
+    try:
+        pool.acquire()
+        assert False, 'Expected the browser to fail to open'
+    except Exception:
+        assert pool._drivers == []
+
+def test_plan04_case003_driver_pool_dead_browser():
+    '''Test that a driver whose reset fails with any error frees its slot.'''
+    intro_test('Test case 003 - Driver pool dead browser functions')
+    pool = sf.DriverPool(dict(CONFIG, browser='Fake'), size=1, timeout=5)
+    driver = pool.acquire()
+
+    def reset():
+        raise ConnectionError('The browser process is gone')
+
+    driver.reset = reset
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        waiter = executor.submit(pool.acquire)      # Blocks, the pool is full
+        time.sleep(0.1)
+        pool.release(driver)
+        assert waiter.result() is not driver
+    assert len(pool._drivers) == 1
+    pool.close()
+
+# Test Plan 5 - Parallel Runner
+def test_plan05_case001_run_parallel():
+    '''Test running unittest cases across worker processes.'''
+    intro_plan('Starting test plan 005 - Parallel runner functions')
+    intro_test('Test case 001 - Run parallel functions')
+    test_name = 'unit_tests.TestPlan001UtilityFunctions'
+    result = sf.run_parallel([test_name], workers=2, shard_by='case')
+    assert result['tests_run'] == \
+           unittest.defaultTestLoader.loadTestsFromName(test_name).countTestCases()
+    assert result['successful']
+    assert 'test_002_make_valid_name' in result['report']
+
+def test_plan05_case002_run_parallel_load_errors():
+    '''Test that test names which cannot be loaded fail the run.'''
+    intro_test('Test case 002 - Run parallel load error functions')
+    for test_names in [['unit_tests.TestPlan001UtilityFunctionz'], ['no_such_module']]:
+        result = sf.run_parallel(test_names, workers=1)
+        assert not result['successful']
+        assert len(result['errors']) == 1
+        assert result['errors'][0][0].endswith(test_names[0].rsplit('.', 1)[-1])
+    assert not sf.run_parallel([], workers=1)['successful']
+
+# Test Plan 6 - Asyncio Driver
+def test_plan06_case001_async_utilities():
+    '''Test the AsyncDriver without a browser.'''
+    intro_plan('Starting test plan 006 - Asyncio driver functions')
+    intro_test('Test case 001 - Async utility functions')
+
+    async def run_utilities():
+        async with sf.AsyncDriver() as driver:
+            await driver.wait(0)
+            return driver.make_valid_name(' Now-is the (time) ')
+
+    assert asyncio.run(run_utilities()) == 'Now_is_the_time'
+    assert inspect.iscoroutinefunction(sf.AsyncDriver.find)
+    assert sf.AsyncDriver.find.__doc__ == sf.Driver.find.__doc__
+
+def test_plan06_case002_async_sessions():
+    '''Test driving several browser sessions concurrently.'''
+    intro_test('Test case 002 - Async session functions')
+
+    async def run_session(text):
+        async with sf.AsyncDriver() as driver:
+            await driver.open(CONFIG)
+            await driver.goto(CONFIG['test_page'])
+            field_element = await driver.find('id=text01')
+            await driver.set_field(field_element, text)
+            return await driver.is_field_set(field_element)
+
+    async def run_sessions():
+        return await asyncio.gather(*[run_session(f'Session {index}') for index in range(3)])
+
+    assert asyncio.run(run_sessions()) == ['Session 0', 'Session 1', 'Session 2']
+
+def test_plan06_case003_async_other_methods():
+    '''Test that unlisted and subclass methods also run on the session thread.'''
+    intro_test('Test case 003 - Async other method functions')
+
+    async def run_static():
+        async with sf.AsyncDriver(sf.StaticDriver()) as driver:
+            await driver.open(CONFIG)
+            load = driver.load('<table id="t"><tr><th>A</th></tr><tr><td>1</td></tr>'
+                               '<tr><td>2</td></tr></table>')
+            assert inspect.isawaitable(load)
+            await load
+            chunks = [chunk async for chunk in driver.iter_table('id=t', chunk_size=1)]
+            await driver.quit()
+            await driver.close()
+            return chunks
+
+    assert asyncio.run(run_static()) == [{'A': ['1']}, {'A': ['2']}]
+
+# Test Plan 7 - Metrics
+def test_plan07_case001_browser_metrics():
+    '''Test recording round trips of Driver methods.'''
+    intro_plan('Starting test plan 007 - Metrics functions')
+    intro_test('Test case 001 - Browser metrics functions')
+    metrics_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics.json')
+    driver = sf.Driver()
+    driver.open(config=dict(CONFIG, metrics_file=metrics_file))
+    driver.goto(CONFIG['test_page'])
+    driver.fill_form({'id=text01': 'Test123', 'id=chbox01': True})
+    driver.find('id=text01')
+    driver.close()
+
+    with open(metrics_file) as json_file:
+        metrics = json.load(json_file)
+    os.remove(metrics_file)
+    assert metrics['methods']['fill_form']['round_trips'] == 1
+    assert metrics['methods']['find']['round_trips'] == 1
+    assert metrics['commands']['w3cExecuteScript']['count'] >= 1
+
+# Test Plan 8 - Fake Backend
+def test_plan08_case001_fake_backend():
+    '''Test the framework against the in-process fake backend.'''
+    intro_plan('Starting test plan 008 - Fake backend functions')
+    intro_test('Test case 001 - Fake backend functions')
+    driver = sf.Driver()
+    driver.open(config=dict(CONFIG, browser='Fake', metrics=True, element_cache=True))
+    driver.goto(CONFIG['test_page'])
+    assert driver.browser.title == 'Test Page'
+
+    text_field = driver.find('id=text01')
+    assert driver.is_field_set(text_field) == 'Double-click me'
+    driver.set_field(text_field, 'Test123')
+    assert driver.is_field_set(text_field) == 'Test123'
+    driver.set_field(driver.find('id=select02'), [1, 3])
+    assert driver.is_field_set(driver.find('id=select02')) == ['1', '3']
+    driver.find('name=radio')[1].click()
+    assert driver.is_radio_button_group_set(driver.find('name=radio')) == ['Value 1']
+
+    assert driver.fill_form({'id=chbox01': True, 'name=radio': 'Value 2'}) == \
+           {'id=chbox01': True, 'name=radio': ['Value 2']}
+    snapshot = driver.snapshot_form()
+    assert snapshot['text01']['value'] == 'Test123'
+    assert snapshot['select01'] == {'tag': 'select', 'type': 'select-one', 'name': None,
+                                    'id': 'select01', 'value': ['1']}
+    try:
+        driver.snapshot_form('id=missing')
+        assert False, 'Expected the form container to be missing'
+    except sf.FrameworkException as error:
+        assert error.msg == 'Unable to find the form container: id=missing'
+    assert driver.are_clickable(driver.find('tag=input'))[:2] == [True, False]
+    assert driver.find('tag=table >> id=select02 >> xpath=..').tag_name == 'td'
+    assert driver.find('id=text01') == text_field
+
+    # Only the framework's own scripts can run
+    try:
+        driver.browser.execute_script('return 1;')
+        assert False, 'Expected a WebDriverException'
+    except sf.WebDriverException:
+        pass
+
+    driver.reset()
+    assert driver.browser.current_url == 'about:blank'
+    assert driver.metrics.methods['fill_form']['round_trips'] == 1
+    driver.browser.quit()
+
+def test_plan08_case002_fake_backend_locators():
+    '''Test the CSS and XPath support of the fake backend.'''
+    intro_test('Test case 002 - Fake backend locator functions')
+    driver = sf.Driver()
+    driver.open(config=dict(CONFIG, browser='Fake'))
+    driver.goto('data:text/html,<ul id="list"><li class="a b">One<li class="b">Two'
+                '<li data-x="3">Three</ul><p>Item <a href="#">Link text</a></p>')
+    assert [element.text for element in driver.find('css=#list > li.b')] == ['One', 'Two']
+    assert driver.find('css=li[data-x^="3"]').text == 'Three'
+    assert driver.find('css=li.a + li').text == 'Two'
+    assert driver.find('xpath=//li[normalize-space(.) = "Two"]').text == 'Two'
+    assert driver.find('xpath=//ul/li[last()]').text == 'Three'
+    assert driver.find('xpath=//li[contains(@class, "a")]').text == 'One'
+    assert driver.find('link=Link text').tag_name == 'a'
+    assert driver.find('plink=Link').tag_name == 'a'
+    driver.browser.quit()
+
+def test_plan08_case003_static_driver():
+    '''Test the StaticDriver on server-rendered pages.'''
+    intro_test('Test case 003 - Static driver functions')
+    driver = sf.StaticDriver()
+    driver.open(config=dict(CONFIG, remote_hub=('127.0.0.1', 9)))    # Not used by Static
+    driver.goto(CONFIG['test_page'])
+    assert isinstance(driver.find('id=text01'), driver.web_element)
+    assert driver.is_field_set(driver.find('id=text01')) == 'Double-click me'
+    assert driver.is_field_set(driver.find('id=select01')) == ['1']
+    assert driver.is_radio_button_group_set(driver.find('name=radio')) == []
+    assert driver.find('id=missing', wait=1) == []
+
+    driver.load('<form><input name="q" class="query wide" value="Test123"/>'
+                '<input type="radio" name="r" value="A" checked/></form>')
+    assert driver.find('class=wide') == driver.find('name=q')
+    assert driver.is_field_set(driver.find('css=.query')) == 'Test123'
+    assert driver.is_radio_button_group_set([driver.find('name=r')]) == ['A']
+    driver.close()
+
+def test_plan08_case004_fake_backend_history():
+    '''Test that the fake backend keeps only the current document alive.'''
+    intro_test('Test case 004 - Fake backend history functions')
+    driver = sf.Driver()
+    driver.open(config=dict(CONFIG, browser='Fake'))
+    session = sf.fake_server().sessions[driver.browser.session_id]
+    for _ in range(3):
+        driver.goto(CONFIG['test_page'])
+        element = driver.find('id=text01')
+    driver.goto('about:blank')
+    assert session.window.history == ['about:blank'] + [CONFIG['test_page']] * 3 + \
+                                     ['about:blank']
+    assert session.elements == {}
+    try:
+        element.click()
+        assert False, 'Expected a stale element reference'
+    except sf.StaleElementReferenceException:
+        pass
+    driver.browser.back()
+    assert driver.is_field_set(driver.find('id=text01')) == 'Double-click me'
+    driver.browser.quit()
+
+    static_drivers = [sf.StaticDriver(), sf.StaticDriver()]
+    for static_driver in static_drivers:
+        static_driver.open(config=CONFIG)
+    assert static_drivers[0].browser.command_executor._server is not \
+           static_drivers[1].browser.command_executor._server
+    for static_driver in static_drivers:
+        static_driver.close()
+
+def test_plan08_case005_element_cache_round_trips():
+    '''Test the round trips of cache hits in both element cache modes.'''
+    intro_test('Test case 005 - Element cache round trip functions')
+    for element_cache, round_trips in [(True, 1), ('navigation', 0)]:
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake', metrics=True,
+                                element_cache=element_cache))
+        driver.goto(CONFIG['test_page'])
+        element = driver.find('css=table >> id=select02')
+        driver.metrics.methods.clear()
+        assert driver.find('css=table >> id=select02') == element
+        assert driver.metrics.methods['find']['round_trips'] == round_trips
+        driver.browser.quit()
+
+def test_plan08_case006_settle_alert():
+    '''Test that an alert or navigation caused by an interaction counts as settled.'''
+    intro_test('Test case 006 - Settle alert functions')
+    driver = sf.Driver()
+    driver.open(config=dict(CONFIG, browser='Fake'))
+    driver.goto(CONFIG['test_page'])
+    def execute_async_script(script, *args):
+        raise sf.UnexpectedAlertPresentException(alert_text='Saved')
+    driver.browser.execute_async_script = execute_async_script
+    assert driver.double_click(driver.find('id=text01'))
+    def execute_unloaded(script, *args):
+        raise sf.WebDriverException('javascript error: document unloaded while waiting for result')
+    driver.browser.execute_async_script = execute_unloaded
+    assert driver.double_click(driver.find('id=text01'))
+    driver.scroll_into_view(driver.find('id=text01'))
+    driver.browser.quit()
+
+# Test Plan 9 - Remote Hub
+def test_plan09_case001_remote_hub_connection_pool():
+    '''Test sessions on a remote hub sharing keep-alive connections.'''
+    intro_plan('Starting test plan 009 - Remote hub functions')
+    intro_test('Test case 001 - Remote hub connection pool functions')
+    hub = sf.FakeWebDriverServer().start()
+    config = dict(CONFIG, remote_hub=('127.0.0.1', hub.port), remote_pool_size=2)
+    try:
+        for _ in range(3):
+            driver = sf.Driver()
+            driver.open(config=config)
+            driver.goto(CONFIG['test_page'])
+            assert driver.is_field_set(driver.find('id=text01')) == 'Double-click me'
+            driver.close()
+        assert hub.connections == 1
+        assert hub.sessions == {}
+
+        async def run_session():
+            async with sf.AsyncDriver() as driver:
+                await driver.open(config)
+                await driver.goto(CONFIG['test_page'])
+                return await driver.is_field_set(await driver.find('id=text01'))
+
+        async def run_sessions():
+            return await asyncio.gather(*[run_session() for _ in range(4)])
+
+        assert asyncio.run(run_sessions()) == ['Double-click me'] * 4
+        assert hub.connections <= 2
+    finally:
+        hub.stop()
+
+# Test Plan 10 - Session Startup
+def fake_session_args(driver):
+    '''Return the browser arguments a fake backend session was opened with.'''
+    capabilities = sf.fake_server().sessions[driver.browser.session_id].capabilities
+    return capabilities['alwaysMatch']['goog:chromeOptions']['args']
+
+def test_plan10_case001_profile_template():
+    '''Test starting sessions from copies of a profile template.'''
+    intro_plan('Starting test plan 010 - Session startup functions')
+    intro_test('Test case 001 - Profile template functions')
+    with tempfile.TemporaryDirectory() as folder:
+        template = os.path.join(folder, 'template')
+        os.makedirs(template)
+        for file_name in ['Preferences', 'SingletonLock']:
+            with open(os.path.join(template, file_name), 'w') as template_file:
+                template_file.write('{}')
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake', profile_template=template))
+        profile = [argument.split('=', 1)[1] for argument in fake_session_args(driver)
+                   if argument.startswith('--user-data-dir=')][0]
+        assert profile != template
+        assert os.listdir(profile) == ['Preferences']
+        driver.close()
+        assert not os.path.exists(profile)
+
+def test_plan10_case002_shared_service():
+    '''Test opening sessions on one long-lived driver service.'''
+    intro_test('Test case 002 - Shared service functions')
+    config = dict(CONFIG, shared_service=True)
+    service_urls = []
+    for _ in range(2):
+        driver = sf.Driver()
+        driver.open(config=config)
+        driver.goto(CONFIG['test_page'])
+        service_urls.append(driver.browser.command_executor._client_config.remote_server_addr)
+        driver.browser.quit()
+    assert service_urls[0] == service_urls[1]
+
+# Test Plan 11 - Navigation
+def test_plan11_case001_goto_wait_for():
+    '''Test the page load strategy and the readiness conditions of goto.'''
+    intro_plan('Starting test plan 011 - Navigation functions')
+    intro_test('Test case 001 - Goto wait for functions')
+    driver = sf.Driver()
+    driver.open(config=dict(CONFIG, browser='Fake', page_load_strategy='none'))
+    capabilities = sf.fake_server().sessions[driver.browser.session_id].capabilities
+    assert capabilities['alwaysMatch']['pageLoadStrategy'] == 'none'
+
+    driver.goto(CONFIG['test_page'], wait_for='id=text01')
+    assert driver.browser.title == 'Test Page'
+    driver.goto(CONFIG['test_page'], wait_for='interactive')
+    driver.goto(CONFIG['test_page'], wait_for=lambda driver: driver.find('id=select02'))
+    try:
+        driver.goto(CONFIG['test_page'], wait_for='id=missing', timeout=1)
+        assert False, 'Expected a timeout'
+    except sf.TimeoutException:
+        pass
+    # Invalid locators fail before navigating, and stale elements are retried
+    driver.goto('about:blank')
+    try:
+        driver.goto(CONFIG['test_page'], wait_for='missing', timeout=1)
+        assert False, 'Expected an invalid locator'
+    except sf.FrameworkException:
+        assert driver.browser.current_url == 'about:blank'
+    attempts = []
+    def ready(driver):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise sf.StaleElementReferenceException('stale')
+        return True
+    driver.goto(CONFIG['test_page'], wait_for=ready, timeout=3)
+    assert len(attempts) == 2
+    driver.close()
+
+def test_plan11_case002_block_urls():
+    '''Test blocking requests by url pattern.'''
+    intro_test('Test case 002 - Block urls functions')
+    with tempfile.TemporaryDirectory() as folder:
+        with open(os.path.join(folder, 'frame.html'), 'w') as frame_file:
+            frame_file.write('<input id="deep"/>')
+        with open(os.path.join(folder, 'page.html'), 'w') as page_file:
+            page_file.write('<iframe id="frame" src="frame.html"></iframe>')
+        page = f'file://{folder}/page.html'
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake', block_urls=['*/frame.html']))
+        driver.goto(page)
+        driver.switch_to('frame=frame')
+        assert driver.find('id=deep', wait=0) == []
+
+        driver.block_urls([])
+        driver.goto(page)
+        driver.switch_to('frame=frame')
+        assert isinstance(driver.find('id=deep', wait=0), driver.web_element)
+        driver.close()
+
+# Test Plan 12 - Timing
+def test_plan12_case001_goto_timing():
+    '''Test the navigation timing records returned from goto and their export.'''
+    intro_plan('Starting test plan 012 - Timing functions')
+    intro_test('Test case 001 - Goto timing functions')
+    with tempfile.TemporaryDirectory() as folder:
+        timing_file = os.path.join(folder, 'timing.jsonl')
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake', timing_file=timing_file))
+        record = driver.goto(CONFIG['test_page'])
+        assert record['url'] == CONFIG['test_page']
+        assert record['navigation']['entryType'] == 'navigation'
+        assert record['summary']['load_ms'] is not None
+        assert record['summary']['goto_ms'] >= record['summary']['load_ms']
+        record = driver.goto(CONFIG['test_page'], wait_for='complete')
+        assert set(record['summary']) >= {'server_ms', 'dom_content_loaded_ms', 'overhead_ms'}
+        assert driver.goto(CONFIG['test_page'], timing=False) is None
+        assert len(driver.timing_log) == 2
+        driver.close()
+        with open(timing_file) as log_file:
+            records = [json.loads(line) for line in log_file]
+        assert [record['url'] for record in records] == [CONFIG['test_page']] * 2
+
+# Test Plan 13 - Tables
+def make_table_page(folder, row_count=2500):
+    '''Write a page with a report table of the given number of rows and
+    a total row, and a table without headers, and return its url.'''
+    rows = ''.join(f'<tr><td>{index}</td><td>Name {index}</td><td>{index * 1.5}</td></tr>'
+                   for index in range(row_count))
+    path = os.path.join(folder, 'tables.html')
+    with open(path, 'w') as page_file:
+        page_file.write('<html><body><table id="report"><thead><tr><th>Id</th><th>Name</th>'
+                        f'<th>Amount</th></tr></thead><tbody>{rows}'
+                        '<tr><td colspan="2">Total</td></tr></tbody></table>'
+                        '<table id="plain"><tr><td>a</td><td>b</td></tr></table></body></html>')
+    return f'file://{path}'
+
+def test_plan13_case001_extract_table():
+    '''Test extracting a table into columns in one call and in chunks.'''
+    intro_plan('Starting test plan 013 - Table functions')
+    intro_test('Test case 001 - Extract table functions')
+    with tempfile.TemporaryDirectory() as folder:
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake', metrics=True))
+        driver.goto(make_table_page(folder))
+        columns = driver.extract_table('id=report')
+        assert driver.metrics.methods['extract_table']['round_trips'] == 1
+        assert list(columns) == ['Id', 'Name', 'Amount']
+        assert len(columns['Id']) == 2501
+        assert columns['Name'][:2] == ['Name 0', 'Name 1']
+        assert (columns['Id'][-1], columns['Name'][-1], columns['Amount'][-1]) == \
+               ('Total', 'Total', None)
+        assert driver.extract_table(driver.find('id=plain')) == {0: ['a'], 1: ['b']}
+        assert driver.extract_table('id=report', header=False)[0][0] == 'Id'
+
+        chunks = list(driver.iter_table('id=report', chunk_size=1000))
+        assert [len(chunk['Id']) for chunk in chunks] == [1000, 1000, 501]
+        assert all(list(chunk) == ['Id', 'Name', 'Amount'] for chunk in chunks)
+        assert sum((chunk['Amount'] for chunk in chunks), []) == columns['Amount']
+        try:
+            driver.extract_table('id=missing')
+            assert False, 'Expected a FrameworkException'
+        except sf.FrameworkException:
+            pass
+        driver.close()
+
+def test_plan13_case002_extract_table_numpy():
+    '''Test the NumPy output of extract_table, when numpy is installed.'''
+    intro_test('Test case 002 - Extract table NumPy functions')
+    with tempfile.TemporaryDirectory() as folder:
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake'))
+        driver.goto(make_table_page(folder, row_count=10))
+        try:
+            import numpy
+        except ImportError:
+            try:
+                driver.extract_table('id=report', output='numpy')
+                assert False, 'Expected a FrameworkException'
+            except sf.FrameworkException:
+                pass
+        else:
+            arrays = driver.extract_table('id=plain', output='numpy')
+            assert arrays[0].dtype == object
+            chunk = next(driver.iter_table('id=report', chunk_size=10, output='numpy'))
+            assert chunk['Amount'].dtype == numpy.float64
+            assert chunk['Amount'][1] == 1.5
+        driver.close()
+
+# Test Plan 14 - Captures
+def test_plan14_case001_capture():
+    '''Test queueing screenshots to be written in the background.'''
+    intro_plan('Starting test plan 014 - Capture functions')
+    intro_test('Test case 001 - Capture functions')
+    with tempfile.TemporaryDirectory() as folder:
+        capture_dir = os.path.join(folder, 'captures')
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake', capture_dir=capture_dir,
+                                capture_compression=9, capture_queue=1))
+        driver.goto(CONFIG['test_page'])
+        paths = [driver.capture('Step 1'), driver.capture('Step 1'), driver.capture('Log in (ok)')]
+        assert len(set(paths)) == 3
+        assert all(os.path.dirname(path) == capture_dir for path in paths)
+        assert re.fullmatch(r'Log_in_ok_[\d_]+\.png', os.path.basename(paths[2]))
+        driver.close()
+        for path in paths:
+            with open(path, 'rb') as capture_file:
+                assert capture_file.read(8) == b'\x89PNG\r\n\x1a\n'
+
+def test_plan14_case002_capture_errors():
+    '''Test that flushing captures raises the errors of writing them.'''
+    intro_test('Test case 002 - Capture error functions')
+    with tempfile.TemporaryDirectory() as folder:
+        capture_dir = os.path.join(folder, 'captures')
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake', capture_dir=capture_dir))
+        driver.capture('first')
+        driver.flush_captures()
+        os.rename(capture_dir, capture_dir + '_moved')
+        driver.capture('second')
+        try:
+            driver.flush_captures()
+            assert False, 'Expected a FrameworkException'
+        except sf.FrameworkException:
+            pass
+        driver.flush_captures()     # Errors are raised once
+        driver.close()
+
+def test_plan14_case003_pool_quit():
+    '''Test that pooled drivers run the close hooks when the pool quits them.'''
+    intro_test('Test case 003 - Pool quit functions')
+    with tempfile.TemporaryDirectory() as folder:
+        config = dict(CONFIG, browser='Fake', capture_dir=folder,
+                      metrics_file=os.path.join(folder, 'metrics.json'),
+                      timing_file=os.path.join(folder, 'timing.json'))
+        with sf.DriverPool(config, size=1) as pool:
+            with pool.driver() as driver:
+                path = driver.capture('pooled')
+                session_id = driver.browser.session_id
+        assert session_id not in sf.fake_server().sessions
+        assert driver._captures is None
+        for name in [path, 'metrics.json', 'timing.json']:
+            assert os.path.isfile(os.path.join(folder, name))
+
+# Test Plan 15 - Visual Diff
+def test_plan15_case001_visual_diff():
+    '''Test checking screenshots against baselines, when numpy is installed.'''
+    intro_plan('Starting test plan 015 - Visual diff functions')
+    intro_test('Test case 001 - Visual diff functions')
+    with tempfile.TemporaryDirectory() as folder:
+        baseline_dir = os.path.join(folder, 'baselines')
+        try:
+            import numpy
+        except ImportError:
+            try:
+                sf.VisualDiff(baseline_dir)
+                assert False, 'Expected a FrameworkException'
+            except sf.FrameworkException:
+                return
+        image = numpy.zeros((120, 160, 3), numpy.uint8)
+        image[:, :, 2] = numpy.arange(160)[None, :]
+        changed = image.copy()
+        changed[10:20, 40:60] = 255
+        with sf.VisualDiff(baseline_dir, cell_size=16) as visual:
+            assert visual.check('page', image)['new']
+            result = visual.check('page', sf._encode_png(image))
+            assert result['identical'] and result['match']
+            result = visual.check('page', changed, diff_path=os.path.join(folder, 'diff.png'))
+            assert not result['match']
+            assert result['changed_pixels'] == 200
+            assert result['bounding_box'] == (40, 10, 20, 10)
+            assert result['cells'] == [(32, 0, 16, 16), (48, 0, 16, 16),
+                                       (32, 16, 16, 16), (48, 16, 16, 16)]
+            assert os.path.exists(os.path.join(folder, 'diff.png'))
+            assert visual.check('page', changed, ignore=[(40, 10, 20, 10)])['match']
+            assert visual.diff(changed, image, regions={'top': (0, 0, 160, 20)})['regions'] == \
+                   {'top': 200 / 3200}
+            assert not visual.diff(image[:60], image)['match']
+            assert visual.find(image) == ['page']
+            assert visual.find(numpy.full((120, 160, 3), 128, numpy.uint8)) == []
+        assert sf.VisualDiff(baseline_dir).index == visual.index
+
+        # Baselines are decoded once, then their pixels are cached
+        decode_png = sf._decode_png
+        decoded = []
+        sf._decode_png = lambda png: decoded.append(png) or decode_png(png)
+        try:
+            visual = sf.VisualDiff(baseline_dir)
+            assert not visual.check('page', changed)['match']
+            assert not visual.check('page', changed)['match']
+            assert len(decoded) == 1
+        finally:
+            sf._decode_png = decode_png
+
+def test_plan15_case002_decode_png():
+    '''Test decoding screenshots and the PNG filter types without Pillow.'''
+    intro_test('Test case 002 - Decode PNG functions')
+    try:
+        import numpy
+    except ImportError:
+        return
+    has_pillow = sf._has_pillow
+    sf._has_pillow = lambda: False
+    try:
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake'))
+        driver.goto(CONFIG['test_page'])
+        pixels = sf._decode_png(driver.browser.get_screenshot_as_png())
+        assert pixels.shape == (600, 800, 3)
+        assert (pixels == pixels[0, 0]).all()
+        driver.close()
+
+        image = numpy.random.default_rng(1).integers(0, 256, (5, 4, 3)).astype(numpy.uint8)
+        rows = image.reshape(5, 12).astype(int)
+        filtered = []
+        for index, row in enumerate(rows):     # One row per filter type
+            above = rows[index - 1] if index else numpy.zeros(12, int)
+            left = numpy.concatenate([[0] * 3, row[:-3]])
+            upper_left = numpy.concatenate([[0] * 3, above[:-3]])
+            estimate = left + above - upper_left
+            paeth = numpy.where((abs(estimate - left) <= abs(estimate - above)) &
+                                (abs(estimate - left) <= abs(estimate - upper_left)), left,
+                                numpy.where(abs(estimate - above) <= abs(estimate - upper_left),
+                                            above, upper_left))
+            predictor = [0, left, above, (left + above) // 2, paeth][index]
+            filtered.append(bytes([index]) + bytes(((row - predictor) % 256).tolist()))
+        png = (sf._PNG_SIGNATURE +
+               sf._png_chunk(b'IHDR', bytes([0, 0, 0, 4, 0, 0, 0, 5, 8, 2, 0, 0, 0])) +
+               sf._png_chunk(b'IDAT', zlib.compress(b''.join(filtered))) +
+               sf._png_chunk(b'IEND', b''))
+        assert (sf._decode_png(png) == image).all()
+    finally:
+        sf._has_pillow = has_pillow
+
+# Test Plan 16 - Command Traces
+def test_plan16_case001_trace():
+    '''Test recording the commands of a session to a trace file.'''
+    intro_plan('Starting test plan 016 - Command trace functions')
+    intro_test('Test case 001 - Trace functions')
+    with tempfile.TemporaryDirectory() as folder:
+        trace_file = os.path.join(folder, 'trace.jsonl')
+        driver = sf.Driver()
+        try:
+            driver.trace(trace_file)
+            assert False, 'Expected tracing a closed session to fail'
+        except sf.FrameworkException:
+            assert not os.path.exists(trace_file)
+        driver.open(config=dict(CONFIG, browser='Fake', trace_file=trace_file))
+        driver.goto(CONFIG['test_page'])
+        element = driver.find('id=text01')
+        driver.set_field(element, 'Test123')
+        driver.fill_form({'id=text01': 'Test456', 'id=chbox01': True})
+        driver.fill_form({'id=text01': 'Test789'})
+        driver.close()
+        with open(trace_file) as trace:
+            records = [json.loads(line) for line in trace]
+        assert records[0]['type'] == 'trace'
+        scripts = [record for record in records if record['type'] == 'script']
+        assert len(scripts) == len({record['id'] for record in scripts})
+        commands = [record for record in records if record['type'] == 'command']
+        assert commands[0]['method'] == 'goto' and commands[0]['command'] == 'get'
+        assert all(record['params']['script'].startswith('@') for record in commands
+                   if 'script' in record['params'])
+        summary = sf.summarize_trace(trace_file)
+        assert summary['methods']['fill_form'] == dict(summary['methods']['fill_form'],
+                                                       calls=2, round_trips=2)
+        assert summary['methods']['find']['round_trips'] == 1
+        assert summary['errors'] == 0
+
+def test_plan16_case002_replay_trace():
+    '''Test replaying a trace and comparing it with the recorded one.'''
+    intro_test('Test case 002 - Replay trace functions')
+    with tempfile.TemporaryDirectory() as folder:
+        trace_file = os.path.join(folder, 'trace.jsonl')
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, browser='Fake', trace_file=trace_file))
+        driver.goto(CONFIG['test_page'])
+        element = driver.find('id=text01')
+        driver.set_field(element, 'Test123')
+        assert driver.is_field_set(element) == 'Test123'
+        driver.close()
+        replay = sf.replay_trace(trace_file)
+        assert replay['errors'] == 0
+        comparison = sf.compare_traces(trace_file, replay)
+        assert comparison['methods']['set_field']['round_trips'][0] == \
+               comparison['methods']['set_field']['round_trips'][1]
+        assert 'is_field_set' in comparison['report']
+
+def test_plan16_case003_pool_trace():
+    '''Test that the traces of pooled drivers are closed when the pool quits them.'''
+    intro_test('Test case 003 - Pool trace functions')
+    with tempfile.TemporaryDirectory() as folder:
+        trace_file = os.path.join(folder, 'trace.jsonl')
+        with sf.DriverPool(dict(CONFIG, browser='Fake', trace_file=trace_file)) as pool:
+            with pool.driver() as driver:
+                driver.goto(CONFIG['test_page'])
+        summary = sf.summarize_trace(trace_file)
+        assert summary['methods']['goto']['calls'] == 1
+        assert summary['methods']['reset']['calls'] == 1
+
+# Test Plan 17 - Data-driven Runner
+def check_row(driver, row):
+    '''Fill the test page form with a row and return the text field value.'''
+    driver.goto(CONFIG['test_page'])
+    driver.fill_form({'id=text01': row['text'], 'id=chbox01': row['checked'] == '1'})
+    if row['text'] == 'Invalid':
+        raise ValueError('Invalid row')
+    return driver.is_field_set(driver.find('id=text01'))
+
+def test_plan17_case001_run_data():
+    '''Test running a check for every row of a CSV file in order.'''
+    intro_plan('Starting test plan 017 - Data-driven runner functions')
+    intro_test('Test case 001 - Run data functions')
+    with tempfile.TemporaryDirectory() as folder:
+        rows_file = os.path.join(folder, 'rows.csv')
+        with open(rows_file, 'w') as csv_file:
+            csv_file.write('text,checked\n')
+            csv_file.write(''.join(f'Row {index},{index % 2}\n' for index in range(40)))
+            csv_file.write('Invalid,0\n')
+        results = list(sf.run_data(check_row, rows_file, dict(CONFIG, browser='Fake'),
+                                   sessions=4))
+        assert [result['index'] for result in results] == list(range(41))
+        assert [result['result'] for result in results[:40]] == \
+               [f'Row {index}' for index in range(40)]
+        assert isinstance(results[40]['error'], ValueError)
+
+def test_plan17_case002_run_data_backpressure():
+    '''Test that rows are read only as results are consumed.'''
+    intro_test('Test case 002 - Run data backpressure functions')
+    read = []
+    def rows():
+        for index in range(10 ** 7):
+            read.append(index)
+            yield {'text': f'Row {index}', 'checked': '0'}
+    with sf.DriverPool(dict(CONFIG, browser='Fake'), size=2) as pool:
+        results = sf.run_data(check_row, rows(), pool=pool, sessions=2, window=3, reset=False)
+        assert next(results)['result'] == 'Row 0'
+        assert len(read) <= 3
+        for _ in range(5):
+            next(results)
+        assert len(read) <= 8
+        results.close()
+        assert len(pool._drivers) == 2
+
+def test_plan17_case003_read_rows():
+    '''Test reading rows from JSON lines files.'''
+    intro_test('Test case 003 - Read rows functions')
+    with tempfile.TemporaryDirectory() as folder:
+        rows_file = os.path.join(folder, 'rows.jsonl')
+        with open(rows_file, 'w') as jsonl_file:
+            jsonl_file.write('{"text": "Row 0", "checked": "1"}\n\n{"text": "Row 1"}\n')
+        assert list(sf.read_rows(rows_file)) == [{'text': 'Row 0', 'checked': '1'},
+                                                 {'text': 'Row 1'}]
+
+# Test Plan 18 - Page Objects
+class FormPage(sf.Page):
+    '''Page object of the test page.'''
+    __slots__ = ()
+    url = CONFIG['test_page']
+    text = sf.Element('id=text01')
+    select = sf.Element('tag=table >> id=select02')
+    radios = sf.Element('name=radio')
+    missing = sf.Element('id=missing', wait=0)
+
+def test_plan18_case001_page_elements():
+    '''Test looking up page object elements lazily and caching them.'''
+    intro_plan('Starting test plan 018 - Page object functions')
+    intro_test('Test case 001 - Page element functions')
+    driver = sf.Driver()
+    driver.open(config=dict(CONFIG, browser='Fake', metrics=True))
+    round_trips = lambda: sum(stats['count'] for stats in driver.metrics.commands.values())
+    fields = {f'field{index}': sf.Element(f'id=field{index}') for index in range(500)}
+    large_page = type('LargePage', (FormPage,), dict(fields, __slots__=()))(driver)
+    assert not hasattr(large_page, '__dict__')
+    assert isinstance(FormPage.text.locator, sf.Locator)
+
+    start = round_trips()
+    page = FormPage(driver).goto()
+    assert round_trips() - start == 1
+    text = page.text
+    assert isinstance(text, driver.web_element)
+    assert round_trips() - start == 2
+    assert page.text is text
+    assert round_trips() - start == 2
+    assert len(page.radios) == 3
+    assert isinstance(page.select, driver.web_element)
+    assert page.missing == []
+    assert large_page.text is not text  # Each page has its own cache
+
+    start = round_trips()
+    driver.goto(FormPage.url)
+    assert page.text is not text
+    assert round_trips() - start == 2
+    driver.close()
+
+def test_plan18_case002_page_cache_modes():
+    '''Test the DOM-checked and disabled page element caches.'''
+    intro_test('Test case 002 - Page cache mode functions')
+    driver = sf.Driver()
+    driver.open(config=dict(CONFIG, browser='Fake', metrics=True))
+    round_trips = lambda: sum(stats['count'] for stats in driver.metrics.commands.values())
+    checked_page = type('CheckedPage', (FormPage,), {'__slots__': (), 'cache': True})(driver)
+    text = checked_page.goto().text
+    start = round_trips()
+    assert checked_page.text is text
+    assert round_trips() - start == 1
+    uncached_page = type('UncachedPage', (FormPage,), {'__slots__': (), 'cache': False})(driver)
+    assert uncached_page.text is not uncached_page.text
+    checked_page.clear_element_cache()
+    assert checked_page.text is not text
+    waiting_page = type('WaitingPage', (FormPage,), {
+        '__slots__': (), 'late': sf.Element('id=missing', wait=1)})(driver)
+    start = {name: stats['count'] for name, stats in driver.metrics.commands.items()}
+    assert waiting_page.late == []      # One lookup, then one in-page wait
+    assert {name: stats['count'] - start.get(name, 0)
+            for name, stats in driver.metrics.commands.items()
+            if stats['count'] != start.get(name, 0)} == \
+           {'w3cExecuteScript': 1, 'w3cExecuteScriptAsync': 1}
+    try:
+        sf.Page(driver).goto()
+        assert False, 'Expected a FrameworkException'
+    except sf.FrameworkException:
+        pass
+    driver.close()
+
 # End of Test Plans and Cases
 def template():
     '''Template Test Function'''
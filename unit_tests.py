@@ -1,12 +1,27 @@
 #!/usr/bin/env python
 '''Unit test script for the Selenium Framework module.'''
 
+import asyncio
+import concurrent.futures
+import inspect
+import json
 import os
 import re
-import timeit
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
+import zlib
 import selenium_framework as sf
 
+LAZY_IMPORT_CHECK = '''
+import sys, selenium_framework as sf
+driver = sf.Driver()
+driver.get_timestamp()
+driver.make_valid_name('a b')
+print(isinstance(None, sf.WebElement), 'selenium.webdriver' in sys.modules)'''
+
 def intro_plan(title):
     '''Print a PLAN introduction.'''
     print(f'\n\n{"-" * 80}\n{title}\n{"-" * 80}', end='')
@@ -44,6 +59,56 @@ class TestPlan001UtilityFunctions(unittest.TestCase):
         result_string = driver.make_valid_name(test_string)
         self.assertTrue(result_string == 'Now_is_the_time')
 
+    def test_003_locators(self):
+        '''Test the Locator object.'''
+        intro_test('Test case 003 - Locator functions')
+        locator = sf.Locator(' css=form >> name=q >> xpath=.. ')
+        self.assertEqual(locator.steps,
+                         (('css selector', 'form'), ('name', 'q'), ('xpath', '..')))
+        self.assertTrue(sf.Locator('css=form >> name=q >> xpath=..') is locator)
+        self.assertTrue(sf.Locator(locator) is locator)
+        self.assertEqual((locator.by, locator.value), ('xpath', '..'))
+        self.assertEqual(sf.Locator('xpath=//a[text()=">>"]').steps,
+                         (('xpath', '//a[text()=">>"]'),))
+        self.assertEqual(sf.Locator('css=ul>>xpath=a[.=">>"]').steps,
+                         (('css selector', 'ul'), ('xpath', 'a[.=">>"]')))
+        self.assertEqual(self.driver._convert_locator('id=text01'), ('id', 'text01'))
+        for invalid_locator in ['text01', 'bogus=text01', 'id=text01 >> window=main']:
+            with self.assertRaises(sf.FrameworkException):
+                sf.Locator(invalid_locator)
+
+    def test_004_metrics(self):
+        '''Test the Metrics object and method instrumentation.'''
+        intro_test('Test case 004 - Metrics functions')
+        driver = self.driver
+        metrics = driver.instrument()
+        self.assertTrue(driver.instrument() is metrics)
+        driver.make_valid_name('Now-is the (time)')
+        driver.make_valid_name('Now-is the (time)')
+        driver.wait(.01)
+        self.assertEqual(metrics.methods['make_valid_name']['count'], 2)
+        self.assertGreaterEqual(metrics.methods['wait']['seconds'], .01)
+        self.assertEqual(sum(metrics.methods['wait']['buckets']), 1)
+
+        metrics.record('commands', 'findElements', .003, 1)
+        self.assertEqual(
+            json.loads(metrics.to_json())['commands']['findElements']['round_trips'], 1)
+        prometheus_text = metrics.to_prometheus()
+        self.assertTrue(
+            'selenium_framework_method_seconds_count{method="make_valid_name"} 2'
+            in prometheus_text)
+        self.assertTrue(
+            'selenium_framework_command_seconds_bucket{command="findElements",le="0.005"} 1'
+            in prometheus_text)
+
+    def test_005_lazy_imports(self):
+        output = subprocess.run([sys.executable, '-c', LAZY_IMPORT_CHECK], check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True).stdout
+        self.assertEqual(output.split(), ['False', 'False'])
+        self.assertFalse(isinstance(None, sf.WebElement))
+        self.assertEqual(sf.Keys.ENTER, '\ue007')
+
 
 class TestPlan002BasicBrowser(unittest.TestCase):
     '''Test basic browser functions.'''
@@ -233,6 +298,135 @@ class TestPlan002BasicBrowser(unittest.TestCase):
         field_value = driver.is_radio_button_group_set(field_element)
         self.assertTrue(field_value == ['Value 1'])
 
+    def test_009_fill_form(self):
+        '''Test the .fill_form method.'''
+        intro_test('Test case 009 - Fill form functions')
+        driver = self.driver
+        form_values = {
+            'id=text01': 'Test123',
+            'id=textarea01': 'Test456',
+            'id=chbox01': True,
+            'name=radio': 'Value 2',
+            'id=select02': [1, 3],
+            'id=alskdjflkajsldkfjlaksdf': 'Missing',
+        }
+        results = driver.fill_form(form_values)
+        self.assertEqual(results, {
+            'id=text01': 'Test123',
+            'id=textarea01': 'Test456',
+            'id=chbox01': True,
+            'name=radio': ['Value 2'],
+            'id=select02': ['1', '3'],
+            'id=alskdjflkajsldkfjlaksdf': None,
+        })
+        self.assertEqual(driver.is_field_set(driver.find('id=text01')), 'Test123')
+        self.assertEqual(driver.is_field_set(driver.find('id=select02')), ['1', '3'])
+
+        # Append to fields
+        results = driver.fill_form({'id=text01': '789', 'id=select02': [5]}, append=True)
+        self.assertEqual(results, {'id=text01': 'Test123789', 'id=select02': ['1', '3', '5']})
+
+    def test_010_snapshot_form(self):
+        '''Test the .snapshot_form method.'''
+        intro_test('Test case 010 - Snapshot form functions')
+        driver = self.driver
+        driver.set_field(driver.find('id=chbox01'), True)
+        driver.find('name=radio')[1].click()
+
+        snapshot = driver.snapshot_form()
+        self.assertEqual(snapshot['text01']['value'], 'Double-click me')
+        self.assertEqual(snapshot['textarea01']['value'], 'Right-click me')
+        self.assertEqual(snapshot['chbox01'], {
+            'id': 'chbox01', 'name': None, 'tag': 'input', 'type': 'checkbox', 'value': True})
+        self.assertTrue(snapshot['radio01']['value'] and not snapshot['radio02']['value'])
+        self.assertEqual(snapshot['select01']['value'], ['1'])
+        self.assertEqual(snapshot['select02']['value'], [])
+
+        # Snapshot of a container
+        snapshot = driver.snapshot_form('tag=table')
+        self.assertTrue('text01' in snapshot)
+
+    def test_011_are_clickable(self):
+        '''Test the .are_clickable method and clickable-only find.'''
+        intro_test('Test case 011 - Are clickable functions')
+        driver = self.driver
+
+        elements = [driver.find('id=text01'), driver.find('id=hidden1'), driver.find('id=radio00')]
+        self.assertEqual(driver.are_clickable(elements), [True, False, False])
+        self.assertEqual(driver.are_clickable([]), [])
+
+        element_list = driver.find('tag=input', clickable_only=True)
+        element_ids = [element.get_attribute('id') for element in element_list]
+        self.assertTrue('text01' in element_ids and 'chbox01' in element_ids)
+        self.assertTrue('hidden1' not in element_ids and 'radio00' not in element_ids)
+
+        # Out of view element
+        element = driver.find('id=out_of_view')
+        self.assertEqual(driver.are_clickable([element]), [True])
+        self.assertEqual(driver.are_clickable([element], in_viewport=True), [False])
+
+    def test_012_wait_for_elements(self):
+        '''Test waiting for elements that appear or become clickable later.'''
+        intro_test('Test case 012 - Wait for element functions')
+        driver = self.driver
+        driver.browser.execute_script('''
+            setTimeout(function() {
+                var element = document.createElement('input');
+                element.id = 'late01';
+                document.body.appendChild(element);
+            }, 1000);''')
+        start_time = time.perf_counter()
+        element = driver.find('id=late01', wait=3)
+        self.assertTrue(isinstance(element, driver.web_element))
+        self.assertLess(time.perf_counter() - start_time, 2.5)
+
+        hidden_element = driver.wait_until_element_clickable('id=hidden2', timeout=5)
+        self.assertTrue(driver.is_element_clickable(hidden_element))
+
+        with self.assertRaises(sf.TimeoutException):
+            driver.wait_until_element_clickable('id=hidden1', timeout=1)
+
+    def test_013_chained_locators(self):
+        '''Test the .find method with chained locators.'''
+        intro_test('Test case 013 - Chained locator functions')
+        driver = self.driver
+
+        element = driver.find('tag=table >> id=select02 >> xpath=..')
+        self.assertEqual(element.tag_name, 'td')
+
+        element_list = driver.find('tag=tr >> tag=input')
+        self.assertTrue(isinstance(element_list, list))
+        self.assertEqual([element.get_attribute('id') for element in element_list],
+                         [element.get_attribute('id') for element in driver.find('tag=input')])
+
+        element_list = driver.find('id=select02 >> id=text01', wait=0)
+        self.assertEqual(element_list, [])
+
+    def test_014_element_cache(self):
+        '''Test the element cache of the .find method.'''
+        intro_test('Test case 014 - Element cache functions')
+        driver = self.driver
+        driver.element_cache = True
+
+        element = driver.find('id=text01')
+        self.assertEqual(driver.find('id=text01'), element)
+        self.assertNotEqual(driver.find('id=hidden2'), element)
+
+        # Replacing the element invalidates the cache
+        driver.browser.execute_script('''
+            var element = document.getElementById('text01');
+            element.parentNode.replaceChild(element.cloneNode(), element);''')
+        new_element = driver.find('id=text01')
+        self.assertNotEqual(new_element, element)
+        self.assertEqual(driver.is_field_set(new_element), 'Double-click me')
+
+        # Navigation invalidates the cache
+        driver.element_cache = 'navigation'
+        element = driver.find('id=text01')
+        self.assertEqual(driver.find('id=text01'), element)
+        driver.goto(TEST_PAGE)
+        self.assertNotEqual(driver.find('id=text01'), element)
+
 
 class TestPlan003AdvancedFeatures(unittest.TestCase):
     '''Test the advanced features.'''
@@ -270,6 +464,787 @@ class TestPlan003AdvancedFeatures(unittest.TestCase):
         alert_text = driver.check_alert()
         self.assertTrue(alert_text == 'Right-click event')
 
+    def test_003_scroll_into_view(self):
+        '''Test the .scroll_into_view method.'''
+        intro_test('Test case 003 - Scroll into view functions')
+        driver = self.driver
+        field_element = driver.find('id=out_of_view')
+        self.assertEqual(driver.are_clickable([field_element], in_viewport=True), [False])
+        driver.scroll_into_view(field_element)
+        self.assertEqual(driver.are_clickable([field_element], in_viewport=True), [True])
+
+        # Fixed delay fallback
+        driver.settle_delay = .1
+        driver.scroll_into_view(driver.find('id=title'))
+        self.assertEqual(driver.are_clickable([field_element], in_viewport=True), [False])
+
+
+class TestPlan004DriverPool(unittest.TestCase):
+    '''Test the driver pool.'''
+    def setUp(self):
+        self.pool = sf.DriverPool(CONFIG, size=1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_001_driver_pool_reuse(self):
+        '''Test that the driver pool reuses and resets its sessions.'''
+        intro_plan('Starting test plan 004 - Driver pool functions')
+        intro_test('Test case 001 - Driver pool reuse functions')
+        with self.pool.driver() as driver:
+            driver.goto(TEST_PAGE)
+            driver.browser.execute_script('window.open("about:blank");')
+            first_browser = driver.browser
+        with self.pool.driver() as driver:
+            self.assertTrue(driver.browser is first_browser)
+            self.assertEqual(driver.browser.current_url, 'about:blank')
+            self.assertEqual(len(driver.browser.window_handles), 1)
+
+    def test_002_driver_pool_reset(self):
+        '''Test that resets clear cookies over CDP and failed opens free their slot.'''
+        intro_test('Test case 002 - Driver pool reset functions')
+        with sf.DriverPool(dict(CONFIG, browser='Fake', metrics=True), size=1) as pool:
+            with pool.driver() as driver:
+                driver.goto(TEST_PAGE)
+                driver.browser.add_cookie({'name': 'session', 'value': '1'})
+            self.assertTrue(driver._cdp)
+            self.assertEqual(driver.browser.get_cookies(), [])
+            self.assertEqual(driver.metrics.commands['sfExecuteCdpCommand']['count'], 1)
+        pool = sf.DriverPool(dict(CONFIG, browser='Unknown'), size=1)
+        with self.assertRaises(Exception):
+            pool.acquire()
+        self.assertEqual(pool._drivers, [])
+
+    def test_003_driver_pool_dead_browser(self):
+        '''Test that a driver whose reset fails with any error frees its slot.'''
+        intro_test('Test case 003 - Driver pool dead browser functions')
+        pool = sf.DriverPool(dict(CONFIG, browser='Fake'), size=1, timeout=5)
+        driver = pool.acquire()
+
+        def reset():
+            raise ConnectionError('The browser process is gone')
+
+        driver.reset = reset
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            waiter = executor.submit(pool.acquire)      # Blocks, the pool is full
+            time.sleep(0.1)
+            pool.release(driver)
+            self.assertTrue(waiter.result() is not driver)
+        self.assertEqual(len(pool._drivers), 1)
+        pool.close()
+
+
+class TestPlan005ParallelRunner(unittest.TestCase):
+    '''Test the parallel test runner.'''
+    def test_001_run_parallel(self):
+        '''Test running unittest cases across worker processes.'''
+        intro_plan('Starting test plan 005 - Parallel runner functions')
+        intro_test('Test case 001 - Run parallel functions')
+        test_name = 'unit_tests.TestPlan001UtilityFunctions'
+        result = sf.run_parallel([test_name], workers=2, shard_by='case')
+        self.assertEqual(result['tests_run'],
+                         unittest.defaultTestLoader.loadTestsFromName(test_name).countTestCases())
+        self.assertTrue(result['successful'])
+        self.assertTrue('test_002_make_valid_name' in result['report'])
+
+    def test_002_run_parallel_load_errors(self):
+        '''Test that test names which cannot be loaded fail the run.'''
+        intro_test('Test case 002 - Run parallel load error functions')
+        for test_names in [['unit_tests.TestPlan001UtilityFunctionz'], ['no_such_module']]:
+            result = sf.run_parallel(test_names, workers=1)
+            self.assertFalse(result['successful'])
+            self.assertEqual(len(result['errors']), 1)
+        self.assertFalse(sf.run_parallel([], workers=1)['successful'])
+
+
+class TestPlan006AsyncDriver(unittest.TestCase):
+    '''Test the asyncio driver.'''
+    def test_001_async_utilities(self):
+        '''Test the AsyncDriver without a browser.'''
+        intro_plan('Starting test plan 006 - Asyncio driver functions')
+        intro_test('Test case 001 - Async utility functions')
+
+        async def run_utilities():
+            async with sf.AsyncDriver() as driver:
+                await driver.wait(0)
+                return driver.make_valid_name(' Now-is the (time) ')
+
+        self.assertEqual(asyncio.run(run_utilities()), 'Now_is_the_time')
+        self.assertTrue(inspect.iscoroutinefunction(sf.AsyncDriver.find))
+        self.assertEqual(sf.AsyncDriver.find.__doc__, sf.Driver.find.__doc__)
+
+    def test_002_async_sessions(self):
+        '''Test driving several browser sessions concurrently.'''
+        intro_test('Test case 002 - Async session functions')
+
+        async def run_session(text):
+            async with sf.AsyncDriver() as driver:
+                await driver.open(CONFIG)
+                await driver.goto(TEST_PAGE)
+                field_element = await driver.find('id=text01')
+                await driver.set_field(field_element, text)
+                return await driver.is_field_set(field_element)
+
+        async def run_sessions():
+            return await asyncio.gather(*[run_session(f'Session {index}') for index in range(3)])
+
+        self.assertEqual(asyncio.run(run_sessions()), ['Session 0', 'Session 1', 'Session 2'])
+
+    def test_003_async_other_methods(self):
+        '''Test that unlisted and subclass methods also run on the session thread.'''
+        intro_test('Test case 003 - Async other method functions')
+
+        async def run_static():
+            async with sf.AsyncDriver(sf.StaticDriver()) as driver:
+                await driver.open(CONFIG)
+                load = driver.load('<table id="t"><tr><th>A</th></tr><tr><td>1</td></tr>'
+                                   '<tr><td>2</td></tr></table>')
+                self.assertTrue(inspect.isawaitable(load))
+                await load
+                chunks = [chunk async for chunk in driver.iter_table('id=t', chunk_size=1)]
+                await driver.quit()
+                await driver.close()
+                return chunks
+
+        self.assertEqual(asyncio.run(run_static()), [{'A': ['1']}, {'A': ['2']}])
+
+
+class TestPlan007Metrics(unittest.TestCase):
+    '''Test the metrics of a browser session.'''
+    def test_001_browser_metrics(self):
+        '''Test recording round trips of Driver methods.'''
+        intro_plan('Starting test plan 007 - Metrics functions')
+        intro_test('Test case 001 - Browser metrics functions')
+        metrics_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics.json')
+        driver = sf.Driver()
+        driver.open(config=dict(CONFIG, metrics_file=metrics_file))
+        driver.goto(TEST_PAGE)
+        driver.fill_form({'id=text01': 'Test123', 'id=chbox01': True})
+        driver.find('id=text01')
+        driver.close()
+
+        with open(metrics_file) as json_file:
+            metrics = json.load(json_file)
+        os.remove(metrics_file)
+        self.assertEqual(metrics['methods']['fill_form']['round_trips'], 1)
+        self.assertEqual(metrics['methods']['find']['round_trips'], 1)
+        self.assertGreaterEqual(metrics['commands']['w3cExecuteScript']['count'], 1)
+
+
+class TestPlan008FakeBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = sf.Driver()
+        self.driver.open(config=dict(CONFIG, browser='Fake', metrics=True, element_cache=True))
+
+    def tearDown(self):
+        self.driver.browser.quit()
+
+    def test_001_fake_backend(self):
+        d = self.driver
+        d.goto(TEST_PAGE)
+        self.assertEqual(d.browser.title, 'Test Page')
+
+        text_field = d.find('id=text01')
+        self.assertEqual(d.is_field_set(text_field), 'Double-click me')
+        d.set_field(text_field, 'Test123')
+        self.assertEqual(d.is_field_set(text_field), 'Test123')
+        d.set_field(d.find('id=select02'), [1, 3])
+        self.assertEqual(d.is_field_set(d.find('id=select02')), ['1', '3'])
+        d.find('name=radio')[1].click()
+        self.assertEqual(d.is_radio_button_group_set(d.find('name=radio')), ['Value 1'])
+
+        self.assertEqual(d.fill_form({'id=chbox01': True, 'name=radio': 'Value 2'}),
+                         {'id=chbox01': True, 'name=radio': ['Value 2']})
+        snapshot = d.snapshot_form()
+        self.assertEqual(snapshot['text01']['value'], 'Test123')
+        self.assertEqual(snapshot['select01']['value'], ['1'])
+        with self.assertRaises(sf.FrameworkException) as context:
+            d.snapshot_form('id=missing')
+        self.assertEqual(context.exception.msg, 'Unable to find the form container: id=missing')
+        self.assertEqual(d.are_clickable(d.find('tag=input'))[:2], [True, False])
+        self.assertEqual(d.find('tag=table >> id=select02 >> xpath=..').tag_name, 'td')
+        self.assertEqual(d.find('id=text01'), text_field)
+        with self.assertRaises(sf.WebDriverException):
+            d.browser.execute_script('return 1;')
+
+        d.reset()
+        self.assertEqual(d.browser.current_url, 'about:blank')
+        self.assertEqual(d.metrics.methods['fill_form']['round_trips'], 1)
+
+    def test_002_fake_backend_locators(self):
+        d = self.driver
+        d.goto('data:text/html,<ul id="list"><li class="a b">One<li class="b">Two'
+               '<li data-x="3">Three</ul><p>Item <a href="#">Link text</a></p>')
+        self.assertEqual([element.text for element in d.find('css=#list > li.b')],
+                         ['One', 'Two'])
+        self.assertEqual(d.find('css=li[data-x^="3"]').text, 'Three')
+        self.assertEqual(d.find('css=li.a + li').text, 'Two')
+        self.assertEqual(d.find('xpath=//li[normalize-space(.) = "Two"]').text, 'Two')
+        self.assertEqual(d.find('xpath=//ul/li[last()]').text, 'Three')
+        self.assertEqual(d.find('xpath=//li[contains(@class, "a")]').text, 'One')
+        self.assertEqual(d.find('link=Link text').tag_name, 'a')
+        self.assertEqual(d.find('plink=Link').tag_name, 'a')
+
+    def test_003_static_driver(self):
+        d = sf.StaticDriver()
+        d.open(config=dict(CONFIG, remote_hub=('127.0.0.1', 9)))     # Not used by Static
+        d.goto(TEST_PAGE)
+        self.assertIsInstance(d.find('id=text01'), d.web_element)
+        self.assertEqual(d.is_field_set(d.find('id=text01')), 'Double-click me')
+        self.assertEqual(d.is_field_set(d.find('id=select01')), ['1'])
+        self.assertEqual(d.is_radio_button_group_set(d.find('name=radio')), [])
+        self.assertEqual(d.find('id=missing', wait=1), [])
+
+        d.load('<form><input name="q" class="query wide" value="Test123"/>'
+               '<input type="radio" name="r" value="A" checked/></form>')
+        self.assertEqual(d.find('class=wide'), d.find('name=q'))
+        self.assertEqual(d.is_field_set(d.find('css=.query')), 'Test123')
+        self.assertEqual(d.is_radio_button_group_set([d.find('name=r')]), ['A'])
+        d.close()
+
+    def test_004_fake_backend_history(self):
+        d = sf.Driver()
+        d.open(config=dict(CONFIG, browser='Fake'))
+        session = sf.fake_server().sessions[d.browser.session_id]
+        for _ in range(3):
+            d.goto(TEST_PAGE)
+            element = d.find('id=text01')
+        d.goto('about:blank')
+        self.assertEqual(session.window.history,
+                         ['about:blank'] + [TEST_PAGE] * 3 + ['about:blank'])
+        self.assertEqual(session.elements, {})
+        with self.assertRaises(sf.StaleElementReferenceException):
+            element.click()
+        d.browser.back()
+        self.assertEqual(d.is_field_set(d.find('id=text01')), 'Double-click me')
+        d.browser.quit()
+
+        static_drivers = [sf.StaticDriver(), sf.StaticDriver()]
+        for static_driver in static_drivers:
+            static_driver.open(config=CONFIG)
+        self.assertIsNot(static_drivers[0].browser.command_executor._server,
+                         static_drivers[1].browser.command_executor._server)
+        for static_driver in static_drivers:
+            static_driver.close()
+
+    def test_005_element_cache_round_trips(self):
+        for element_cache, round_trips in [(True, 1), ('navigation', 0)]:
+            d = sf.Driver()
+            d.open(config=dict(CONFIG, browser='Fake', metrics=True,
+                               element_cache=element_cache))
+            d.goto(TEST_PAGE)
+            element = d.find('css=table >> id=select02')
+            d.metrics.methods.clear()
+            self.assertEqual(d.find('css=table >> id=select02'), element)
+            self.assertEqual(d.metrics.methods['find']['round_trips'], round_trips)
+            d.browser.quit()
+
+    def test_006_settle_alert(self):
+        d = sf.Driver()
+        d.open(config=dict(CONFIG, browser='Fake'))
+        d.goto(TEST_PAGE)
+        def execute_async_script(script, *args):
+            raise sf.UnexpectedAlertPresentException(alert_text='Saved')
+        d.browser.execute_async_script = execute_async_script
+        self.assertTrue(d.double_click(d.find('id=text01')))
+        def execute_unloaded(script, *args):
+            raise sf.WebDriverException(
+                'javascript error: document unloaded while waiting for result')
+        d.browser.execute_async_script = execute_unloaded
+        self.assertTrue(d.double_click(d.find('id=text01')))
+        d.scroll_into_view(d.find('id=text01'))
+        d.browser.quit()
+
+
+class TestPlan009RemoteHub(unittest.TestCase):
+
+    def setUp(self):
+        self.hub = sf.FakeWebDriverServer().start()
+        self.config = dict(CONFIG, remote_hub=('127.0.0.1', self.hub.port), remote_pool_size=2)
+
+    def tearDown(self):
+        self.hub.stop()
+
+    def test_001_remote_hub_connection_pool(self):
+        for _ in range(3):
+            d = sf.Driver()
+            d.open(config=self.config)
+            d.goto(TEST_PAGE)
+            self.assertEqual(d.is_field_set(d.find('id=text01')), 'Double-click me')
+            d.close()
+        self.assertEqual(self.hub.connections, 1)
+        self.assertEqual(self.hub.sessions, {})
+
+        async def run_session():
+            async with sf.AsyncDriver() as driver:
+                await driver.open(self.config)
+                await driver.goto(TEST_PAGE)
+                return await driver.is_field_set(await driver.find('id=text01'))
+
+        async def run_sessions():
+            return await asyncio.gather(*[run_session() for _ in range(4)])
+
+        self.assertEqual(asyncio.run(run_sessions()), ['Double-click me'] * 4)
+        self.assertLessEqual(self.hub.connections, 2)
+
+
+class TestPlan010SessionStartup(unittest.TestCase):
+
+    def test_001_profile_template(self):
+        with tempfile.TemporaryDirectory() as folder:
+            template = os.path.join(folder, 'template')
+            os.makedirs(template)
+            for file_name in ['Preferences', 'SingletonLock']:
+                with open(os.path.join(template, file_name), 'w') as template_file:
+                    template_file.write('{}')
+            d = sf.Driver()
+            d.open(config=dict(CONFIG, browser='Fake', profile_template=template))
+            capabilities = sf.fake_server().sessions[d.browser.session_id].capabilities
+            profile = [argument.split('=', 1)[1] for argument
+                       in capabilities['alwaysMatch']['goog:chromeOptions']['args']
+                       if argument.startswith('--user-data-dir=')][0]
+            self.assertNotEqual(profile, template)
+            self.assertEqual(os.listdir(profile), ['Preferences'])
+            d.close()
+            self.assertFalse(os.path.exists(profile))
+
+    def test_002_shared_service(self):
+        config = dict(CONFIG, shared_service=True)
+        service_urls = []
+        for _ in range(2):
+            d = sf.Driver()
+            d.open(config=config)
+            d.goto(TEST_PAGE)
+            service_urls.append(d.browser.command_executor._client_config.remote_server_addr)
+            d.browser.quit()
+        self.assertEqual(service_urls[0], service_urls[1])
+
+
+class TestPlan011Navigation(unittest.TestCase):
+
+    def test_001_goto_wait_for(self):
+        d = sf.Driver()
+        d.open(config=dict(CONFIG, browser='Fake', page_load_strategy='none'))
+        capabilities = sf.fake_server().sessions[d.browser.session_id].capabilities
+        self.assertEqual(capabilities['alwaysMatch']['pageLoadStrategy'], 'none')
+
+        d.goto(TEST_PAGE, wait_for='id=text01')
+        self.assertEqual(d.browser.title, 'Test Page')
+        d.goto(TEST_PAGE, wait_for='interactive')
+        d.goto(TEST_PAGE, wait_for=lambda driver: driver.find('id=select02'))
+        with self.assertRaises(sf.TimeoutException):
+            d.goto(TEST_PAGE, wait_for='id=missing', timeout=1)
+        # Invalid locators fail before navigating, and stale elements are retried
+        d.goto('about:blank')
+        with self.assertRaises(sf.FrameworkException):
+            d.goto(TEST_PAGE, wait_for='missing', timeout=1)
+        self.assertEqual(d.browser.current_url, 'about:blank')
+        attempts = []
+        def ready(driver):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise sf.StaleElementReferenceException('stale')
+            return True
+        d.goto(TEST_PAGE, wait_for=ready, timeout=3)
+        self.assertEqual(len(attempts), 2)
+        d.close()
+
+    def test_002_block_urls(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, 'frame.html'), 'w') as frame_file:
+                frame_file.write('<input id="deep"/>')
+            with open(os.path.join(folder, 'page.html'), 'w') as page_file:
+                page_file.write('<iframe id="frame" src="frame.html"></iframe>')
+            page = f'file://{folder}/page.html'
+            d = sf.Driver()
+            d.open(config=dict(CONFIG, browser='Fake', block_urls=['*/frame.html']))
+            d.goto(page)
+            d.switch_to('frame=frame')
+            self.assertEqual(d.find('id=deep', wait=0), [])
+
+            d.block_urls([])
+            d.goto(page)
+            d.switch_to('frame=frame')
+            self.assertIsInstance(d.find('id=deep', wait=0), d.web_element)
+            d.close()
+
+
+class TestPlan012Timing(unittest.TestCase):
+
+    def test_001_goto_timing(self):
+        with tempfile.TemporaryDirectory() as folder:
+            timing_file = os.path.join(folder, 'timing.jsonl')
+            d = sf.Driver()
+            d.open(config=dict(CONFIG, browser='Fake', timing_file=timing_file))
+            record = d.goto(TEST_PAGE)
+            self.assertEqual(record['url'], TEST_PAGE)
+            self.assertEqual(record['navigation']['entryType'], 'navigation')
+            self.assertIsNotNone(record['summary']['load_ms'])
+            self.assertGreaterEqual(record['summary']['goto_ms'], record['summary']['load_ms'])
+            record = d.goto(TEST_PAGE, wait_for='complete')
+            self.assertIn('overhead_ms', record['summary'])
+            self.assertIsNone(d.goto(TEST_PAGE, timing=False))
+            self.assertEqual(len(d.timing_log), 2)
+            d.close()
+            with open(timing_file) as log_file:
+                records = [json.loads(line) for line in log_file]
+            self.assertEqual([record['url'] for record in records], [TEST_PAGE] * 2)
+
+
+class TestPlan013Tables(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        rows = ''.join(f'<tr><td>{index}</td><td>Name {index}</td><td>{index * 1.5}</td></tr>'
+                       for index in range(2500))
+        path = os.path.join(self.folder.name, 'tables.html')
+        with open(path, 'w') as page_file:
+            page_file.write('<html><body><table id="report"><thead><tr><th>Id</th>'
+                            f'<th>Name</th><th>Amount</th></tr></thead><tbody>{rows}'
+                            '<tr><td colspan="2">Total</td></tr></tbody></table>'
+                            '<table id="plain"><tr><td>a</td><td>b</td></tr></table>'
+                            '</body></html>')
+        self.page = f'file://{path}'
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_001_extract_table(self):
+        d = sf.Driver()
+        d.open(config=dict(CONFIG, browser='Fake', metrics=True))
+        d.goto(self.page)
+        columns = d.extract_table('id=report')
+        self.assertEqual(d.metrics.methods['extract_table']['round_trips'], 1)
+        self.assertEqual(list(columns), ['Id', 'Name', 'Amount'])
+        self.assertEqual(len(columns['Id']), 2501)
+        self.assertEqual(columns['Name'][:2], ['Name 0', 'Name 1'])
+        self.assertEqual((columns['Id'][-1], columns['Name'][-1], columns['Amount'][-1]),
+                         ('Total', 'Total', None))
+        self.assertEqual(d.extract_table(d.find('id=plain')), {0: ['a'], 1: ['b']})
+        self.assertEqual(d.extract_table('id=report', header=False)[0][0], 'Id')
+        with self.assertRaises(sf.FrameworkException):
+            d.extract_table('id=missing')
+        d.close()
+
+    def test_002_iter_table(self):
+        d = sf.Driver()
+        d.open(config=dict(CONFIG, browser='Fake'))
+        d.goto(self.page)
+        chunks = list(d.iter_table('id=report', chunk_size=1000))
+        self.assertEqual([len(chunk['Id']) for chunk in chunks], [1000, 1000, 501])
+        self.assertTrue(all(list(chunk) == ['Id', 'Name', 'Amount'] for chunk in chunks))
+        self.assertEqual(sum((chunk['Amount'] for chunk in chunks), []),
+                         d.extract_table('id=report')['Amount'])
+        d.close()
+
+    def test_003_extract_table_numpy(self):
+        d = sf.Driver()
+        d.open(config=dict(CONFIG, browser='Fake'))
+        d.goto(self.page)
+        try:
+            import numpy
+        except ImportError:
+            with self.assertRaises(sf.FrameworkException):
+                d.extract_table('id=report', output='numpy')
+        else:
+            arrays = d.extract_table('id=report', output='numpy')
+            self.assertEqual(arrays['Name'].dtype, object)
+            chunk = next(d.iter_table('id=report', chunk_size=10, output='numpy'))
+            self.assertEqual(chunk['Amount'].dtype, numpy.float64)
+            self.assertEqual(chunk['Amount'][1], 1.5)
+        d.close()
+
+
+class TestPlan014Captures(unittest.TestCase):
+
+    def test_001_capture(self):
+        with tempfile.TemporaryDirectory() as folder:
+            capture_dir = os.path.join(folder, 'captures')
+            d = sf.Driver()
+            d.open(config=dict(CONFIG, browser='Fake', capture_dir=capture_dir,
+                               capture_compression=9, capture_queue=1))
+            d.goto(TEST_PAGE)
+            paths = [d.capture('Step 1'), d.capture('Step 1'), d.capture('Log in (ok)')]
+            self.assertEqual(len(set(paths)), 3)
+            self.assertRegex(os.path.basename(paths[2]), r'^Log_in_ok_[\d_]+\.png$')
+            d.close()
+            for path in paths:
+                with open(path, 'rb') as capture_file:
+                    self.assertEqual(capture_file.read(8), b'\x89PNG\r\n\x1a\n')
+
+    def test_002_capture_errors(self):
+        with tempfile.TemporaryDirectory() as folder:
+            capture_dir = os.path.join(folder, 'captures')
+            d = sf.Driver()
+            d.open(config=dict(CONFIG, browser='Fake', capture_dir=capture_dir))
+            d.capture('first')
+            d.flush_captures()
+            os.rename(capture_dir, capture_dir + '_moved')
+            d.capture('second')
+            with self.assertRaises(sf.FrameworkException):
+                d.flush_captures()
+            d.flush_captures()
+            d.close()
+
+    def test_003_pool_quit(self):
+        with tempfile.TemporaryDirectory() as folder:
+            config = dict(CONFIG, browser='Fake', capture_dir=folder,
+                          metrics_file=os.path.join(folder, 'metrics.json'),
+                          timing_file=os.path.join(folder, 'timing.json'))
+            with sf.DriverPool(config, size=1) as pool:
+                with pool.driver() as d:
+                    path = d.capture('pooled')
+                    session_id = d.browser.session_id
+            self.assertNotIn(session_id, sf.fake_server().sessions)
+            self.assertIsNone(d._captures)
+            for name in [path, 'metrics.json', 'timing.json']:
+                self.assertTrue(os.path.isfile(os.path.join(folder, name)))
+
+
+class TestPlan015VisualDiff(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        self.numpy = numpy
+        self.folder = tempfile.TemporaryDirectory()
+        self.baseline_dir = os.path.join(self.folder.name, 'baselines')
+        self.image = numpy.zeros((120, 160, 3), numpy.uint8)
+        self.image[:, :, 2] = numpy.arange(160)[None, :]
+        self.changed = self.image.copy()
+        self.changed[10:20, 40:60] = 255
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_001_check(self):
+        with sf.VisualDiff(self.baseline_dir, cell_size=16) as visual:
+            self.assertTrue(visual.check('page', self.image)['new'])
+            result = visual.check('page', sf._encode_png(self.image))
+            self.assertTrue(result['identical'] and result['match'])
+            diff_path = os.path.join(self.folder.name, 'diff.png')
+            result = visual.check('page', self.changed, diff_path=diff_path)
+            self.assertFalse(result['match'])
+            self.assertEqual(result['changed_pixels'], 200)
+            self.assertEqual(result['bounding_box'], (40, 10, 20, 10))
+            self.assertEqual(result['cells'], [(32, 0, 16, 16), (48, 0, 16, 16),
+                                               (32, 16, 16, 16), (48, 16, 16, 16)])
+            self.assertTrue(os.path.exists(diff_path))
+            self.assertTrue(visual.check('page', self.changed, ignore=[(40, 10, 20, 10)])['match'])
+        self.assertEqual(sf.VisualDiff(self.baseline_dir).index, visual.index)
+        decode_png = sf._decode_png
+        decoded = []
+        sf._decode_png = lambda png: decoded.append(png) or decode_png(png)
+        try:
+            visual = sf.VisualDiff(self.baseline_dir)
+            self.assertFalse(visual.check('page', self.changed)['match'])
+            self.assertFalse(visual.check('page', self.changed)['match'])
+            self.assertEqual(len(decoded), 1)
+        finally:
+            sf._decode_png = decode_png
+
+    def test_002_diff_and_find(self):
+        visual = sf.VisualDiff(self.baseline_dir)
+        visual.add('page', self.image)
+        result = visual.diff(self.changed, self.image, regions={'top': (0, 0, 160, 20)})
+        self.assertEqual(result['regions'], {'top': 200 / 3200})
+        self.assertFalse(visual.diff(self.image[:60], self.image)['match'])
+        self.assertEqual(visual.find(self.image), ['page'])
+        gray = self.numpy.full((120, 160, 3), 128, self.numpy.uint8)
+        self.assertEqual(visual.find(gray), [])
+
+    def test_003_decode_png(self):
+        has_pillow = sf._has_pillow
+        sf._has_pillow = lambda: False
+        try:
+            image = self.numpy.random.default_rng(1).integers(0, 256, (5, 4, 3))
+            image = image.astype(self.numpy.uint8)
+            rows = image.reshape(5, 12).astype(int)
+            filtered = []
+            for index, row in enumerate(rows):     # One row per filter type
+                above = rows[index - 1] if index else self.numpy.zeros(12, int)
+                left = self.numpy.concatenate([[0] * 3, row[:-3]])
+                upper_left = self.numpy.concatenate([[0] * 3, above[:-3]])
+                estimate = left + above - upper_left
+                paeth = self.numpy.where(
+                    (abs(estimate - left) <= abs(estimate - above)) &
+                    (abs(estimate - left) <= abs(estimate - upper_left)), left,
+                    self.numpy.where(abs(estimate - above) <= abs(estimate - upper_left),
+                                     above, upper_left))
+                predictor = [0, left, above, (left + above) // 2, paeth][index]
+                filtered.append(bytes([index]) + bytes(((row - predictor) % 256).tolist()))
+            png = (sf._PNG_SIGNATURE +
+                   sf._png_chunk(b'IHDR', bytes([0, 0, 0, 4, 0, 0, 0, 5, 8, 2, 0, 0, 0])) +
+                   sf._png_chunk(b'IDAT', zlib.compress(b''.join(filtered))) +
+                   sf._png_chunk(b'IEND', b''))
+            self.assertTrue((sf._decode_png(png) == image).all())
+        finally:
+            sf._has_pillow = has_pillow
+
+
+class TestPlan016Traces(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.trace_file = os.path.join(self.folder.name, 'trace.jsonl')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_001_trace(self):
+        d = sf.Driver()
+        with self.assertRaises(sf.FrameworkException):
+            d.trace(self.trace_file)
+        self.assertFalse(os.path.exists(self.trace_file))
+        d.open(config=dict(CONFIG, browser='Fake', trace_file=self.trace_file))
+        d.goto(TEST_PAGE)
+        element = d.find('id=text01')
+        d.set_field(element, 'Test123')
+        d.fill_form({'id=text01': 'Test456', 'id=chbox01': True})
+        d.fill_form({'id=text01': 'Test789'})
+        d.close()
+        with open(self.trace_file) as trace:
+            records = [json.loads(line) for line in trace]
+        self.assertEqual(records[0]['type'], 'trace')
+        commands = [record for record in records if record['type'] == 'command']
+        self.assertEqual((commands[0]['method'], commands[0]['command']), ('goto', 'get'))
+        summary = sf.summarize_trace(self.trace_file)
+        self.assertEqual(summary['methods']['fill_form']['calls'], 2)
+        self.assertEqual(summary['methods']['fill_form']['round_trips'], 2)
+        self.assertEqual(summary['errors'], 0)
+
+    def test_002_replay_trace(self):
+        d = sf.Driver()
+        d.open(config=dict(CONFIG, browser='Fake', trace_file=self.trace_file))
+        d.goto(TEST_PAGE)
+        element = d.find('id=text01')
+        d.set_field(element, 'Test123')
+        self.assertEqual(d.is_field_set(element), 'Test123')
+        d.close()
+        replay = sf.replay_trace(self.trace_file)
+        self.assertEqual(replay['errors'], 0)
+        comparison = sf.compare_traces(self.trace_file, replay)
+        round_trips = comparison['methods']['set_field']['round_trips']
+        self.assertEqual(round_trips[0], round_trips[1])
+        self.assertIn('is_field_set', comparison['report'])
+
+    def test_003_pool_trace(self):
+        with sf.DriverPool(dict(CONFIG, browser='Fake', trace_file=self.trace_file)) as pool:
+            with pool.driver() as d:
+                d.goto(TEST_PAGE)
+        summary = sf.summarize_trace(self.trace_file)
+        self.assertEqual(summary['methods']['goto']['calls'], 1)
+        self.assertEqual(summary['methods']['reset']['calls'], 1)
+
+
+class TestPlan017DataDriven(unittest.TestCase):
+
+    def check_row(self, driver, row):
+        driver.goto(TEST_PAGE)
+        driver.fill_form({'id=text01': row['text'], 'id=chbox01': row['checked'] == '1'})
+        if row['text'] == 'Invalid':
+            raise ValueError('Invalid row')
+        return driver.is_field_set(driver.find('id=text01'))
+
+    def test_001_run_data(self):
+        with tempfile.TemporaryDirectory() as folder:
+            rows_file = os.path.join(folder, 'rows.csv')
+            with open(rows_file, 'w') as csv_file:
+                csv_file.write('text,checked\n')
+                csv_file.write(''.join(f'Row {index},{index % 2}\n' for index in range(40)))
+                csv_file.write('Invalid,0\n')
+            results = list(sf.run_data(self.check_row, rows_file,
+                                       dict(CONFIG, browser='Fake'), sessions=4))
+        self.assertEqual([result['index'] for result in results], list(range(41)))
+        self.assertEqual([result['result'] for result in results[:40]],
+                         [f'Row {index}' for index in range(40)])
+        self.assertIsInstance(results[40]['error'], ValueError)
+
+    def test_002_run_data_backpressure(self):
+        read = []
+        def rows():
+            for index in range(10 ** 7):
+                read.append(index)
+                yield {'text': f'Row {index}', 'checked': '0'}
+        with sf.DriverPool(dict(CONFIG, browser='Fake'), size=2) as pool:
+            results = sf.run_data(self.check_row, rows(), pool=pool, sessions=2, window=3,
+                                  reset=False)
+            self.assertEqual(next(results)['result'], 'Row 0')
+            self.assertLessEqual(len(read), 3)
+            for _ in range(5):
+                next(results)
+            self.assertLessEqual(len(read), 8)
+            results.close()
+
+    def test_003_read_rows(self):
+        with tempfile.TemporaryDirectory() as folder:
+            rows_file = os.path.join(folder, 'rows.jsonl')
+            with open(rows_file, 'w') as jsonl_file:
+                jsonl_file.write('{"text": "Row 0", "checked": "1"}\n\n{"text": "Row 1"}\n')
+            self.assertEqual(list(sf.read_rows(rows_file)),
+                             [{'text': 'Row 0', 'checked': '1'}, {'text': 'Row 1'}])
+
+
+class TestPlan018PageObjects(unittest.TestCase):
+
+    def setUp(self):
+        class FormPage(sf.Page):
+            __slots__ = ()
+            url = TEST_PAGE
+            text = sf.Element('id=text01')
+            select = sf.Element('tag=table >> id=select02')
+            radios = sf.Element('name=radio')
+            missing = sf.Element('id=missing', wait=0)
+        self.page_class = FormPage
+        self.driver = sf.Driver()
+        self.driver.open(config=dict(CONFIG, browser='Fake', metrics=True))
+
+    def tearDown(self):
+        self.driver.close()
+
+    def round_trips(self):
+        return sum(stats['count'] for stats in self.driver.metrics.commands.values())
+
+    def test_001_page_elements(self):
+        d = self.driver
+        start = self.round_trips()
+        page = self.page_class(d).goto()
+        self.assertEqual(self.round_trips() - start, 1)
+        self.assertFalse(hasattr(page, '__dict__'))
+        text = page.text
+        self.assertIsInstance(text, d.web_element)
+        self.assertIs(page.text, text)
+        self.assertEqual(self.round_trips() - start, 2)
+        self.assertEqual(len(page.radios), 3)
+        self.assertIsInstance(page.select, d.web_element)
+        self.assertEqual(page.missing, [])
+        d.goto(TEST_PAGE)
+        self.assertIsNot(page.text, text)
+
+    def test_002_page_cache_modes(self):
+        d = self.driver
+        checked_page = type('CheckedPage', (self.page_class,), {'__slots__': (), 'cache': True})(d)
+        text = checked_page.goto().text
+        start = self.round_trips()
+        self.assertIs(checked_page.text, text)
+        self.assertEqual(self.round_trips() - start, 1)
+        uncached_page = type('UncachedPage', (self.page_class,),
+                             {'__slots__': (), 'cache': False})(d)
+        self.assertIsNot(uncached_page.text, uncached_page.text)
+        waiting_page = type('WaitingPage', (self.page_class,), {
+            '__slots__': (), 'late': sf.Element('id=missing', wait=1)})(d)
+        start = {name: stats['count'] for name, stats in d.metrics.commands.items()}
+        self.assertEqual(waiting_page.late, [])
+        self.assertEqual({name: stats['count'] - start.get(name, 0)
+                          for name, stats in d.metrics.commands.items()
+                          if stats['count'] != start.get(name, 0)},
+                         {'w3cExecuteScript': 1, 'w3cExecuteScriptAsync': 1})
+        with self.assertRaises(sf.FrameworkException):
+            sf.Page(d).goto()
+
 
 # ############################################################################
 # def TEMPLATE_test_000_name(self):
@@ -295,4 +1270,4 @@ if __name__ == '__main__':
 
     #######################################################################
 
-    timeit.timeit(unittest.main(warnings='ignore'))
+    unittest.main(warnings='ignore')